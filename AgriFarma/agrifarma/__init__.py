@@ -29,8 +29,14 @@ def create_app(config_name='development'):
     # Load configuration
     app.config.from_object(config[config_name])
     
-    # Set ASSETS_ROOT for templates
-    app.config['ASSETS_ROOT'] = '/static'
+    # Set ASSETS_ROOT for templates (may point at a CDN serving the same files)
+    app.config.setdefault('ASSETS_ROOT', '/static')
+    
+    # Behind a platform router remote_addr is the router; take the client from
+    # X-Forwarded-For so per-IP rate limits apply per client (TRUSTED_PROXIES)
+    if app.config.get('TRUSTED_PROXIES'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
     
     # Initialize extensions
     from agrifarma.extensions import db, migrate, login_manager, bcrypt, csrf
@@ -65,12 +71,64 @@ def create_app(config_name='development'):
     app.register_blueprint(marketplace_bp, url_prefix='/marketplace')
     app.register_blueprint(analytics_bp)
     
+    # Anonymous full-page cache (PAGE_CACHE_* settings)
+    from agrifarma.services.page_cache import init_page_cache
+    init_page_cache(app)
+    
+    # Token buckets for write endpoints (RATE_LIMIT_* settings)
+    from agrifarma.services.rate_limit import init_rate_limit
+    init_rate_limit(app)
+    
+    # Read-your-writes stamp for replica routing (DB_REPLICA_* settings)
+    from agrifarma.services.db_routing import init_db_routing
+    init_db_routing(app)
+    
+    # Cached deep checks behind /readyz and /health (HEALTH_* settings)
+    from agrifarma.services.health import init_health
+    init_health(app)
+    
+    # Request/DB/pool metrics for /metrics (METRICS_* settings)
+    from agrifarma.services.metrics import init_metrics
+    init_metrics(app)
+    
+    # Leaderboard cache for forum reputation (REPUTATION_* settings)
+    from agrifarma.services.reputation import init_reputation
+    init_reputation(app)
+    
+    # Batched forum read marks (FORUM_READ_MARK_* settings)
+    from agrifarma.services.read_state import init_read_state
+    init_read_state(app)
+    
+    # Forum category tree (materialized paths, cached per worker)
+    from agrifarma.services.category_tree import init_category_tree
+    init_category_tree(app)
+    
+    # "Similar threads" MinHash/LSH index (built lazily per worker)
+    from agrifarma.services.similar import init_similar_threads
+    init_similar_threads(app)
+    
+    # Live thread updates (Server-Sent Events broker and per-worker stream cap)
+    from agrifarma.services.live import init_live
+    init_live(app)
+    
+    # Fingerprinted static assets (built by `flask assets build`)
+    from agrifarma.services.assets import init_assets
+    init_assets(app)
+    
     # Register error handlers
     register_error_handlers(app)
     
     # Register template filters
     register_template_filters(app)
     
+    # Stored, sanitized content_html for threads, replies and blog posts
+    from agrifarma.services.content import init_content
+    init_content(app)
+    
+    # Bytecode cache, warm-up and render timing (TEMPLATE_* settings)
+    from agrifarma.services.templating import init_templating
+    init_templating(app)
+    
     # Create upload directory if it doesn't exist
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
@@ -92,6 +150,14 @@ def register_error_handlers(app):
         from flask import render_template
         return render_template('errors/error_403.html'), 403
     
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        from flask import render_template, make_response
+        response = make_response(render_template('errors/error_429.html', retry_after=error.retry_after), 429)
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+    
     @app.errorhandler(404)
     def page_not_found(error):
         from flask import render_template
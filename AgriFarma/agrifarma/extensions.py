@@ -2,15 +2,53 @@
 Flask extensions initialization.
 Extensions are initialized here and then attached to the app in the factory.
 """
+import click
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from flask_wtf.csrf import CSRFProtect
+from agrifarma.services.db_routing import RoutingSession
+
+
+class LazyMigrate:
+    """Flask-Migrate, imported only when a ``flask db`` command runs.
+
+    Importing flask_migrate pulls in alembic (plus mako and pygments). That
+    costs every web worker and every other CLI command about 0.1s at startup,
+    and only the migration commands need it.
+    """
+
+    def __init__(self):
+        self.migrate = None
+
+    def init_app(self, app, db, **kwargs):
+        def load():
+            if 'migrate' not in app.extensions:
+                from flask_migrate import Migrate
+                self.migrate = Migrate(app, db, **kwargs)
+            from flask_migrate.cli import db as db_group
+            return db_group
+
+        app.cli.add_command(_LazyGroup(load, name='db', help='Perform database migrations.'))
+
+
+class _LazyGroup(click.Group):
+    """Click group whose subcommands come from a group loaded on first use."""
+
+    def __init__(self, loader, **attrs):
+        super().__init__(**attrs)
+        self._loader = loader
+
+    def list_commands(self, ctx):
+        return self._loader().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._loader().get_command(ctx, name)
+
 
 # Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # reads in @read_replica views may use the replica bind
+migrate = LazyMigrate()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 csrf = CSRFProtect()
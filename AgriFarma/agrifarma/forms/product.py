@@ -1,5 +1,6 @@
 """Forms for product management and reviews."""
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, TextAreaField, FloatField, IntegerField, BooleanField, SubmitField, SelectField
 from wtforms.validators import DataRequired, NumberRange, Optional
 
@@ -26,3 +27,9 @@ class ReviewForm(FlaskForm):
     rating = SelectField('Rating', choices=[('1','1'),('2','2'),('3','3'),('4','4'),('5','5')], validators=[DataRequired()])
     comment = TextAreaField('Comment', validators=[Optional()])
     submit = SubmitField('Submit Review')
+
+class ProductImportForm(FlaskForm):
+    file = FileField('Catalog File (CSV or JSONL)', validators=[
+        FileRequired(), FileAllowed(['csv', 'jsonl', 'ndjson', 'json'], 'Upload a .csv or .jsonl file.')
+    ])
+    submit = SubmitField('Import Products')
@@ -44,9 +44,11 @@ class BlogPost(BaseModel):
     __tablename__ = 'blog_posts'
     
     title = db.Column(db.String(200), nullable=False)
-    slug = db.Column(db.String(200), nullable=False, index=True)
+    slug = db.Column(db.String(200), unique=True, nullable=False, index=True)
     excerpt = db.Column(db.String(500))  # Short summary
     content = db.Column(db.Text, nullable=False)  # Full HTML content
+    content_html = db.Column(db.Text)  # Sanitized, rendered at write time (agrifarma.services.content)
+    content_html_version = db.Column(db.Integer)
     
     # Author
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -103,8 +105,13 @@ class BlogPost(BaseModel):
         return self.comments.filter_by(is_deleted=False).count()
     
     def increment_views(self):
-        """Increment view count."""
-        self.view_count += 1
+        """Increment view count atomically, leaving updated_at (page ETags) alone."""
+        cls = type(self)
+        db.session.execute(
+            db.update(cls).where(cls.id == self.id)
+            .values(view_count=cls.view_count + 1, updated_at=cls.updated_at)
+            .execution_options(counter_only=True)
+        )
         db.session.commit()
     
     def soft_delete(self):
@@ -1,6 +1,6 @@
 """CartItem model for persistent user carts.
-Session cart is primary for anonymous users; when authenticated we also persist
-items so users can recover their cart across devices.
+Session cart is used for anonymous users only; authenticated carts live here and
+the session cart is merged in on login (see agrifarma.services.cart).
 """
 from agrifarma.extensions import db
 from agrifarma.models.base import BaseModel
@@ -17,6 +17,9 @@ class CartItem(BaseModel):
     user = db.relationship('User', backref='cart_items')
     product = db.relationship('Product', backref='cart_entries')
 
+    # One line per product per user (target of the cart upsert)
+    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='_user_product_cart_uc'),)
+
     def __repr__(self):
         return f'<CartItem user={self.user_id} product={self.product_id} qty={self.quantity}>'
 
@@ -23,6 +23,9 @@ class Category(BaseModel):
     # Hierarchical structure
     parent_id = db.Column(db.Integer, db.ForeignKey('forum_categories.id'))
     parent = db.relationship('Category', remote_side='Category.id', backref='subcategories')
+    # Materialized path of ids from the root ('/3/7/12/'), kept by agrifarma.services.category_tree
+    path = db.Column(db.String(255), index=True)
+    depth = db.Column(db.Integer, default=0)
     
     # Display order
     position = db.Column(db.Integer, default=0)
@@ -38,42 +41,34 @@ class Category(BaseModel):
     def __repr__(self):
         return f'<Category {self.name}>'
     
+    def subtree_filter(self):
+        """Filter matching this category and every descendant (by materialized path)."""
+        if not self.path:  # not backfilled yet (flask rebuild-category-paths)
+            return Category.id == self.id
+        return Category.path.like(f'{self.path}%')
+
     def get_thread_count(self):
         """Get total number of threads in this category and subcategories."""
-        count = self.threads.filter_by(is_deleted=False).count()
-        for subcat in self.subcategories:
-            count += subcat.get_thread_count()
-        return count
+        return (Thread.query.join(Category, Thread.category_id == Category.id)
+                .filter(self.subtree_filter(), Thread.is_deleted == False).count())
     
     def get_reply_count(self):
         """Get total number of replies in this category and subcategories."""
-        count = sum(thread.replies.filter_by(is_deleted=False).count() 
-                   for thread in self.threads.filter_by(is_deleted=False))
-        for subcat in self.subcategories:
-            count += subcat.get_reply_count()
-        return count
+        return (Reply.query.join(Thread, Reply.thread_id == Thread.id)
+                .join(Category, Thread.category_id == Category.id)
+                .filter(self.subtree_filter(), Thread.is_deleted == False, Reply.is_deleted == False).count())
     
     def get_latest_thread(self):
         """Get the most recent thread in this category or subcategories."""
-        threads = list(self.threads.filter_by(is_deleted=False).order_by(Thread.created_at.desc()).limit(1))
-        
-        for subcat in self.subcategories:
-            subcat_latest = subcat.get_latest_thread()
-            if subcat_latest:
-                threads.append(subcat_latest)
-        
-        if threads:
-            return max(threads, key=lambda t: t.created_at)
-        return None
+        return (Thread.query.join(Category, Thread.category_id == Category.id)
+                .filter(self.subtree_filter(), Thread.is_deleted == False)
+                .order_by(Thread.created_at.desc()).first())
     
     def get_breadcrumb(self):
-        """Get breadcrumb trail for this category."""
-        breadcrumb = [self]
-        current = self.parent
-        while current:
-            breadcrumb.insert(0, current)
-            current = current.parent
-        return breadcrumb
+        """Get breadcrumb trail for this category (root first)."""
+        ids = [int(part) for part in (self.path or '').strip('/').split('/') if part] or [self.id]
+        by_id = {cat.id: cat for cat in Category.query.filter(Category.id.in_(ids))}
+        return [by_id[cid] for cid in ids if cid in by_id]
 
 
 class Thread(BaseModel):
@@ -83,9 +78,13 @@ class Thread(BaseModel):
     __tablename__ = 'forum_threads'
     
     title = db.Column(db.String(200), nullable=False)
-    slug = db.Column(db.String(200), nullable=False, index=True)
+    slug = db.Column(db.String(200), unique=True, nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
     
+    # Rendered at write time by agrifarma.services.content
+    content_html = db.Column(db.Text)
+    content_html_version = db.Column(db.Integer)
+    
     # Author
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     author = db.relationship('User', backref='threads', foreign_keys=[author_id])
@@ -101,10 +100,14 @@ class Thread(BaseModel):
     
     # Statistics
     view_count = db.Column(db.Integer, default=0)
+    hot_score = db.Column(db.Float, default=0.0, nullable=False)  # Time-decayed ranking (agrifarma.services.hot)
     
     # Timestamps
     last_activity = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    # "Hot" listings read the top N straight off this index
+    __table_args__ = (db.Index('ix_forum_threads_hot', 'is_deleted', 'hot_score'),)
+    
     # Relationships
     replies = db.relationship('Reply', backref='thread', lazy='dynamic',
                             cascade='all, delete-orphan', order_by='Reply.created_at')
@@ -121,8 +124,13 @@ class Thread(BaseModel):
         return self.replies.filter_by(is_deleted=False).order_by(Reply.created_at.desc()).first()
     
     def increment_views(self):
-        """Increment view count."""
-        self.view_count += 1
+        """Increment view count atomically, leaving updated_at (page ETags) alone."""
+        cls = type(self)
+        db.session.execute(
+            db.update(cls).where(cls.id == self.id)
+            .values(view_count=cls.view_count + 1, updated_at=cls.updated_at)
+            .execution_options(counter_only=True)
+        )
         db.session.commit()
     
     def update_activity(self):
@@ -154,6 +162,10 @@ class Reply(BaseModel):
     
     content = db.Column(db.Text, nullable=False)
     
+    # Rendered at write time by agrifarma.services.content
+    content_html = db.Column(db.Text)
+    content_html_version = db.Column(db.Integer)
+    
     # Author
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     author = db.relationship('User', backref='replies', foreign_keys=[author_id])
@@ -194,3 +206,99 @@ class Reply(BaseModel):
         self.is_solution = True
         self.thread.mark_as_solved()
         db.session.commit()
+
+
+class ThreadReadMark(BaseModel):
+    """
+    How far a user has read a thread: the newest reply id they have seen.
+    Written in batches by ``agrifarma.services.read_state``.
+    """
+    __tablename__ = 'forum_read_marks'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    thread_id = db.Column(db.Integer, db.ForeignKey('forum_threads.id'), nullable=False, index=True)
+    last_reply_id = db.Column(db.Integer, nullable=False, default=0)  # 0: read before any reply
+    
+    # One mark per thread per user (target of the batched upsert)
+    __table_args__ = (db.UniqueConstraint('user_id', 'thread_id', name='_user_thread_read_uc'),)
+    
+    def __repr__(self):
+        return f'<ThreadReadMark user={self.user_id} thread={self.thread_id} reply={self.last_reply_id}>'
+
+
+class CategoryReadMark(BaseModel):
+    """
+    "Mark all read" watermark: threads in the category with no activity after
+    ``read_at`` count as read for the user.
+    """
+    __tablename__ = 'forum_category_read_marks'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('forum_categories.id'), nullable=False)
+    read_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'category_id', name='_user_category_read_uc'),)
+    
+    def __repr__(self):
+        return f'<CategoryReadMark user={self.user_id} category={self.category_id} at={self.read_at}>'
+
+
+class ArchivedThread(BaseModel):
+    """
+    A thread moved out of ``forum_threads`` by ``agrifarma.services.archive``
+    (soft-deleted, or inactive for too long). Keeps the original id, so old
+    links still resolve through ``thread_detail``.
+    """
+    __tablename__ = 'forum_threads_archive'
+    
+    title = db.Column(db.String(200), nullable=False)
+    slug = db.Column(db.String(200), nullable=False)  # may be reused by a live thread
+    content = db.Column(db.Text, nullable=False)
+    content_html = db.Column(db.Text)
+    content_html_version = db.Column(db.Integer)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    is_pinned = db.Column(db.Boolean, default=False)
+    is_locked = db.Column(db.Boolean, default=False)
+    is_deleted = db.Column(db.Boolean, default=False)
+    is_solved = db.Column(db.Boolean, default=False)
+    view_count = db.Column(db.Integer, default=0)
+    hot_score = db.Column(db.Float, default=0.0, nullable=False)
+    last_activity = db.Column(db.DateTime, nullable=False)
+    
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    archive_reason = db.Column(db.String(20), nullable=False)  # deleted | inactive
+    
+    author = db.relationship('User', foreign_keys=[author_id])
+    category = db.relationship('Category', primaryjoin='foreign(ArchivedThread.category_id) == Category.id',
+                               viewonly=True)
+    
+    def __repr__(self):
+        return f'<ArchivedThread {self.title}>'
+
+
+class ArchivedReply(BaseModel):
+    """
+    A reply moved out of ``forum_replies``: with its archived thread, or on
+    its own once soft-deleted.
+    """
+    __tablename__ = 'forum_replies_archive'
+    
+    content = db.Column(db.Text, nullable=False)
+    content_html = db.Column(db.Text)
+    content_html_version = db.Column(db.Integer)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    thread_id = db.Column(db.Integer, nullable=False, index=True)  # live or archived thread
+    is_deleted = db.Column(db.Boolean, default=False)
+    is_solution = db.Column(db.Boolean, default=False)
+    is_edited = db.Column(db.Boolean, default=False)
+    edited_at = db.Column(db.DateTime)
+    edited_by_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    archive_reason = db.Column(db.String(20), nullable=False)
+    
+    author = db.relationship('User', foreign_keys=[author_id])
+    
+    def __repr__(self):
+        return f'<ArchivedReply {self.id} on Thread {self.thread_id}>'
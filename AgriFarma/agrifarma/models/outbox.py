@@ -0,0 +1,32 @@
+"""OutboxEvent model: side effects queued in the same transaction as domain changes.
+Rows are claimed and dispatched by ``flask worker`` (see agrifarma.services.outbox).
+"""
+import json
+from datetime import datetime
+from agrifarma.extensions import db
+from agrifarma.models.base import BaseModel
+
+
+class OutboxEvent(BaseModel):
+    __tablename__ = 'outbox_events'
+
+    topic = db.Column(db.String(100), nullable=False, index=True)  # e.g. order.placed
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, done, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # not dispatched before this
+    locked_by = db.Column(db.String(100))  # lease token of the worker holding the row
+    locked_until = db.Column(db.DateTime)  # lease expiry; expired leases are re-claimable
+    last_error = db.Column(db.Text)
+    processed_at = db.Column(db.DateTime)
+
+    # Claim query: pending rows that are due, oldest first
+    __table_args__ = (db.Index('ix_outbox_status_available', 'status', 'available_at'),)
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.topic} status={self.status} attempts={self.attempts}>'
+
+    @property
+    def data(self):
+        """Decoded payload."""
+        return json.loads(self.payload or '{}')
@@ -85,8 +85,13 @@ class Product(BaseModel):
         db.session.commit()
     
     def increment_views(self):
-        """Increment product view count."""
-        self.view_count += 1
+        """Increment product view count atomically, leaving updated_at (page ETags) alone."""
+        cls = type(self)
+        db.session.execute(
+            db.update(cls).where(cls.id == self.id)
+            .values(view_count=cls.view_count + 1, updated_at=cls.updated_at)
+            .execution_options(counter_only=True)
+        )
         db.session.commit()
     
     def increment_sold(self, quantity=1):
@@ -153,20 +158,21 @@ class Order(BaseModel):
         """Get total number of items in order."""
         return sum(item.quantity for item in self.order_items)
     
-    def update_status(self, new_status):
-        """Update order status with timestamp."""
-        self.status = new_status
-        
-        if new_status == 'paid' and not self.paid_at:
-            self.paid_at = datetime.utcnow()
-        elif new_status == 'shipped' and not self.shipped_at:
-            self.shipped_at = datetime.utcnow()
-        elif new_status == 'delivered' and not self.delivered_at:
-            self.delivered_at = datetime.utcnow()
-        elif new_status == 'cancelled' and not self.cancelled_at:
-            self.cancelled_at = datetime.utcnow()
-        
-        db.session.commit()
+    def update_status(self, new_status, actor_id=None, note=None, commit=True):
+        """Move the order to ``new_status`` through the order state machine.
+
+        Validates the transition, stamps the matching timestamp and logs an
+        OrderEvent; raises InvalidTransition otherwise. Pass ``commit=False``
+        to batch it into the caller's transaction. For many orders use
+        ``agrifarma.services.orders.transition_orders`` instead.
+        """
+        from agrifarma.services.orders import transition_orders, InvalidTransition
+        field = 'payment_status' if new_status in ('paid', 'refunded') else 'status'
+        result = transition_orders([self.id], new_status, field=field, actor_id=actor_id, note=note)
+        if self.id in result.rejected:
+            raise InvalidTransition(result.rejected[self.id])
+        if commit:
+            db.session.commit()
 
 
 class OrderItem(BaseModel):
@@ -192,3 +198,23 @@ class OrderItem(BaseModel):
     
     def __repr__(self):
         return f'<OrderItem {self.product_name} x{self.quantity}>'
+
+
+class OrderEvent(BaseModel):
+    """
+    Audit log of order state changes (one row per order per transition).
+    """
+    __tablename__ = 'order_events'
+    
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    field = db.Column(db.String(20), nullable=False, default='status')  # status or payment_status
+    from_value = db.Column(db.String(50))
+    to_value = db.Column(db.String(50), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # None for system changes
+    note = db.Column(db.String(255))
+    
+    order = db.relationship('Order', backref=db.backref('events', lazy='dynamic', order_by='OrderEvent.id'))
+    actor = db.relationship('User', lazy=True)
+    
+    def __repr__(self):
+        return f'<OrderEvent order={self.order_id} {self.field}: {self.from_value} -> {self.to_value}>'
@@ -6,6 +6,7 @@ from flask_login import login_required, current_user
 from functools import wraps
 import os
 from agrifarma.extensions import db
+from agrifarma.services.db_routing import read_replica
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -34,17 +35,24 @@ def dashboard():
 @login_required
 @admin_required
 def users():
-    """Manage users route with role filter."""
-    from agrifarma.models.user import User
+    """Manage users route; rows are loaded lazily from the users grid."""
     from agrifarma.models.role import Role
-    from agrifarma.extensions import db
     role_filter = request.args.get('role', '').strip()
-    query = User.query
-    if role_filter:
-        query = query.join(Role).filter(Role.name == role_filter)
-    users_list = query.order_by(User.join_date.desc()).all()
     roles = Role.query.all()
-    return render_template('admin/user.html', title='Manage Users', users=users_list, roles=roles, role_filter=role_filter)
+    return render_template('admin/user.html', title='Manage Users', roles=roles, role_filter=role_filter)
+
+
+@admin_bp.route('/grid/<name>')
+@login_required
+@admin_required
+@read_replica
+def grid_data(name):
+    """Server-side grid endpoint: one page of compact rows plus the total count."""
+    from agrifarma.services.grid import get_grid
+    grid = get_grid(name)
+    if grid is None:
+        return jsonify({'error': 'Unknown grid'}), 404
+    return jsonify(grid.query(request.args))
 
 
 @admin_bp.route('/users/<int:user_id>')
@@ -165,9 +173,33 @@ def toggle_checkbot():
     return redirect(url_for('admin.settings'))
 
 
+@admin_bp.route('/page-cache')
+@login_required
+@admin_required
+def page_cache_stats():
+    """Hit/miss metrics of the anonymous page cache (this worker process)."""
+    from agrifarma.services.page_cache import get_page_cache
+    cache = get_page_cache()
+    return jsonify(cache.stats() if cache else {'enabled': False})
+
+
+@admin_bp.route('/page-cache/clear', methods=['POST'])
+@login_required
+@admin_required
+def page_cache_clear():
+    """Drop every cached page."""
+    from agrifarma.services.page_cache import get_page_cache
+    cache = get_page_cache()
+    if cache:
+        cache.clear()
+    flash('Page cache cleared.', 'success')
+    return redirect(request.referrer or url_for('admin.settings'))
+
+
 @admin_bp.route('/reports')
 @login_required
 @admin_required
+@read_replica
 def reports():
     """Admin analytics and reports dashboard."""
     from agrifarma.models.user import User
@@ -240,23 +272,20 @@ def reports():
 @login_required
 @admin_required
 def orders():
-    """Admin orders list with optional status filter."""
+    """Admin orders list with optional status filter; rows come from the orders grid."""
     from agrifarma.models.product import Order
     status = request.args.get('status', '').strip()
-    q = Order.query
-    if status:
-        q = q.filter_by(status=status)
-    orders = q.order_by(Order.order_date.desc()).all()
-    return render_template('admin/orders.html', title='Manage Orders', orders=orders, status=status)
+    status_counts = dict(db.session.query(Order.status, db.func.count(Order.id)).group_by(Order.status).all())
+    return render_template('admin/orders.html', title='Manage Orders', status=status, status_counts=status_counts)
 
 @admin_bp.route('/products')
 @login_required
 @admin_required
+@read_replica
 def products():
     """Admin product management view with basic inventory & performance metrics."""
     from agrifarma.models.product import Product, OrderItem
     from agrifarma.extensions import db
-    products = Product.query.order_by(Product.created_at.desc()).all()
     total_active = Product.query.filter_by(is_active=True).count()
     low_stock = Product.query.filter(Product.stock_quantity <= Product.low_stock_threshold).count()
     featured_count = Product.query.filter_by(is_featured=True).count()
@@ -275,7 +304,7 @@ def products():
             'sold_total': int(row[3] or 0)
         } for row in category_rows if row[0]
     ]
-    return render_template('admin/products.html', title='Manage Products', products=products, total_active=total_active,
+    return render_template('admin/products.html', title='Manage Products', total_active=total_active,
                            low_stock=low_stock, featured_count=featured_count, total_sold_units=total_sold_units,
                            top_selling=top_selling, category_summary=category_summary)
 
@@ -329,30 +358,58 @@ def order_detail(order_id):
 @admin_required
 def order_update(order_id):
     from agrifarma.models.product import Order
-    from agrifarma.extensions import db
+    from agrifarma.services.orders import transition_orders, InvalidTransition
     order = Order.query.get_or_404(order_id)
-    # Update fields
     new_status = request.form.get('status')
     payment_status = request.form.get('payment_status')
     tracking_number = request.form.get('tracking_number')
     carrier = request.form.get('carrier')
 
-    # Validate status
-    allowed_status = {'pending','processing','shipped','delivered','cancelled'}
-    if new_status and new_status in allowed_status:
-        order.update_status(new_status)
-    if payment_status in {'unpaid','paid','refunded'}:
-        order.payment_status = payment_status
-        if payment_status == 'paid' and not order.paid_at:
-            from datetime import datetime
-            order.paid_at = datetime.utcnow()
+    # Status changes go through the state machine; invalid moves are reported, not applied
+    errors = []
+    for field, target in (('status', new_status), ('payment_status', payment_status)):
+        if target and target != getattr(order, field):
+            try:
+                result = transition_orders([order.id], target, field=field, actor_id=current_user.id)
+            except InvalidTransition as exc:
+                errors.append(str(exc))
+                continue
+            errors.extend(result.rejected.values())
     order.tracking_number = tracking_number or None
     order.carrier = carrier or None
     db.session.commit()
-    flash('Order updated successfully.', 'success')
+    if errors:
+        flash('Order saved, but: ' + '; '.join(errors), 'warning')
+    else:
+        flash('Order updated successfully.', 'success')
     return redirect(url_for('admin.order_detail', order_id=order.id))
 
 
+@admin_bp.route('/orders/bulk-status', methods=['POST'])
+@login_required
+@admin_required
+def orders_bulk_status():
+    """Move many orders to one status (or payment status) in a single transaction."""
+    from agrifarma.services.orders import transition_orders, MACHINES, InvalidTransition
+    target = request.form.get('target', '').strip()
+    order_ids = [int(i) for i in request.form.getlist('order_ids') if i.isdigit()]
+    field = 'payment_status' if target in MACHINES['payment_status'] else 'status'
+    if not order_ids:
+        flash('Select at least one order.', 'warning')
+        return redirect(url_for('admin.orders'))
+    try:
+        result = transition_orders(order_ids, target, field=field, actor_id=current_user.id,
+                                   note=request.form.get('note', '').strip()[:255] or None)
+    except InvalidTransition as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('admin.orders'))
+    db.session.commit()
+    flash(f'{len(result.moved)} order(s) moved to {target}.', 'success')
+    if result.rejected:
+        flash(f'{len(result.rejected)} order(s) skipped (not in a state that can move to {target}).', 'warning')
+    return redirect(url_for('admin.orders', status=request.form.get('return_status') or None))
+
+
 # --- SRS Compliance Dashboard ---
 @admin_bp.route('/srs-status')
 @login_required
@@ -3,7 +3,7 @@ Authentication routes for login, registration, and logout.
 """
 import os
 from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, session
 from flask_login import login_user, logout_user, current_user, login_required
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
@@ -13,6 +13,9 @@ from agrifarma.models.role import Role
 from agrifarma.forms.auth import (LoginForm, RegisterForm, ForgotPasswordForm, 
                                   ResetPasswordForm, ChangePasswordForm)
 from agrifarma.forms.profile import EditProfileForm
+from agrifarma.services.cart import CartRepository
+from agrifarma.services.metrics import UPLOAD_SECONDS
+from agrifarma.services.rate_limit import rate_limit
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -38,7 +41,8 @@ def save_profile_picture(file):
             os.makedirs(upload_folder)
         
         filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
+        with UPLOAD_SECONDS.time(kind='profile_picture'):
+            file.save(filepath)
         return filename
     return None
 
@@ -50,6 +54,7 @@ def load_user(user_id):
 
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit(10, 60, by='ip')
 def login():
     """Login route."""
     if current_user.is_authenticated:
@@ -71,8 +76,11 @@ def login():
             flash('Your account has been deactivated. Please contact support.', 'warning')
             return redirect(url_for('auth.login'))
         
-        # Update last login
-        user.update_last_login()
+        # Update last login and fold the anonymous session cart into the
+        # persisted cart in a single commit
+        user.last_login = datetime.utcnow()
+        CartRepository(user.id).merge_session_cart(session.pop('cart', None))
+        db.session.commit()
         
         login_user(user, remember=form.remember_me.data)
         
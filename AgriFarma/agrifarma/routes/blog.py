@@ -7,22 +7,20 @@ from werkzeug.utils import secure_filename
 from agrifarma.extensions import db
 from agrifarma.models.blog import BlogPost, BlogCategory, BlogComment, BlogLike, BlogAttachment
 from agrifarma.forms.blog import BlogPostForm, BlogCommentForm, BlogCategoryForm, BlogSearchForm
+from agrifarma.utils.conditional import conditional_page, rows_signature, newest
+from agrifarma.services.page_cache import cached_page
+from agrifarma.services.metrics import UPLOAD_SECONDS
+from agrifarma.services.slugs import assign_unique_slug
+from agrifarma.services import reputation
+from agrifarma.services.rate_limit import rate_limit
 from datetime import datetime
 import os
-import re
 
 blog_bp = Blueprint('blog', __name__)
 
 
-def slugify(text):
-    """Convert text to URL-friendly slug."""
-    text = text.lower().strip()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
-    return text
-
-
 @blog_bp.route('/')
+@cached_page(tags=('blog',))
 def index():
     """Blog homepage route."""
     page = request.args.get('page', 1, type=int)
@@ -72,23 +70,9 @@ def post_detail(post_id, slug):
         if not current_user.is_authenticated or (current_user.id != post.author_id and not current_user.is_admin()):
             abort(404)
     
-    # Increment view count
+    # Increment view count (counted even when the client's copy is still fresh)
     post.increment_views()
     
-    # Get comments
-    comments = post.comments.filter_by(is_deleted=False, is_approved=True).all()
-    
-    # Comment form
-    form = BlogCommentForm()
-    
-    # Get related posts
-    related_posts = BlogPost.query.filter(
-        BlogPost.id != post.id,
-        BlogPost.category_id == post.category_id,
-        BlogPost.is_published == True,
-        BlogPost.is_deleted == False
-    ).order_by(BlogPost.published_at.desc()).limit(3).all()
-    
     # Check if user liked this post
     user_liked = False
     if current_user.is_authenticated:
@@ -97,20 +81,46 @@ def post_detail(post_id, slug):
             post_id=post.id
         ).first() is not None
     
-    return render_template('blog_detail.html',
-                         post=post,
-                         comments=comments,
-                         form=form,
-                         comment_form=form,
-                         related_posts=related_posts,
-                         user_liked=user_liked,
-                         user_has_liked=user_liked,
-                         title=post.title,
-                         segment='blog')
+    related_filter = (
+        BlogPost.id != post.id,
+        BlogPost.category_id == post.category_id,
+        BlogPost.is_published == True,
+        BlogPost.is_deleted == False
+    )
+    # Validators: the post, its comments and likes, and the related-posts box
+    comment_sig = rows_signature(BlogComment, BlogComment.post_id == post.id)
+    like_sig = rows_signature(BlogLike, BlogLike.post_id == post.id)
+    related_sig = rows_signature(BlogPost, *related_filter)
+    
+    def render():
+        # Get comments
+        comments = post.comments.filter_by(is_deleted=False, is_approved=True).all()
+        
+        # Comment form
+        form = BlogCommentForm()
+        
+        # Get related posts
+        related_posts = BlogPost.query.filter(*related_filter).order_by(BlogPost.published_at.desc()).limit(3).all()
+        
+        return render_template('blog_detail.html',
+                             post=post,
+                             comments=comments,
+                             form=form,
+                             comment_form=form,
+                             related_posts=related_posts,
+                             user_liked=user_liked,
+                             user_has_liked=user_liked,
+                             title=post.title,
+                             segment='blog')
+    
+    return conditional_page(render, newest(post.updated_at, comment_sig[1], like_sig[1], related_sig[1]),
+                            post.id, comment_sig[0], like_sig[0], related_sig[0], user_liked)
 
 
 @blog_bp.route('/post/<int:post_id>/<slug>/comment', methods=['POST'])
 @login_required
+@rate_limit(30, 60, by='ip')
+@rate_limit(10, 60)
 def add_comment(post_id, slug):
     """Add comment to blog post."""
     post = BlogPost.query.get_or_404(post_id)
@@ -150,19 +160,8 @@ def create_post():
     ]
     
     if form.validate_on_submit():
-        # Create slug from title
-        slug = slugify(form.title.data)
-        
-        # Ensure unique slug
-        base_slug = slug
-        counter = 1
-        while BlogPost.query.filter_by(slug=slug).first():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        
         post = BlogPost(
             title=form.title.data,
-            slug=slug,
             excerpt=form.excerpt.data,
             content=form.content.data,
             author_id=current_user.id,
@@ -173,6 +172,9 @@ def create_post():
             is_featured=form.is_featured.data
         )
         
+        # Unique slug from the title (one lookup query, retried on a concurrent duplicate)
+        assign_unique_slug(post, form.title.data)
+        
         # Ensure upload folder exists
         upload_folder = os.path.join('static', 'uploads', 'blog')
         os.makedirs(upload_folder, exist_ok=True)
@@ -183,7 +185,8 @@ def create_post():
             if file.filename:  # Check if actually a file with filename
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(upload_folder, filename)
-                file.save(filepath)
+                with UPLOAD_SECONDS.time(kind='blog_image'):
+                    file.save(filepath)
                 post.featured_image = f'uploads/blog/{filename}'
 
         # Handle attachments (multiple)
@@ -198,7 +201,8 @@ def create_post():
             fname_ts = f"{name}_{ts}{ext}"
             fpath = os.path.join(upload_folder, fname_ts)
             try:
-                f.save(fpath)
+                with UPLOAD_SECONDS.time(kind='blog_attachment'):
+                    f.save(fpath)
             except Exception:
                 continue
             rel_path = f'uploads/blog/{fname_ts}'
@@ -261,14 +265,7 @@ def edit_post(post_id):
         post.is_featured = form.is_featured.data
         
         # Update slug if title changed
-        new_slug = slugify(form.title.data)
-        if new_slug != post.slug:
-            base_slug = new_slug
-            counter = 1
-            while BlogPost.query.filter(BlogPost.slug==new_slug, BlogPost.id!=post.id).first():
-                new_slug = f"{base_slug}-{counter}"
-                counter += 1
-            post.slug = new_slug
+        assign_unique_slug(post, form.title.data)
         
         # Handle featured image upload
         if form.featured_image.data and hasattr(form.featured_image.data, 'filename'):
@@ -278,7 +275,8 @@ def edit_post(post_id):
             if file.filename:  # Check if actually a file with filename
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(upload_folder, filename)
-                file.save(filepath)
+                with UPLOAD_SECONDS.time(kind='blog_image'):
+                    file.save(filepath)
                 post.featured_image = f'uploads/blog/{filename}'
         
         # Publish if requested
@@ -334,12 +332,14 @@ def like_post(post_id):
         # Unlike
         db.session.delete(existing_like)
         post.like_count -= 1
+        reputation.blog_liked(post, current_user.id, -1)
         message = 'Post unliked.'
     else:
         # Like
         like = BlogLike(user_id=current_user.id, post_id=post.id)
         db.session.add(like)
         post.like_count += 1
+        reputation.blog_liked(post, current_user.id)
         message = 'Post liked!'
     
     db.session.commit()
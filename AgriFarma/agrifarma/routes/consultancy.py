@@ -11,11 +11,15 @@ from agrifarma.models.consultancy import ConsultantProfile, ConsultationSlot, Co
 from agrifarma.forms.consultancy import ConsultantProfileForm, SlotCreateForm, BookingForm, ContactConsultantForm
 from agrifarma.utils.decorators import admin_required
 from agrifarma.utils.decorators import consultant_required
+from agrifarma.services.outbox import enqueue
+from agrifarma.services.page_cache import cached_page
+from agrifarma.services.rate_limit import rate_limit
 
 consultancy_bp = Blueprint('consultancy', __name__)
 
 
 @consultancy_bp.route('/')
+@cached_page(tags=('consultancy',))
 def index():
     """Consultancy landing page with a subset of consultants."""
     consultants = ConsultantProfile.query.filter_by(is_verified=True).order_by(ConsultantProfile.created_at.desc()).limit(6).all()
@@ -96,6 +100,8 @@ def consultant_detail(consultant_id):
 
 @consultancy_bp.route('/consultant/<int:consultant_id>/contact', methods=['POST'])
 @login_required
+@rate_limit(20, 300, by='ip')
+@rate_limit(5, 300)
 def contact_consultant(consultant_id):
     """Submit a message to a consultant profile."""
     profile = ConsultantProfile.query.get_or_404(consultant_id)
@@ -240,6 +246,7 @@ def confirm_booking(booking_id):
         flash('Booking cannot be confirmed.', 'warning')
     else:
         booking.status = 'confirmed'
+        enqueue('consultancy.booking_confirmed', {'booking_id': booking.id})
         db.session.commit()
         flash('Booking confirmed.', 'success')
     return redirect(url_for('consultancy.consultant_dashboard'))
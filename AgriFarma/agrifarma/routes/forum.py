@@ -1,27 +1,27 @@
 """
 Forum routes for discussion board functionality.
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, abort, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import or_, desc
 from agrifarma.extensions import db
 from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.services.outbox import enqueue
+from agrifarma.services import archive, hot, live, reputation, similar
+from agrifarma.services.category_tree import CategoryCycleError, get_tree
+from agrifarma.services.read_state import mark_category_read, record_read, unread_thread_ids
+from agrifarma.utils.conditional import conditional_page, rows_signature, newest
+from agrifarma.services.page_cache import cached_page
+from agrifarma.services.slugs import assign_unique_slug
+from agrifarma.services.rate_limit import rate_limit
 from agrifarma.forms.forum import (CategoryForm, ThreadForm, ReplyForm, 
                                    SearchForm, MoveThreadForm, EditThreadForm, EditReplyForm)
 from datetime import datetime
-import re
+import time
 
 forum_bp = Blueprint('forum', __name__, url_prefix='/forum')
 
 
-def slugify(text):
-    """Convert text to URL-friendly slug."""
-    text = text.lower().strip()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
-    return text
-
-
 def get_latest_posts(limit=5):
     """Get latest forum posts for sidebar."""
     return Thread.query.filter_by(is_deleted=False).order_by(
@@ -30,17 +30,22 @@ def get_latest_posts(limit=5):
 
 
 @forum_bp.route('/')
+@cached_page(tags=('forum',))
 def index():
     """Forum index page showing all categories and recent threads."""
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = 20
-    
-    # Get all threads (pinned first, then by last activity)
-    threads_query = Thread.query.filter_by(is_deleted=False).order_by(
-        Thread.is_pinned.desc(), 
-        Thread.last_activity.desc()
-    )
+    tab = 'hot' if request.args.get('tab') == 'hot' else 'recent'
+    
+    if tab == 'hot':
+        threads_query = hot.hot_threads_query()
+    else:
+        # Get all threads (pinned first, then by last activity)
+        threads_query = Thread.query.filter_by(is_deleted=False).order_by(
+            Thread.is_pinned.desc(), 
+            Thread.last_activity.desc()
+        )
     
     threads_pagination = threads_query.paginate(
         page=page, per_page=per_page, error_out=False
@@ -58,9 +63,11 @@ def index():
     latest_posts = get_latest_posts()
     
     return render_template('forum.html',
+                         tab=tab,
                          categories=categories,
                          threads=threads_pagination.items,
                          pagination=threads_pagination,
+                         unread_ids=unread_thread_ids(current_user, threads_pagination.items),
                          total_threads=total_threads,
                          total_replies=total_replies,
                          latest_posts=latest_posts,
@@ -92,43 +99,112 @@ def category_detail(slug):
                          category=category,
                          threads=threads_pagination.items,
                          pagination=threads_pagination,
+                         unread_ids=unread_thread_ids(current_user, threads_pagination.items),
                          latest_posts=latest_posts,
                          segment='forum')
 
 
+@forum_bp.route('/category/<slug>/mark-read', methods=['POST'])
+@login_required
+def mark_category_as_read(slug):
+    """Mark every thread in a category as read for the current user."""
+    category = Category.query.filter_by(slug=slug, is_active=True).first_or_404()
+    mark_category_read(current_user.id, category.id)
+    db.session.commit()
+    
+    flash(f'All threads in {category.name} marked as read.', 'success')
+    return redirect(url_for('forum.category_detail', slug=category.slug))
+
+
 @forum_bp.route('/thread/<int:thread_id>/<slug>')
 def thread_detail(thread_id, slug):
     """View a specific thread with its replies."""
-    thread = Thread.query.filter_by(id=thread_id, is_deleted=False).first_or_404()
-    
-    # Increment view count
+    thread = Thread.query.filter_by(id=thread_id, is_deleted=False).first()
+    if thread is None:
+        # Old links to archived threads still resolve (read-only)
+        archived = archive.find_archived_thread(thread_id)
+        if archived is None:
+            abort(404)
+        return render_template('forum/archived_thread.html',
+                             thread=archived,
+                             replies=archive.archived_replies(archived.id),
+                             segment='forum')
+    
+    # Increment view count (counted even when the client's copy is still fresh)
     thread.increment_views()
     
     # Pagination for replies
     page = request.args.get('page', 1, type=int)
     per_page = 15
     
-    replies_query = thread.replies.filter_by(is_deleted=False).order_by(Reply.created_at)
-    replies_pagination = replies_query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    # Reply form
-    form = ReplyForm()
-    
-    latest_posts = get_latest_posts()
+    # Validators: the thread, its replies and the "latest posts" sidebar
+    reply_sig = rows_signature(Reply, Reply.thread_id == thread.id)
+    sidebar_activity = db.session.query(db.func.max(Thread.last_activity)).filter(Thread.is_deleted == False).scalar()
     
-    return render_template('forum/thread_detail.html',
-                         thread=thread,
-                         replies=replies_pagination.items,
-                         pagination=replies_pagination,
-                         form=form,
-                         latest_posts=latest_posts,
-                         segment='forum')
+    def render():
+        replies_query = thread.replies.filter_by(is_deleted=False).order_by(Reply.created_at)
+        replies_pagination = replies_query.paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        if current_user.is_authenticated:
+            record_read(current_user.id, thread.id, replies_pagination.items)
+        
+        # Reply form
+        form = ReplyForm()
+        
+        latest_posts = get_latest_posts()
+        
+        # New replies stream onto the last page only (LIVE_ENABLED)
+        live_url = None
+        if live.enabled() and not replies_pagination.has_next:
+            live_url = url_for('forum.thread_events', thread_id=thread.id)
+        
+        return render_template('forum/thread_detail.html',
+                             thread=thread,
+                             replies=replies_pagination.items,
+                             pagination=replies_pagination,
+                             form=form,
+                             latest_posts=latest_posts,
+                             live_url=live_url,
+                             segment='forum')
+    
+    return conditional_page(render, newest(thread.updated_at, reply_sig[1], sidebar_activity),
+                            thread.id, page, reply_sig[0])
+
+
+@forum_bp.route('/thread/<int:thread_id>/events')
+def thread_events(thread_id):
+    """Server-Sent Events stream of new replies in a thread."""
+    if not live.enabled() or not db.session.query(Thread.id).filter_by(id=thread_id, is_deleted=False).first():
+        abort(404)
+    
+    slots = live.get_slots()
+    if not slots.acquire():
+        response = Response('Too many live streams, try again later.\n', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '')
+    config = current_app.config
+    events = live.stream(live.get_broker(), live.thread_channel(thread_id),
+                         last_id=int(last_event_id) if last_event_id.isdigit() else None,
+                         heartbeat=config.get('LIVE_HEARTBEAT_SECONDS', live.DEFAULT_HEARTBEAT_SECONDS),
+                         max_seconds=config.get('LIVE_STREAM_MAX_SECONDS', live.DEFAULT_STREAM_MAX_SECONDS))
+    # The stream never touches the database; don't hold a connection for its lifetime
+    db.session.remove()
+    
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(slots.release)
+    return response
 
 
 @forum_bp.route('/thread/<int:thread_id>/<slug>/reply', methods=['POST'])
 @login_required
+@rate_limit(30, 60, by='ip')
+@rate_limit(10, 60)
 def post_reply(thread_id, slug):
     """Post a reply to a thread."""
     thread = Thread.query.filter_by(id=thread_id, is_deleted=False).first_or_404()
@@ -147,8 +223,12 @@ def post_reply(thread_id, slug):
         )
         
         db.session.add(reply)
+        db.session.flush()
+        enqueue('forum.reply_posted', {'reply_id': reply.id})
+        reputation.reply_posted(reply)
+        hot.refresh(thread.id)
         
-        # Update thread activity
+        # Update thread activity (commits the reply and its outbox event together)
         thread.update_activity()
         
         db.session.commit()
@@ -159,11 +239,15 @@ def post_reply(thread_id, slug):
         total_replies = thread.get_reply_count()
         per_page = 15
         last_page = (total_replies + per_page - 1) // per_page
+        reply_url = url_for('forum.thread_detail', 
+                            thread_id=thread.id, 
+                            slug=thread.slug, 
+                            page=last_page) + '#reply-' + str(reply.id)
         
-        return redirect(url_for('forum.thread_detail', 
-                              thread_id=thread.id, 
-                              slug=thread.slug, 
-                              page=last_page) + '#reply-' + str(reply.id))
+        # Push to anyone watching the thread live
+        live.publish_reply(reply, reply_url)
+        
+        return redirect(reply_url)
     
     # If form validation fails, redirect back with errors
     for field, errors in form.errors.items():
@@ -175,15 +259,14 @@ def post_reply(thread_id, slug):
 
 @forum_bp.route('/new-thread', methods=['GET', 'POST'])
 @login_required
+@rate_limit(10, 60, by='ip')
+@rate_limit(3, 60, burst=5)
 def new_thread():
     """Create a new discussion thread."""
     form = ThreadForm()
     
     # Populate category choices
-    categories = Category.query.filter_by(is_active=True).order_by(Category.name).all()
-    form.category_id.choices = [(0, 'Select a category...')] + [
-        (cat.id, cat.name) for cat in categories
-    ]
+    form.category_id.choices = [(0, 'Select a category...')] + get_tree().choices(active_only=True)
     
     if form.validate_on_submit():
         # Check if category is locked
@@ -192,26 +275,18 @@ def new_thread():
             flash('This category is locked. You cannot create new threads.', 'warning')
             return redirect(url_for('forum.new_thread'))
         
-        # Create slug from title
-        slug = slugify(form.title.data)
-        
-        # Ensure unique slug
-        base_slug = slug
-        counter = 1
-        while Thread.query.filter_by(slug=slug).first():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        
         thread = Thread(
             title=form.title.data,
-            slug=slug,
             content=form.content.data,
             author_id=current_user.id,
             category_id=form.category_id.data
         )
         
-        db.session.add(thread)
+        # Unique slug from the title (one lookup query, retried on a concurrent duplicate)
+        assign_unique_slug(thread, form.title.data)
+        hot.refresh(thread.id)
         db.session.commit()
+        similar.add_thread(thread)
         
         flash('Your discussion thread has been created successfully!', 'success')
         return redirect(url_for('forum.thread_detail', thread_id=thread.id, slug=thread.slug))
@@ -224,16 +299,32 @@ def new_thread():
                          segment='forum')
 
 
+@forum_bp.route('/similar')
+def similar_threads():
+    """Threads similar to a title (and body) being composed, solved ones first (JSON)."""
+    started = time.perf_counter()
+    title = request.args.get('title', '').strip()[:200]
+    content = request.args.get('content', '').strip()[:2000]
+    limit = min(request.args.get('limit', 5, type=int) or 5, 10)
+    matches = similar.similar_threads(title, content, limit) if len(title) >= 3 else []
+    response = jsonify({'title': title, 'threads': [{
+        'id': match.id,
+        'title': match.title,
+        'url': url_for('forum.thread_detail', thread_id=match.id, slug=match.slug),
+        'is_solved': match.is_solved,
+        'similarity': round(match.similarity, 2),
+    } for match in matches]})
+    response.headers['Server-Timing'] = f'similar;dur={(time.perf_counter() - started) * 1000:.2f}'
+    return response
+
+
 @forum_bp.route('/search')
 def search():
     """Search forum threads."""
     form = SearchForm(request.args, meta={'csrf': False})
     
     # Populate category choices
-    categories = Category.query.filter_by(is_active=True).order_by(Category.name).all()
-    form.category_id.choices = [(0, 'All Categories')] + [
-        (cat.id, cat.name) for cat in categories
-    ]
+    form.category_id.choices = [(0, 'All Categories')] + get_tree().choices(active_only=True)
     
     results = []
     page = request.args.get('page', 1, type=int)
@@ -308,10 +399,7 @@ def create_category():
     form = CategoryForm()
     
     # Populate parent category choices
-    categories = Category.query.order_by(Category.name).all()
-    form.parent_id.choices = [(0, 'None (Top Level)')] + [
-        (cat.id, cat.name) for cat in categories
-    ]
+    form.parent_id.choices = [(0, 'None (Top Level)')] + get_tree().choices()
     
     if form.validate_on_submit():
         # Check slug uniqueness
@@ -353,10 +441,7 @@ def edit_category(category_id):
     form = CategoryForm(obj=category)
     
     # Populate parent category choices (exclude self and descendants)
-    categories = Category.query.filter(Category.id != category_id).order_by(Category.name).all()
-    form.parent_id.choices = [(0, 'None (Top Level)')] + [
-        (cat.id, cat.name) for cat in categories if cat.id != category_id
-    ]
+    form.parent_id.choices = [(0, 'None (Top Level)')] + get_tree().choices(exclude_subtree=category_id)
     
     if form.validate_on_submit():
         # Check slug uniqueness (exclude current category)
@@ -374,7 +459,13 @@ def edit_category(category_id):
         category.position = int(form.position.data) if form.position.data else 0
         category.is_active = form.is_active.data
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except CategoryCycleError:
+            # The parent list can be a little stale (another worker moved a category)
+            db.session.rollback()
+            flash('A category cannot be moved under itself or one of its subcategories.', 'danger')
+            return redirect(url_for('forum.edit_category', category_id=category_id))
         
         flash(f'Category "{category.name}" has been updated successfully!', 'success')
         return redirect(url_for('forum.manage_categories'))
@@ -439,8 +530,7 @@ def move_thread(thread_id):
     form = MoveThreadForm()
     
     # Populate category choices
-    categories = Category.query.filter_by(is_active=True).order_by(Category.name).all()
-    form.category_id.choices = [(cat.id, cat.name) for cat in categories]
+    form.category_id.choices = get_tree().choices(active_only=True)
     
     if form.validate_on_submit():
         old_category = thread.category
@@ -504,6 +594,10 @@ def delete_reply(reply_id):
         abort(403)
     
     thread = reply.thread
+    if not reply.is_deleted:
+        reputation.reply_deleted(reply)
+        reply.is_deleted = True
+        hot.refresh(thread.id)
     reply.soft_delete()
     
     flash('Reply has been deleted.', 'success')
@@ -521,7 +615,22 @@ def mark_solution(reply_id):
     if not (current_user.is_admin() or thread.author_id == current_user.id):
         abort(403)
     
+    # Points move in the same commit as the solution flag
+    reputation.solution_marked(reply)
     reply.mark_as_solution()
+    hot.refresh(thread.id)
+    db.session.commit()
+    similar.mark_solved(thread.id)
     
     flash('Reply has been marked as the solution!', 'success')
     return redirect(url_for('forum.thread_detail', thread_id=thread.id, slug=thread.slug) + f'#reply-{reply.id}')
+
+
+@forum_bp.route('/leaderboard')
+def leaderboard():
+    """Top members by reputation (JSON, cached per process)."""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'points': reputation.POINTS,
+        'leaders': reputation.get_leaderboard().top(limit),
+    })
@@ -5,7 +5,6 @@ Handles homepage and general pages.
 from flask import Blueprint, render_template
 from flask_login import current_user, login_required
 from agrifarma.extensions import db
-from sqlalchemy import text
 
 main_bp = Blueprint('main', __name__)
 
@@ -28,18 +27,14 @@ def shop_redirect():
 def health():
     """Lightweight health/status endpoint.
 
-    Returns JSON with app status and a simple database connectivity check.
-    Safe for uptime probes. Avoids heavy queries.
+    Returns JSON with app status and the database check from the cached
+    deep checks (see /readyz). Safe for uptime probes: no I/O per request.
     """
-    from flask import jsonify
-    status = 'ok'
-    db_ok = True
-    try:
-        # Minimal DB ping (SQLite: simple select 1)
-        db.session.execute(text('SELECT 1'))
-    except Exception as exc:
-        db_ok = False
-        status = 'degraded'
+    from flask import jsonify, current_app
+    from agrifarma.services.health import get_monitor
+    ready, report = get_monitor(current_app).snapshot()
+    db_ok = report['checks']['database']['ok'] and not report['stale']
+    status = 'ok' if ready else 'degraded'
     return jsonify({
         'status': status,
         'database': 'ok' if db_ok else 'error',
@@ -48,6 +43,38 @@ def health():
     }), (200 if db_ok else 500)
 
 
+@main_bp.route('/livez')
+def livez():
+    """Liveness probe: the process is serving requests. No I/O."""
+    from flask import jsonify
+    return jsonify({'status': 'alive'}), 200, {'Cache-Control': 'no-store'}
+
+
+@main_bp.route('/readyz')
+def readyz():
+    """Readiness probe: cached deep checks (database, uploads, schema) with timestamps."""
+    from flask import jsonify, current_app
+    from agrifarma.services.health import get_monitor
+    ready, report = get_monitor(current_app).snapshot()
+    return jsonify(report), (200 if ready else 503), {'Cache-Control': 'no-store'}
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (all workers when METRICS_MULTIPROC_DIR is set).
+
+    When METRICS_TOKEN is configured the scraper must send it as a bearer token.
+    """
+    from flask import Response, abort, current_app, request
+    from agrifarma.services.metrics import CONTENT_TYPE, collect, render
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(render(collect(current_app)), content_type=CONTENT_TYPE, headers={'Cache-Control': 'no-store'})
+
+
 @main_bp.route('/about')
 def about():
     """About page route with its own background."""
@@ -68,8 +95,11 @@ def contact():
         subject = request.form.get('subject')
         message = request.form.get('message')
         
-        # Here you can add email sending logic or save to database
-        # For now, just show a success message
+        # Delivered to the admin inbox by the outbox worker
+        from agrifarma.services.outbox import enqueue
+        enqueue('contact.message', {'name': name, 'email': email, 'phone': phone,
+                                    'subject': subject, 'message': message})
+        db.session.commit()
         flash(f'Thank you {name}! Your message has been received. We will contact you soon.', 'success')
         
     return render_template('home/contact.html', title='Contact Us', segment='contact')
@@ -86,6 +116,7 @@ def faqs():
 def dashboard():
     """User dashboard route with role-based data and quick stats."""
     from agrifarma.models.forum import Thread
+    from agrifarma.services import hot
     from agrifarma.models.product import Product
     from agrifarma.models.consultancy import ConsultantProfile
     from agrifarma.models.blog import BlogPost
@@ -97,10 +128,8 @@ def dashboard():
     total_consultants = ConsultantProfile.query.filter_by(is_verified=True).count()
     total_blogs = BlogPost.query.filter_by(is_published=True, is_deleted=False).count()
     
-    # Get latest forum posts
-    latest_threads = Thread.query.filter_by(is_deleted=False).order_by(
-        Thread.last_activity.desc()
-    ).limit(5).all()
+    # Hottest forum threads (one query on the hot_score index)
+    hot_threads = hot.hot_threads(3)
     
     # Get recommended consultants (top rated)
     recommended_consultants = ConsultantProfile.query.filter_by(
@@ -149,7 +178,7 @@ def dashboard():
                          total_products=total_products,
                          total_consultants=total_consultants,
                          total_blogs=total_blogs,
-                         latest_threads=latest_threads,
+                         hot_threads=hot_threads,
                          recommended_consultants=recommended_consultants,
                          featured_products=featured_products,
                          recent_blogs=recent_blogs,
@@ -1,21 +1,32 @@
 """
 Marketplace routes for e-commerce functionality.
 Implements: product listing, product detail, cart, checkout, orders.
-Cart is session-based; checkout creates Order and OrderItems.
+Cart is session-based for anonymous visitors and persisted for authenticated
+users (see agrifarma.services.cart); checkout creates Order and OrderItems.
 """
 from datetime import datetime
 import random
 import string
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort
+import time
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, session, abort,
+                   Response, stream_with_context, jsonify)
 from flask_login import login_required, current_user
 
 from agrifarma.extensions import db
 from agrifarma.models.product import Product, Order, OrderItem
-from agrifarma.models.cart import CartItem
 from agrifarma.models.product_review import ProductReview
 from agrifarma.forms.marketplace import CheckoutForm
-from agrifarma.forms.product import ProductForm, ReviewForm
+from agrifarma.forms.product import ProductForm, ReviewForm, ProductImportForm
 from agrifarma.utils.decorators import vendor_required, admin_required
+from agrifarma.utils.conditional import conditional_page, rows_signature, newest
+from agrifarma.services.cart import CartRepository, clamp_quantity
+from agrifarma.services.product_images import resolve_product_image
+from agrifarma.services.catalog_io import import_catalog, export_catalog, catalog_format, FORMATS
+from agrifarma.services.autocomplete import suggest, expand_query
+from agrifarma.services.outbox import enqueue
+from agrifarma.services.page_cache import cached_page
+from agrifarma.services.metrics import UPLOAD_SECONDS, EXPORT_SECONDS, observe_iter
+from agrifarma.services.rate_limit import rate_limit
 
 marketplace_bp = Blueprint('marketplace', __name__)
 
@@ -29,19 +40,28 @@ def _get_cart():
     return session['cart']
 
 
-def _cart_totals():
-    """Compute cart totals and items list with product snapshots."""
+def _cart_lines():
+    """Return ``[(product, quantity), ...]`` for the current cart using one product query."""
+    if current_user.is_authenticated:
+        return CartRepository(current_user.id).lines()
     cart = _get_cart()
-    items = []
-    subtotal = 0.0
-    for pid_str, qty in cart.items():
+    product_ids = []
+    for pid_str in cart:
         try:
-            pid = int(pid_str)
+            product_ids.append(int(pid_str))
         except ValueError:
             continue
-        product = Product.query.filter_by(id=pid, is_active=True).first()
-        if not product:
-            continue
+    if not product_ids:
+        return []
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids), Product.is_active == True).all()}
+    return [(products[pid], cart[str(pid)]) for pid in product_ids if pid in products]
+
+
+def _cart_totals():
+    """Compute cart totals and items list with product snapshots."""
+    items = []
+    subtotal = 0.0
+    for product, qty in _cart_lines():
         unit_price = product.price
         total_price = round(unit_price * qty, 2)
         subtotal = round(subtotal + total_price, 2)
@@ -62,6 +82,7 @@ def _generate_order_number():
 
 
 @marketplace_bp.route('/')
+@cached_page(tags=('products',))
 def index():
     """Marketplace product listing with simple filters and featured section."""
     q = request.args.get('q', '').strip()
@@ -79,8 +100,12 @@ def index():
 
     query = Product.query.filter_by(is_active=True)
     if q:
-        like = f"%{q}%"
-        query = query.filter(Product.name.ilike(like) | Product.description.ilike(like) | Product.brand.ilike(like))
+        # Roman-Urdu synonyms ("gandum" -> "wheat") widen the match
+        conditions = []
+        for term in expand_query(q) or [q]:
+            like = f"%{term}%"
+            conditions.append(Product.name.ilike(like) | Product.description.ilike(like) | Product.brand.ilike(like))
+        query = query.filter(db.or_(*conditions))
     if category:
         query = query.filter_by(category=category)
     if min_price is not None:
@@ -143,21 +168,52 @@ def index():
                            show_summary=show_summary, price_summary=price_summary)
 
 
+@marketplace_bp.route('/autocomplete')
+def autocomplete():
+    """Typo-tolerant search suggestions for the marketplace search box (JSON)."""
+    started = time.perf_counter()
+    q = request.args.get('q', '').strip()[:100]
+    limit = min(request.args.get('limit', 8, type=int) or 8, 20)
+    suggestions = []
+    for item in suggest(q, limit) if q else []:
+        if item.kind == 'product':
+            url = url_for('marketplace.product', product_id=item.ref)
+        elif item.kind == 'category':
+            url = url_for('marketplace.index', category=item.ref)
+        else:
+            url = url_for('marketplace.index', q=item.ref)
+        suggestions.append({'text': item.text, 'type': item.kind, 'url': url})
+    response = jsonify({'q': q, 'suggestions': suggestions})
+    response.headers['Cache-Control'] = 'public, max-age=30'
+    response.headers['Server-Timing'] = f'autocomplete;dur={(time.perf_counter() - started) * 1000:.2f}'
+    return response
+
+
 @marketplace_bp.route('/product/<int:product_id>')
 def product(product_id):
     """Product detail page."""
     product = Product.query.filter_by(id=product_id, is_active=True).first_or_404()
-    # Increment views
+    # Increment views (counted even when the client's copy is still fresh)
     product.increment_views()
-    # Related products from same category
-    related_products = Product.query.filter(Product.category == product.category, Product.id != product.id, Product.is_active == True).limit(4).all()
-    review_form = ReviewForm()
-    reviews = ProductReview.query.filter_by(product_id=product.id).order_by(ProductReview.created_at.desc()).limit(20).all()
-    return render_template('marketplace_item.html', title=product.name, product=product, related_products=related_products, review_form=review_form, reviews=reviews)
+    related_filter = (Product.category == product.category, Product.id != product.id, Product.is_active == True)
+    review_sig = rows_signature(ProductReview, ProductReview.product_id == product.id)
+    related_sig = rows_signature(Product, *related_filter)
+
+    def render():
+        # Related products from same category
+        related_products = Product.query.filter(*related_filter).limit(4).all()
+        review_form = ReviewForm()
+        reviews = ProductReview.query.filter_by(product_id=product.id).order_by(ProductReview.created_at.desc()).limit(20).all()
+        return render_template('marketplace_item.html', title=product.name, product=product, related_products=related_products, review_form=review_form, reviews=reviews)
+
+    return conditional_page(render, newest(product.updated_at, review_sig[1], related_sig[1]),
+                            product.id, review_sig[0], related_sig[0])
 
 
 @marketplace_bp.route('/product/<int:product_id>/review', methods=['POST'])
 @login_required
+@rate_limit(20, 60, by='ip')
+@rate_limit(5, 60)
 def product_review(product_id):
     product = Product.query.filter_by(id=product_id, is_active=True).first_or_404()
     form = ReviewForm()
@@ -197,50 +253,6 @@ def product_new():
                 flash('A product with this slug already exists. Please choose a different slug.', 'danger')
                 return render_template('marketplace/product_form.html', title='New Product', form=form, mode='new')
             
-            # Auto-pick product image if not provided
-            def auto_image(name: str, category: str, provided: str) -> str:
-                if provided:
-                    return provided
-                # Mirror the mapping used in seeding for consistency
-                keyword_image_map = {
-                    'wheat': '/static/images/products/wheat.jpg',
-                    'rice': '/static/images/products/rice.jpg',
-                    'cotton': '/static/images/products/cotton.jpg',
-                    'corn': '/static/images/products/corn.jpg',
-                    'potato': '/static/images/products/potato.jpg',
-                    'tomato': '/static/images/products/tomato.jpg',
-                    'onion': '/static/images/products/onion.jpg',
-                    'sugarcane': '/static/images/products/sugarcane.jpg',
-                    'npk': '/static/images/products/npk.jpg',
-                    'urea': '/static/images/products/urea.jpg',
-                    'dap': '/static/images/products/dap.jpg',
-                    'compost': '/static/images/products/compost.jpg',
-                    'insecticide': '/static/images/products/insecticide.jpg',
-                    'fungicide': '/static/images/products/fungicide.jpg',
-                    'herbicide': '/static/images/products/herbicide.jpg',
-                    'sprinkler': '/static/images/products/sprinkler.jpg',
-                    'hoe': '/static/images/products/hoe.jpg',
-                    'shears': '/static/images/products/shears.jpg',
-                    'water pump': '/static/images/products/water-pump.jpg',
-                    'tractor tire': '/static/images/products/tractor-tire.jpg',
-                    'plow': '/static/images/products/plow.jpg',
-                    'harvester': '/static/images/products/harvester.jpg',
-                }
-                key = (name or '').lower()
-                for kw in sorted(keyword_image_map.keys(), key=lambda k: -len(k)):
-                    if kw in key:
-                        return keyword_image_map[kw]
-                # category defaults
-                cat = (category or '').lower()
-                cat_defaults = {
-                    'seeds': keyword_image_map.get('wheat'),
-                    'fertilizers': keyword_image_map.get('npk'),
-                    'pesticides': keyword_image_map.get('insecticide'),
-                    'tools': keyword_image_map.get('sprinkler'),
-                    'equipment': keyword_image_map.get('tractor tire') or keyword_image_map.get('plow'),
-                }
-                return cat_defaults.get(cat) or '/static/images/Backgrounds/pexels-quang-nguyen-vinh-222549-2131784.jpg'
-            
             # Create new product
             p = Product(
                 name=form.name.data,
@@ -256,7 +268,8 @@ def product_new():
                 weight=form.weight.data or None,
                 brand=form.brand.data,
                 manufacturer=form.manufacturer.data,
-                image_url=auto_image(form.name.data, form.category.data, form.image_url.data),
+                # Auto-pick product image if not provided
+                image_url=resolve_product_image(form.name.data, form.category.data, form.image_url.data),
                 is_active=form.is_active.data,
                 is_featured=form.is_featured.data,
                 vendor_id=current_user.id,
@@ -305,47 +318,7 @@ def product_edit(product_id):
         product.brand = form.brand.data
         product.manufacturer = form.manufacturer.data
         # If image field left empty, auto-pick based on name/category
-        def auto_image(name: str, category: str, provided: str) -> str:
-            if provided:
-                return provided
-            keyword_image_map = {
-                'wheat': '/static/images/products/wheat.jpg',
-                'rice': '/static/images/products/rice.jpg',
-                'cotton': '/static/images/products/cotton.jpg',
-                'corn': '/static/images/products/corn.jpg',
-                'potato': '/static/images/products/potato.jpg',
-                'tomato': '/static/images/products/tomato.jpg',
-                'onion': '/static/images/products/onion.jpg',
-                'sugarcane': '/static/images/products/sugarcane.jpg',
-                'npk': '/static/images/products/npk.jpg',
-                'urea': '/static/images/products/urea.jpg',
-                'dap': '/static/images/products/dap.jpg',
-                'compost': '/static/images/products/compost.jpg',
-                'insecticide': '/static/images/products/insecticide.jpg',
-                'fungicide': '/static/images/products/fungicide.jpg',
-                'herbicide': '/static/images/products/herbicide.jpg',
-                'sprinkler': '/static/images/products/sprinkler.jpg',
-                'hoe': '/static/images/products/hoe.jpg',
-                'shears': '/static/images/products/shears.jpg',
-                'water pump': '/static/images/products/water-pump.jpg',
-                'tractor tire': '/static/images/products/tractor-tire.jpg',
-                'plow': '/static/images/products/plow.jpg',
-                'harvester': '/static/images/products/harvester.jpg',
-            }
-            key = (name or '').lower()
-            for kw in sorted(keyword_image_map.keys(), key=lambda k: -len(k)):
-                if kw in key:
-                    return keyword_image_map[kw]
-            cat = (category or '').lower()
-            cat_defaults = {
-                'seeds': keyword_image_map.get('wheat'),
-                'fertilizers': keyword_image_map.get('npk'),
-                'pesticides': keyword_image_map.get('insecticide'),
-                'tools': keyword_image_map.get('sprinkler'),
-                'equipment': keyword_image_map.get('tractor tire') or keyword_image_map.get('plow'),
-            }
-            return cat_defaults.get(cat) or '/static/images/Backgrounds/pexels-quang-nguyen-vinh-222549-2131784.jpg'
-        product.image_url = auto_image(form.name.data, form.category.data, form.image_url.data)
+        product.image_url = resolve_product_image(form.name.data, form.category.data, form.image_url.data)
         product.is_active = form.is_active.data
         product.is_featured = form.is_featured.data
         db.session.commit()
@@ -354,6 +327,39 @@ def product_edit(product_id):
     return render_template('marketplace/product_form.html', title='Edit Product', form=form, mode='edit', product=product)
 
 
+@marketplace_bp.route('/products/import', methods=['GET', 'POST'])
+@login_required
+@vendor_required
+def product_import():
+    """Bulk-create or update the vendor's products from a CSV/JSONL upload."""
+    form = ProductImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        with UPLOAD_SECONDS.time(kind='catalog_import'):
+            report = import_catalog(upload.stream, catalog_format(upload.filename), vendor_id=current_user.id)
+        category = 'success' if not report.failed else 'warning'
+        flash(f'Import finished: {report.created} created, {report.updated} updated, {report.failed} rejected.', category)
+    return render_template('marketplace/product_import.html', form=form, report=report, title='Import Products')
+
+
+@marketplace_bp.route('/products/export')
+@login_required
+@vendor_required
+def product_export():
+    """Stream the vendor's catalog as CSV or JSONL for round-trip editing."""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in FORMATS:
+        abort(400)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"products_{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    return Response(
+        stream_with_context(observe_iter(export_catalog(fmt, vendor_id=current_user.id), EXPORT_SECONDS, kind=f'catalog_{fmt}')),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
 @marketplace_bp.route('/product/<int:product_id>/delete', methods=['POST'])
 @login_required
 def product_delete(product_id):
@@ -386,78 +392,69 @@ def cart_add(product_id):
         flash('This product is out of stock.', 'warning')
         return redirect(url_for('marketplace.product', product_id=product.id))
 
-    cart = _get_cart()
-    current_qty = int(cart.get(str(product.id), 0))
-    new_qty = min(current_qty + qty, max(1, product.stock_quantity))
-    cart[str(product.id)] = new_qty
-    session['cart'] = cart
-    session.modified = True
-    # Persist to CartItem if user is authenticated
-    if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-        existing_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product.id).first()
-        if existing_item:
-            existing_item.set_quantity(existing_item.quantity + qty)
-        else:
-            ci = CartItem(user_id=current_user.id, product_id=product.id, quantity=qty)
-            from agrifarma.extensions import db
-            db.session.add(ci)
-            db.session.commit()
+    # Authenticated carts are persisted; the session cart is for anonymous visitors only
+    if current_user.is_authenticated:
+        repo = CartRepository(current_user.id)
+        current_qty = repo.quantities().get(product.id, 0)
+        repo.upsert({product.id: clamp_quantity(current_qty + qty, product.stock_quantity)})
+        db.session.commit()
+    else:
+        cart = _get_cart()
+        current_qty = int(cart.get(str(product.id), 0))
+        cart[str(product.id)] = clamp_quantity(current_qty + qty, product.stock_quantity)
+        session['cart'] = cart
+        session.modified = True
     flash(f'Added {product.name} (x{qty}) to your cart.', 'success')
     return redirect(request.referrer or url_for('marketplace.cart_view'))
 
 
 @marketplace_bp.route('/cart/update', methods=['POST'])
 def cart_update():
-    cart = _get_cart()
-    updates = request.form
-    for key, value in updates.items():
+    requested = {}
+    for key, value in request.form.items():
         if not key.startswith('qty_'):
             continue
-        pid = key.replace('qty_', '')
         try:
-            qty = int(value)
+            pid = int(key.replace('qty_', ''))
         except ValueError:
-            qty = 1
-        qty = max(0, min(qty, 100))
+            continue
+        requested[pid] = clamp_quantity(value)
+    # One stock lookup for every line being kept
+    keep = [pid for pid, qty in requested.items() if qty > 0]
+    stock = dict(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(keep)).all()) if keep else {}
+    quantities = {}
+    for pid, qty in requested.items():
         if qty == 0:
-            cart.pop(pid, None)
-        else:
-            product = Product.query.get(int(pid))
-            if not product:
-                continue
-            qty = min(qty, max(1, product.stock_quantity))
-            cart[pid] = qty
-    session['cart'] = cart
-    session.modified = True
-    # Sync persistent cart for authenticated users
-    if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-        from agrifarma.extensions import db
-        for pid_str, qty in cart.items():
-            pid = int(pid_str)
-            ci = CartItem.query.filter_by(user_id=current_user.id, product_id=pid).first()
-            if ci:
-                ci.set_quantity(qty)
-            else:
-                if qty > 0:
-                    db.session.add(CartItem(user_id=current_user.id, product_id=pid, quantity=qty))
+            quantities[pid] = 0
+        elif pid in stock:
+            quantities[pid] = clamp_quantity(qty, stock[pid])
+
+    if current_user.is_authenticated:
+        CartRepository(current_user.id).upsert(quantities)
         db.session.commit()
+    else:
+        cart = _get_cart()
+        for pid, qty in quantities.items():
+            if qty == 0:
+                cart.pop(str(pid), None)
+            else:
+                cart[str(pid)] = qty
+        session['cart'] = cart
+        session.modified = True
     flash('Cart updated.', 'success')
     return redirect(url_for('marketplace.cart_view'))
 
 
 @marketplace_bp.route('/cart/remove/<int:product_id>', methods=['POST'])
 def cart_remove(product_id):
-    cart = _get_cart()
-    cart.pop(str(product_id), None)
-    session['cart'] = cart
-    session.modified = True
-    # Remove persistent cart item
-    if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-        ci = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
-        if ci:
-            from agrifarma.extensions import db
-            db.session.delete(ci)
-            db.session.commit()
+    if current_user.is_authenticated:
+        CartRepository(current_user.id).remove([product_id])
+        db.session.commit()
+    else:
+        cart = _get_cart()
+        cart.pop(str(product_id), None)
+        session['cart'] = cart
+        session.modified = True
     flash('Item removed from cart.', 'info')
     return redirect(url_for('marketplace.cart_view'))
 
@@ -525,6 +522,10 @@ def checkout():
             p.stock_quantity = max(0, p.stock_quantity - qty)
             p.sold_count = (p.sold_count or 0) + qty
             p.in_stock = p.stock_quantity > 0
+        # Clear persisted cart and queue the confirmation email in the same transaction as the order
+        CartRepository(current_user.id).clear()
+        db.session.flush()
+        enqueue('order.placed', {'order_id': order.id})
         db.session.commit()
 
         # Clear cart
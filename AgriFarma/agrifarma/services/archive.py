@@ -0,0 +1,124 @@
+"""
+Forum archival to cold tables.
+
+``archive()`` moves rows out of ``forum_threads`` and ``forum_replies`` into
+``forum_threads_archive`` and ``forum_replies_archive``, keeping their ids:
+
+1. threads that are soft-deleted, or have had no activity for
+   ``inactive_months`` (pinned threads excepted), together with all their
+   replies;
+2. soft-deleted replies of the threads that stay.
+
+Each chunk of ``batch_size`` threads (or replies) is one transaction:
+``INSERT ... SELECT`` into the archive, then ``DELETE`` from the hot table.
+Chunks are picked by id (keyset), so a run can stop at any point and resume.
+Read marks for archived threads are dropped.
+
+The newest thread and reply are never moved. SQLite without AUTOINCREMENT
+reuses ids above the current maximum, and a reused id would shadow its
+archived namesake.
+
+``thread_detail`` falls back to ``ArchivedThread`` when the id is no longer
+live, so old links keep working (read-only).
+"""
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, insert, literal, or_, select
+from agrifarma.extensions import db
+from agrifarma.models.forum import ArchivedReply, ArchivedThread, Reply, Thread, ThreadReadMark
+
+DEFAULT_INACTIVE_MONTHS = 12
+DEFAULT_BATCH_SIZE = 500
+
+
+class ArchiveReport(namedtuple('ArchiveReport', 'threads replies seconds')):
+    """Rows moved by one run, and how fast."""
+
+    @property
+    def rows(self):
+        return self.threads + self.replies
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
+def _shared_columns(source, target):
+    return [column.name for column in source.columns if column.name in target.columns]
+
+
+def _copy(source_model, target_model, where, reason, now):
+    """``INSERT INTO archive (...) SELECT ... FROM hot WHERE ...``; returns the row count."""
+    source, target = source_model.__table__, target_model.__table__
+    names = _shared_columns(source, target)
+    stmt = insert(target).from_select(
+        names + ['archived_at', 'archive_reason'],
+        select(*[source.c[name] for name in names], literal(now), reason).where(where),
+    )
+    return db.session.execute(stmt).rowcount
+
+
+def _chunks(model, condition, batch_size):
+    """Ids matching ``condition`` in ascending chunks (keyset pagination)."""
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            select(model.id).where(condition, model.id > last_id).order_by(model.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def archive(inactive_months=DEFAULT_INACTIVE_MONTHS, batch_size=DEFAULT_BATCH_SIZE, now=None, progress=None):
+    """Move stale forum content to the archive tables, committing per chunk.
+
+    ``progress(report)`` is called after every chunk. Returns an ``ArchiveReport``.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=30 * inactive_months)
+    started = time.monotonic()
+    threads = replies = 0
+    newest_thread = db.session.scalar(select(func.max(Thread.id))) or 0
+    newest_reply = db.session.scalar(select(func.max(Reply.id))) or 0
+    newest_reply_thread = db.session.scalar(select(Reply.thread_id).where(Reply.id == newest_reply))
+
+    thread_condition = (
+        or_(Thread.is_deleted.is_(True), (Thread.last_activity < cutoff) & Thread.is_pinned.is_not(True))
+        & (Thread.id != newest_thread)
+    )
+    if newest_reply_thread is not None:
+        thread_condition &= Thread.id != newest_reply_thread
+    thread_reason = case((Thread.is_deleted.is_(True), 'deleted'), else_='inactive')
+    for ids in _chunks(Thread, thread_condition, batch_size):
+        threads += _copy(Thread, ArchivedThread, Thread.id.in_(ids), thread_reason, now)
+        replies += _copy(Reply, ArchivedReply, Reply.thread_id.in_(ids),
+                         case((Reply.is_deleted.is_(True), 'deleted'), else_='thread'), now)
+        db.session.execute(delete(ThreadReadMark).where(ThreadReadMark.thread_id.in_(ids)))
+        db.session.execute(delete(Reply).where(Reply.thread_id.in_(ids)))
+        db.session.execute(delete(Thread).where(Thread.id.in_(ids)))
+        db.session.commit()
+        if progress:
+            progress(ArchiveReport(threads, replies, time.monotonic() - started))
+
+    reply_condition = Reply.is_deleted.is_(True) & (Reply.id != newest_reply)
+    for ids in _chunks(Reply, reply_condition, batch_size):
+        replies += _copy(Reply, ArchivedReply, Reply.id.in_(ids), literal('deleted'), now)
+        db.session.execute(delete(Reply).where(Reply.id.in_(ids)))
+        db.session.commit()
+        if progress:
+            progress(ArchiveReport(threads, replies, time.monotonic() - started))
+
+    return ArchiveReport(threads, replies, time.monotonic() - started)
+
+
+def find_archived_thread(thread_id):
+    """The archived, not soft-deleted thread with this id, or None."""
+    return ArchivedThread.query.filter_by(id=thread_id, is_deleted=False).first()
+
+
+def archived_replies(thread_id):
+    return (ArchivedReply.query.filter_by(thread_id=thread_id, is_deleted=False)
+            .order_by(ArchivedReply.created_at).all())
@@ -0,0 +1,220 @@
+"""
+Static asset pipeline: fingerprinted, precompressed copies of ``static/``.
+
+``flask assets build`` copies stylesheets, scripts and images into
+``static/dist`` under content-hashed names (``css/global.3f2a9c1e.css``),
+minifies CSS (rewriting its ``url()`` references to the hashed images),
+writes ``.gz`` and, when the optional ``brotli`` package is installed, ``.br``
+siblings for text assets, and records ``source -> hashed`` in
+``static/dist/manifest.json``.
+
+Templates call ``asset_url('css/global.css')``. With a manifest the helper
+returns the hashed URL under ``ASSETS_ROOT``; without one (development, a
+fresh checkout) it falls back to the plain file. Hashed files never change, so
+they are served with ``Cache-Control: immutable`` and the best precompressed
+variant the client accepts.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+SOURCE_DIRS = ('css', 'js', 'images', 'img')
+HASHED_EXTENSIONS = {'.css', '.js', '.svg', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.ico', '.woff', '.woff2'}
+COMPRESSED_EXTENSIONS = {'.css', '.js', '.svg'}
+MIN_COMPRESS_BYTES = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# --- CSS minification ---
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCT = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON = re.compile(r':\s+')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(text):
+    """Strip comments and redundant whitespace; string literals are left intact."""
+    strings = []
+
+    def stash(match):
+        strings.append(match.group(0))
+        return f'\x00{len(strings) - 1}\x00'
+
+    text = _CSS_COMMENT.sub('', text)
+    text = _CSS_STRING.sub(stash, text)
+    text = _CSS_SPACE.sub(' ', text)
+    text = _CSS_PUNCT.sub(r'\1', text)
+    # "a :hover" differs from "a:hover", so only the space after a colon goes
+    text = _CSS_COLON.sub(':', text)
+    text = text.replace(';}', '}').strip()
+    return re.sub(r'\x00(\d+)\x00', lambda m: strings[int(m.group(1))], text)
+
+
+def rewrite_css_urls(text, css_path, manifest):
+    """Point relative ``url()`` references of ``css_path`` at their hashed copies."""
+    base = posixpath.dirname(css_path)
+
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, sep, suffix = re.match(r'([^?#]*)([?#]?)(.*)', ref).groups()
+        target = manifest.get(posixpath.normpath(posixpath.join(base, path)))
+        if target is None:
+            return match.group(0)
+        # dist/ mirrors the source layout, so the hashed CSS sits in the same directory
+        return f'url({quote}{posixpath.relpath(target, base)}{sep}{suffix}{quote})'
+
+    return _CSS_URL.sub(replace, text)
+
+
+# --- Build ---
+
+def hashed_name(path, content, length=8):
+    """``css/global.css`` -> ``css/global.<md5 prefix>.css``."""
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{hashlib.md5(content).hexdigest()[:length]}{ext}'
+
+
+def _compress(path, content):
+    """Write ``.gz`` (and ``.br``) siblings of ``path``."""
+    with open(path + '.gz', 'wb') as fh:
+        # mtime=0 keeps the archive byte-identical across builds
+        with gzip.GzipFile(filename='', mode='wb', fileobj=fh, compresslevel=9, mtime=0) as gz:
+            gz.write(content)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as fh:
+            fh.write(brotli.compress(content, quality=11))
+
+
+def _sources(static_dir):
+    for top in SOURCE_DIRS:
+        root = os.path.join(static_dir, top)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if posixpath.splitext(filename)[1].lower() in HASHED_EXTENSIONS:
+                    full = os.path.join(dirpath, filename)
+                    yield os.path.relpath(full, static_dir).replace(os.sep, '/'), full
+
+
+def build(static_dir, clean=True):
+    """Build ``static_dir/dist`` and its manifest. Returns a summary dict."""
+    dist = os.path.join(static_dir, DIST_DIR)
+    if clean and os.path.isdir(dist):
+        shutil.rmtree(dist)
+    os.makedirs(dist, exist_ok=True)
+    sources = list(_sources(static_dir))
+    manifest = {}
+    outputs = {}
+    summary = {'files': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_out': 0, 'brotli': brotli is not None}
+
+    # Everything but stylesheets first, so CSS url() rewriting can see the hashed names
+    sources.sort(key=lambda item: item[0].endswith('.css'))
+    for path, full in sources:
+        with open(full, 'rb') as fh:
+            content = fh.read()
+        summary['bytes_in'] += len(content)
+        if path.endswith('.css'):
+            content = rewrite_css_urls(minify_css(content.decode('utf-8')), path, manifest).encode('utf-8')
+        manifest[path] = hashed_name(path, content)
+        outputs[path] = content
+
+    for path, content in outputs.items():
+        target = os.path.join(dist, *manifest[path].split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as fh:
+            fh.write(content)
+        summary['files'] += 1
+        summary['bytes_out'] += len(content)
+        if posixpath.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS and len(content) >= MIN_COMPRESS_BYTES:
+            _compress(target, content)
+            summary['compressed'] += 1
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as fh:
+        json.dump({path: f'{DIST_DIR}/{name}' for path, name in sorted(manifest.items())}, fh, indent=2)
+    return summary
+
+
+# --- Runtime ---
+
+class AssetManifest:
+    """The manifest as loaded by a running app; reloaded when the file changes in debug."""
+
+    def __init__(self, path, auto_reload=False):
+        self.path = path
+        self.auto_reload = auto_reload
+        self.entries = {}
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.entries, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as fh:
+                self.entries = json.load(fh)
+            self._mtime = mtime
+
+    def resolve(self, path):
+        if self.auto_reload:
+            self.load()
+        return self.entries.get(path, path)
+
+
+def asset_url(path):
+    """URL of a static asset under ``ASSETS_ROOT``, fingerprinted when built."""
+    path = path.lstrip('/')
+    root = current_app.config.get('ASSETS_ROOT') or current_app.static_url_path
+    return f"{root.rstrip('/')}/{current_app.extensions['assets'].resolve(path)}"
+
+
+def serve_dist(filename):
+    """Serve a hashed file, preferring a precompressed variant the client accepts."""
+    directory = os.path.join(current_app.static_folder, DIST_DIR)
+    full = safe_join(directory, filename)
+    if full is None or filename == MANIFEST_NAME or not os.path.isfile(full):
+        raise NotFound()
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for token, suffix in ENCODINGS:
+        if request.accept_encodings[token] and os.path.isfile(full + suffix):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=31536000)
+            response.headers['Content-Encoding'] = token
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    """Load the manifest, expose ``asset_url`` to templates and route ``/static/dist``."""
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    app.extensions['assets'] = AssetManifest(path, auto_reload=app.debug)
+    app.add_template_global(asset_url)
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'assets_dist', serve_dist)
@@ -0,0 +1,345 @@
+"""
+Typo-tolerant marketplace autocomplete.
+
+An in-memory index over active product names, brands and categories:
+
+* every word-suffix of each label ("wheat seeds gold", "seeds gold",
+  "gold"): a table of the best ``top_k`` entries for each 1-3 character
+  prefix answers short queries directly, and a sorted suffix list answers
+  longer ones with two binary searches. This holds one string per word, where
+  a full character trie held a node per character;
+* a trigram index (pg_trgm style) used to fill up results when the prefix walk
+  finds too few, which absorbs typos like "wheet" or "ureaa";
+* a synonym table (``agrifarma/data/search_synonyms.json``, override with
+  ``AUTOCOMPLETE_SYNONYMS_FILE``) mapping Roman-Urdu spellings such as
+  "gandum" or "urea khad" to catalog terms, including half-typed keys.
+
+The index is rebuilt lazily. Committed product inserts and deletes mark it
+stale, and so do updates to an indexed column (name, brand, category,
+``is_active``). Stock and sales counters only shift the ranking, so they wait
+for ``AUTOCOMPLETE_REFRESH_SECONDS``, which also bounds staleness across
+worker processes. Rebuilds run in a background thread while lookups keep
+using the previous index (``AUTOCOMPLETE_BACKGROUND_BUILD``; off in tests).
+"""
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from agrifarma.extensions import db
+from agrifarma.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNONYMS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'search_synonyms.json')
+DEFAULT_REFRESH_SECONDS = 300
+TOP_K = 10
+SHORT_PREFIX = 3  # prefixes up to this length are answered from a precomputed table
+FUZZY_THRESHOLD = 0.3
+
+Suggestion = namedtuple('Suggestion', 'text kind ref weight')
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation/whitespace to single spaces."""
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def trigrams(text):
+    """Set of padded per-word trigrams, as PostgreSQL's pg_trgm builds them."""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SynonymTable:
+    """Phrase synonyms, applied to whole words and to a half-typed tail."""
+
+    def __init__(self, mapping=None):
+        self.mapping = {}
+        for key, targets in (mapping or {}).items():
+            if isinstance(targets, str):
+                targets = [targets]
+            key = normalize(key)
+            if key:
+                self.mapping[key] = [normalize(t) for t in targets if normalize(t)]
+        self._keys = sorted(self.mapping)
+        ranked = sorted(self.mapping, key=len, reverse=True)
+        self._pattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in ranked) + r')\b') if ranked else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as fh:
+            return cls(json.load(fh))
+
+    def _keys_with_prefix(self, prefix, limit=5):
+        start = bisect.bisect_left(self._keys, prefix)
+        found = []
+        for key in self._keys[start:]:
+            if not key.startswith(prefix) or len(found) >= limit:
+                break
+            found.append(key)
+        return found
+
+    def expand(self, query, prefix=False):
+        """Return ``query`` followed by its synonym rewrites (normalised, de-duplicated).
+
+        With ``prefix=True`` the last one or two words may be the start of a
+        synonym key ("gand" -> "gandum" -> "wheat"), as while typing.
+        """
+        variants = [query]
+        if self._pattern is not None:
+            for match in self._pattern.finditer(query):
+                for target in self.mapping[match.group(1)]:
+                    variants.append(query[:match.start()] + target + query[match.end():])
+        if prefix and self._keys:
+            words = query.split()
+            for n in (2, 1):
+                if len(words) < n:
+                    continue
+                head, tail = words[:-n], ' '.join(words[-n:])
+                for key in self._keys_with_prefix(tail):
+                    for target in self.mapping[key]:
+                        variants.append(' '.join(head + [target]))
+        return list(dict.fromkeys(v.strip() for v in variants if v.strip()))
+
+
+class AutocompleteIndex:
+    """Immutable prefix + trigram index over weighted suggestions."""
+
+    def __init__(self, suggestions, synonyms=None, top_k=TOP_K):
+        self.synonyms = synonyms or SynonymTable()
+        self.top_k = top_k
+        # Highest weight first, so a lower entry index always means a better entry
+        self.entries = sorted(suggestions, key=lambda s: (-s.weight, s.text.lower()))
+        self._short = {}
+        suffixes = []
+        postings = defaultdict(list)
+        self._gram_counts = array('H')
+        for idx, entry in enumerate(self.entries):
+            key = normalize(entry.text)
+            words = key.split()
+            for i in range(len(words)):
+                suffix = ' '.join(words[i:])
+                suffixes.append((suffix, idx))
+                for n in range(1, min(SHORT_PREFIX, len(suffix)) + 1):
+                    top = self._short.setdefault(suffix[:n], [])
+                    if len(top) < top_k and idx not in top:
+                        top.append(idx)
+            grams = trigrams(key)
+            self._gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                postings[gram].append(idx)
+        suffixes.sort()
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._owners = array('i', (idx for _, idx in suffixes))
+        self._postings = {gram: array('i', ids) for gram, ids in postings.items()}
+
+    def prefix(self, key):
+        """Entry indexes whose label has a word-suffix starting with ``key``."""
+        if len(key) <= SHORT_PREFIX:
+            return self._short.get(key, [])
+        lo = bisect.bisect_left(self._suffixes, key)
+        hi = bisect.bisect_left(self._suffixes, key + '\uffff', lo)
+        return heapq.nsmallest(self.top_k, set(self._owners[lo:hi]))
+
+    def fuzzy(self, key, limit):
+        """Entry indexes ranked by trigram similarity to ``key``."""
+        grams = trigrams(key)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for idx, common in shared.items():
+            score = common / (len(grams) + self._gram_counts[idx] - common)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, idx))
+        scored.sort()
+        return [idx for _, idx in scored[:limit]]
+
+    def search(self, query, limit=8):
+        """Best suggestions for a (possibly partial, misspelled) query."""
+        key = normalize(query)
+        if not key:
+            return []
+        variants = self.synonyms.expand(key, prefix=True)
+        found = []
+        for variant in variants:
+            for idx in self.prefix(variant):
+                if idx not in found:
+                    found.append(idx)
+        if len(found) < limit and len(key) >= 3:
+            for variant in variants:
+                for idx in self.fuzzy(variant, limit):
+                    if idx not in found:
+                        found.append(idx)
+        # Prefix hits keep their weight order within each variant; cap the total
+        return [self.entries[idx] for idx in found[:limit]]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def load_synonyms(path=None):
+    """Load the configured (or bundled) synonym table."""
+    if path is None and has_app_context():
+        path = current_app.config.get('AUTOCOMPLETE_SYNONYMS_FILE')
+    return SynonymTable.from_file(path or DEFAULT_SYNONYMS_FILE)
+
+
+def build_index(synonyms=None):
+    """Build a fresh index from active products with one projected query."""
+    rows = db.session.execute(
+        select(Product.id, Product.name, Product.brand, Product.category, Product.sold_count, Product.is_featured)
+        .where(Product.is_active.is_(True))
+    ).all()
+    suggestions = []
+    brands, categories = Counter(), Counter()
+    for row in rows:
+        weight = (row.sold_count or 0) + (10 if row.is_featured else 0) + 1
+        suggestions.append(Suggestion(row.name, 'product', row.id, weight))
+        if row.brand:
+            brands[row.brand] += weight
+        if row.category:
+            categories[row.category] += weight
+    suggestions.extend(Suggestion(name, 'brand', name, weight) for name, weight in brands.items())
+    suggestions.extend(Suggestion(name, 'category', name, weight) for name, weight in categories.items())
+    return AutocompleteIndex(suggestions, synonyms or load_synonyms())
+
+
+_state = {'index': None, 'built_at': 0.0, 'stale': True, 'building': False}
+_lock = threading.Lock()
+
+
+def mark_stale():
+    """Force a rebuild on the next lookup."""
+    _state['stale'] = True
+
+
+def _rebuild(app):
+    try:
+        with app.app_context():
+            index = build_index()
+        _state['index'], _state['built_at'] = index, time.monotonic()
+    except Exception:
+        logger.exception('Autocomplete index rebuild failed')
+        _state['stale'] = True
+    finally:
+        _state['building'] = False
+
+
+def get_index():
+    """Return the current index, rebuilding it if stale or too old.
+
+    In background mode the rebuild runs in a thread and the previous index
+    (or an empty one, before the first build finishes) is served meanwhile.
+    """
+    refresh, background = DEFAULT_REFRESH_SECONDS, True
+    if has_app_context():
+        refresh = current_app.config.get('AUTOCOMPLETE_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)
+        background = current_app.config.get('AUTOCOMPLETE_BACKGROUND_BUILD', True)
+    index = _state['index']
+    expired = refresh and time.monotonic() - _state['built_at'] > refresh
+    if index is None or _state['stale'] or expired:
+        if background and has_app_context():
+            with _lock:
+                if not _state['building']:
+                    # Clear first: a commit landing mid-build marks it stale again
+                    _state['stale'], _state['building'] = False, True
+                    threading.Thread(target=_rebuild, args=(current_app._get_current_object(),),
+                                     name='autocomplete-rebuild', daemon=True).start()
+            return index if index is not None else AutocompleteIndex([], load_synonyms())
+        with _lock:
+            if _state['index'] is index:
+                _state['stale'] = False
+                _state['index'] = build_index()
+                _state['built_at'] = time.monotonic()
+            index = _state['index']
+    return index
+
+
+def suggest(query, limit=8):
+    """Convenience wrapper around ``get_index().search``."""
+    return get_index().search(query, limit)
+
+
+def expand_query(query):
+    """Synonym rewrites of a submitted search, for widening the catalog filter."""
+    key = normalize(query)
+    if not key:
+        return []
+    return get_index().synonyms.expand(key)
+
+
+# --- Invalidation: only committed product changes mark the index stale ---
+
+_DIRTY = 'autocomplete_dirty'
+INDEXED_COLUMNS = frozenset({'name', 'brand', 'category', 'is_active'})
+
+
+def _flag_session(session):
+    if session is not None:
+        session.info[_DIRTY] = True
+
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_delete')
+def _product_changed(mapper, connection, target):
+    _flag_session(Session.object_session(target))
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    # Checkout rewrites stock and sold_count on every order; only labels and
+    # visibility are worth a rebuild
+    attrs = inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in INDEXED_COLUMNS):
+        _flag_session(Session.object_session(target))
+
+
+def _statement_columns(state):
+    """Column names a bulk UPDATE sets, or ``None`` when they can't be told."""
+    names = {getattr(column, 'key', column) for column in getattr(state.statement, '_values', None) or ()}
+    params = state.parameters
+    for row in (params if isinstance(params, (list, tuple)) else [params]):
+        names.update(row or ())
+    return names or None
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_product_statement(state):
+    # Bulk insert()/update()/delete() statements bypass the mapper events above;
+    # counter-only updates (view counts) don't change anything we index
+    if not (state.is_insert or state.is_update or state.is_delete) or state.bind_mapper is not Product.__mapper__ \
+            or state.execution_options.get('counter_only'):
+        return
+    if state.is_update:
+        columns = _statement_columns(state)
+        if columns is not None and not columns & INDEXED_COLUMNS:
+            return
+    _flag_session(state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop(_DIRTY, False):
+        mark_stale()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_DIRTY, None)
@@ -0,0 +1,146 @@
+"""
+Cart repository for persisted (authenticated) carts.
+
+Authenticated users' carts live in ``cart_items``; the session cart is only
+used for anonymous visitors and is merged into the persisted cart on login.
+Writes are single-statement upserts (``INSERT ... ON CONFLICT``) keyed on
+``(user_id, product_id)``. Nothing here commits: callers commit once per request.
+"""
+from datetime import datetime
+from sqlalchemy import delete, select
+from agrifarma.extensions import db
+from agrifarma.models.cart import CartItem
+from agrifarma.models.product import Product
+
+MAX_LINE_QUANTITY = 100
+
+
+def _dialect_insert(table):
+    """Return a dialect-specific INSERT supporting ``on_conflict_do_update``."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def clamp_quantity(qty, stock=None):
+    """Clamp a requested quantity to 0..MAX_LINE_QUANTITY and available stock."""
+    try:
+        qty = int(qty)
+    except (TypeError, ValueError):
+        qty = 1
+    qty = max(0, min(qty, MAX_LINE_QUANTITY))
+    if stock is not None and qty > 0:
+        qty = min(qty, max(1, stock))
+    return qty
+
+
+class CartRepository:
+    """Persisted cart for one user."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def lines(self):
+        """Return ``[(product, quantity), ...]`` for active products in one query."""
+        rows = db.session.execute(
+            select(Product, CartItem.quantity)
+            .join(CartItem, CartItem.product_id == Product.id)
+            .where(CartItem.user_id == self.user_id, Product.is_active == True)
+            .order_by(CartItem.created_at)
+        ).all()
+        return [(row[0], row[1]) for row in rows]
+
+    def quantities(self):
+        """Return ``{product_id: quantity}`` for this user's cart."""
+        rows = db.session.execute(
+            select(CartItem.product_id, CartItem.quantity).where(CartItem.user_id == self.user_id)
+        ).all()
+        return {pid: qty for pid, qty in rows}
+
+    def upsert(self, quantities):
+        """Write many cart lines in one statement.
+
+        Args:
+            quantities: ``{product_id: quantity}``; a quantity of 0 removes the line
+        """
+        to_remove = [pid for pid, qty in quantities.items() if qty <= 0]
+        to_write = {pid: qty for pid, qty in quantities.items() if qty > 0}
+        if to_remove:
+            self.remove(to_remove)
+        if not to_write:
+            return
+
+        now = datetime.utcnow()
+        rows = [
+            {'user_id': self.user_id, 'product_id': pid, 'quantity': qty, 'created_at': now, 'updated_at': now}
+            for pid, qty in to_write.items()
+        ]
+        stmt = _dialect_insert(CartItem.__table__)
+        if stmt is None:
+            self._upsert_fallback(to_write)
+            return
+
+        stmt = stmt.values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'],
+            set_={'quantity': stmt.excluded.quantity, 'updated_at': now},
+        )
+        db.session.execute(stmt)
+
+    def _upsert_fallback(self, quantities):
+        """Portable upsert for dialects without ON CONFLICT (one read + ORM writes)."""
+        existing = {
+            ci.product_id: ci for ci in
+            CartItem.query.filter(CartItem.user_id == self.user_id,
+                                  CartItem.product_id.in_(list(quantities))).all()
+        }
+        for pid, qty in quantities.items():
+            item = existing.get(pid)
+            if item is None:
+                db.session.add(CartItem(user_id=self.user_id, product_id=pid, quantity=qty))
+            else:
+                item.quantity = qty
+
+    def remove(self, product_ids):
+        """Delete the given product lines in one statement."""
+        db.session.execute(
+            delete(CartItem).where(CartItem.user_id == self.user_id,
+                                   CartItem.product_id.in_(list(product_ids)))
+        )
+
+    def clear(self):
+        """Delete every line in this user's cart."""
+        db.session.execute(delete(CartItem).where(CartItem.user_id == self.user_id))
+
+    def merge_session_cart(self, session_cart):
+        """Merge an anonymous session cart (``{'pid': qty}``) into the persisted cart.
+
+        Quantities are added to existing lines and clamped to stock. Unknown or
+        inactive products are dropped. Returns the number of lines merged.
+        """
+        requested = {}
+        for pid_str, qty in (session_cart or {}).items():
+            try:
+                requested[int(pid_str)] = int(qty)
+            except (TypeError, ValueError):
+                continue
+        if not requested:
+            return 0
+
+        stock = dict(db.session.execute(
+            select(Product.id, Product.stock_quantity)
+            .where(Product.id.in_(list(requested)), Product.is_active == True)
+        ).all())
+        current = self.quantities()
+        merged = {}
+        for pid, qty in requested.items():
+            if pid not in stock:
+                continue
+            merged[pid] = clamp_quantity(current.get(pid, 0) + qty, stock[pid])
+        self.upsert({pid: qty for pid, qty in merged.items() if qty > 0})
+        return len(merged)
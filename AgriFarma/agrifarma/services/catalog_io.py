@@ -0,0 +1,348 @@
+"""
+Streaming bulk product import/export for vendors (CSV or JSONL).
+
+Imports read the upload row by row and validate in chunks. Each chunk costs one
+set-based slug/SKU lookup, one executemany INSERT for new products, one bulk
+UPDATE for the vendor's existing products (matched by slug) and one commit.
+Exports stream column-projected rows, so a catalog with tens of thousands of
+SKUs never has to be hydrated into ORM objects or held in memory.
+"""
+import csv
+import io
+import json
+import logging
+from sqlalchemy import select, insert, update, or_
+from sqlalchemy.exc import IntegrityError
+from agrifarma.extensions import db
+from agrifarma.models.product import Product
+from agrifarma.services.product_images import get_matcher
+from agrifarma.services.slugs import allocate_slugs, slugify
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+
+# Column order for exports; also the set of columns an import may set
+EXPORT_COLUMNS = [
+    'sku', 'slug', 'name', 'category', 'subcategory', 'description',
+    'price', 'original_price', 'currency', 'stock_quantity', 'low_stock_threshold',
+    'unit', 'weight', 'brand', 'manufacturer', 'image_url', 'is_active', 'is_featured',
+]
+REQUIRED_COLUMNS = ('name', 'category', 'price')
+FLOAT_COLUMNS = {'price', 'original_price', 'weight'}
+INT_COLUMNS = {'stock_quantity', 'low_stock_threshold'}
+BOOL_COLUMNS = {'is_active', 'is_featured'}
+MAX_LENGTHS = {
+    'name': 200, 'slug': 250, 'category': 100, 'subcategory': 100, 'currency': 10, 'sku': 100,
+    'unit': 50, 'brand': 100, 'manufacturer': 150, 'image_url': 255,
+}
+ENCODING_ERROR = 'file must be UTF-8 (save it as "CSV UTF-8"); this row and the rest were not imported'
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+def catalog_format(filename, default='csv'):
+    """Guess the catalog format from an upload's filename."""
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    if ext in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    if ext == 'csv':
+        return 'csv'
+    return default
+
+
+class ImportReport:
+    """Outcome of a bulk import: counts plus per-row errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # [(line_number, message)]
+        self.renamed = []  # [(line_number, requested_slug, slug)]
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': [{'line': line, 'message': msg} for line, msg in self.errors],
+            'renamed': [{'line': line, 'requested': old, 'slug': new} for line, old, new in self.renamed],
+        }
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_number, record, error)`` from a binary upload stream.
+
+    Exactly one of ``record``/``error`` is set. Nothing is read ahead beyond
+    the current row. Bytes that aren't UTF-8 end the stream with one error
+    (decoding runs a block ahead, so its line number is approximate).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for record in reader:
+                yield reader.line_num, record, None
+        except UnicodeDecodeError:
+            yield reader.line_num + 1, None, ENCODING_ERROR
+    elif fmt == 'jsonl':
+        line_no = 0
+        try:
+            for line_no, line in enumerate(text, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield line_no, None, f'Invalid JSON: {exc}'
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, None, 'Each line must be a JSON object'
+                    continue
+                yield line_no, record, None
+        except UnicodeDecodeError:
+            yield line_no + 1, None, ENCODING_ERROR
+    else:
+        raise ValueError(f'Unsupported catalog format: {fmt}')
+
+
+def _parse_value(column, raw):
+    """Convert one raw cell to the column's Python type (None for blank)."""
+    if isinstance(raw, str):
+        raw = raw.strip()
+    if raw is None or raw == '':
+        return None
+    if column in BOOL_COLUMNS:
+        if isinstance(raw, bool):
+            return raw
+        value = str(raw).lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(f'{column}: expected true/false, got {raw!r}')
+    if column in FLOAT_COLUMNS:
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column}: not a number ({raw!r})')
+        if value < 0:
+            raise ValueError(f'{column}: must not be negative')
+        return value
+    if column in INT_COLUMNS:
+        try:
+            value = int(float(raw))
+        except (TypeError, ValueError):
+            raise ValueError(f'{column}: not a whole number ({raw!r})')
+        if value < 0:
+            raise ValueError(f'{column}: must not be negative')
+        return value
+    value = str(raw)
+    limit = MAX_LENGTHS.get(column)
+    if limit and len(value) > limit:
+        raise ValueError(f'{column}: longer than {limit} characters')
+    return value
+
+
+def validate_record(record):
+    """Return the importable column values of one record or raise ValueError.
+
+    A blank cell (or JSON ``null``) means "not provided": the column is left
+    out, so an update keeps the stored value and an insert gets the default.
+    """
+    values = {}
+    for column in EXPORT_COLUMNS:
+        if column in record:
+            value = _parse_value(column, record[column])
+            if value is not None:
+                values[column] = value
+    missing = [c for c in REQUIRED_COLUMNS if values.get(c) in (None, '')]
+    if missing:
+        raise ValueError('missing required ' + ', '.join(missing))
+    values['slug'] = slugify(values.get('slug') or values['name'])
+    if not values['slug']:
+        raise ValueError('slug is empty after normalisation')
+    if values.get('stock_quantity') is not None:
+        values['in_stock'] = values['stock_quantity'] > 0
+    return values
+
+
+def _apply_chunk(chunk, vendor_id, report, seen_slugs, seen_skus):
+    """Insert/update one validated chunk: one lookup, one executemany per operation.
+
+    ``seen_slugs``/``seen_skus`` carry the keys accepted by earlier chunks so a
+    repeated row is rejected even when it lands in a later chunk. A row whose
+    slug belongs to another vendor's product becomes a new product under the
+    next free ``slug-N``.
+    """
+    slugs = {values['slug'] for _, values in chunk}
+    skus = {values['sku'] for _, values in chunk if values.get('sku')}
+    conditions = [Product.slug.in_(slugs)]
+    if skus:
+        conditions.append(Product.sku.in_(skus))
+    existing = db.session.execute(
+        select(Product.id, Product.slug, Product.sku, Product.vendor_id).where(or_(*conditions))
+    ).all()
+    by_slug = {row.slug: row for row in existing}
+    by_sku = {row.sku: row for row in existing if row.sku}
+
+    inserts, updates, renames = [], [], []
+    for line, values in chunk:
+        slug, sku = values['slug'], values.get('sku')
+        if slug in seen_slugs:
+            report.add_error(line, f'duplicate slug "{slug}" in upload')
+            continue
+        if sku and sku in seen_skus:
+            report.add_error(line, f'duplicate SKU "{sku}" in upload')
+            continue
+        target = by_slug.get(slug)
+        foreign = target is not None and target.vendor_id != vendor_id
+        if foreign:
+            target = None
+        sku_owner = by_sku.get(sku) if sku else None
+        if sku_owner is not None and (target is None or sku_owner.id != target.id):
+            report.add_error(line, f'SKU "{sku}" is already used by product "{sku_owner.slug}"')
+            continue
+        seen_slugs.add(slug)
+        if sku:
+            seen_skus.add(sku)
+        if target is not None:
+            updates.append((line, dict(values, id=target.id)))
+        elif foreign:
+            renames.append((line, values))
+        else:
+            inserts.append((line, values))
+
+    if renames:
+        new_slugs = allocate_slugs(Product.slug, [values['slug'] for _, values in renames], reserved=seen_slugs)
+        for (line, values), slug in zip(renames, new_slugs):
+            seen_slugs.add(slug)
+            report.renamed.append((line, values['slug'], slug))
+            inserts.append((line, dict(values, slug=slug)))
+
+    insert_rows = []
+    if inserts:
+        images = get_matcher().resolve_many(
+            (v['name'], v['category'], v.get('image_url')) for _, v in inserts
+        )
+        for (_, values), image_url in zip(inserts, images):
+            row = {column: values.get(column) for column in EXPORT_COLUMNS}
+            row.update(
+                image_url=image_url,
+                currency=values.get('currency') or 'PKR',
+                stock_quantity=values.get('stock_quantity') or 0,
+                low_stock_threshold=values.get('low_stock_threshold') if values.get('low_stock_threshold') is not None else 10,
+                is_active=values.get('is_active', True),
+                is_featured=values.get('is_featured', False),
+                in_stock=(values.get('stock_quantity') or 0) > 0,
+                vendor_id=vendor_id,
+            )
+            insert_rows.append(row)
+
+    try:
+        if insert_rows:
+            db.session.execute(insert(Product), insert_rows)
+        if updates:
+            db.session.execute(update(Product), [values for _, values in updates])
+        db.session.commit()
+    except IntegrityError:
+        # Usually a slug/SKU taken by a concurrent import. Retry row by row
+        # so only the offending lines are rejected.
+        db.session.rollback()
+        _apply_rows(vendor_id, report, [(line, row) for (line, _), row in zip(inserts, insert_rows)], updates)
+        return
+    report.created += len(insert_rows)
+    report.updated += len(updates)
+
+
+def _is_unique_violation(exc):
+    message = str(getattr(exc, 'orig', exc)).lower()
+    return 'unique' in message or 'duplicate' in message
+
+
+def _apply_rows(vendor_id, report, insert_rows, updates):
+    """Slow path for a chunk the database rejected: one statement and commit per row."""
+    for kind, line, values in [('insert', *item) for item in insert_rows] + [('update', *item) for item in updates]:
+        try:
+            if kind == 'insert':
+                db.session.execute(insert(Product), [values])
+            else:
+                db.session.execute(update(Product), [values])
+            db.session.commit()
+        except IntegrityError as exc:
+            db.session.rollback()
+            if _is_unique_violation(exc):
+                report.add_error(line, 'not saved: slug or SKU conflicts with an existing product')
+            else:
+                logger.exception('Catalog import row %s rejected for vendor %s', line, vendor_id)
+                report.add_error(line, 'not saved: the database rejected this row')
+            continue
+        if kind == 'insert':
+            report.created += 1
+        else:
+            report.updated += 1
+
+
+def import_catalog(stream, fmt, vendor_id, chunk_size=500):
+    """Stream-import a CSV/JSONL catalog for ``vendor_id``.
+
+    Rows whose slug matches one of the vendor's products update it (so an
+    exported file can be edited and re-imported); other rows create products.
+    Invalid rows are reported and skipped; valid rows are committed per chunk.
+    """
+    report = ImportReport()
+    seen_slugs, seen_skus = set(), set()
+    chunk = []
+    for line, record, error in iter_records(stream, fmt):
+        report.rows += 1
+        if error:
+            report.add_error(line, error)
+            continue
+        try:
+            chunk.append((line, validate_record(record)))
+        except ValueError as exc:
+            report.add_error(line, str(exc))
+            continue
+        if len(chunk) >= chunk_size:
+            _apply_chunk(chunk, vendor_id, report, seen_slugs, seen_skus)
+            chunk = []
+    if chunk:
+        _apply_chunk(chunk, vendor_id, report, seen_slugs, seen_skus)
+    return report
+
+
+def export_catalog(fmt, vendor_id=None, chunk_size=1000):
+    """Yield the catalog as CSV or JSONL text, ``chunk_size`` rows at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported catalog format: {fmt}')
+    stmt = select(*[Product.__table__.c[c] for c in EXPORT_COLUMNS]).order_by(Product.id)
+    if vendor_id is not None:
+        stmt = stmt.where(Product.vendor_id == vendor_id)
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+    for partition in result.partitions():
+        for row in partition:
+            if writer:
+                writer.writerow(['' if v is None else ('true' if v is True else 'false' if v is False else v)
+                                 for v in row])
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,259 @@
+"""
+Forum category tree.
+
+Every category stores a materialized path of ids from the root, for example
+``/3/7/12/`` for category 12 under 7 under 3, plus its ``depth``. Mapper
+events maintain them. An insert takes its parent's path. Moving a category
+(changing ``parent_id``) rewrites its whole subtree with one UPDATE ... WHERE
+path LIKE '/3/7/%'. A move under one of its own descendants raises
+``CategoryCycleError`` before anything is written.
+
+With the path:
+
+* ancestors (breadcrumbs) are one ``id IN (...)`` query;
+* a subtree is one ``path LIKE prefix%`` query, joined to threads or replies
+  for counts;
+* "everything except this subtree" (edit parent choices) is one ``NOT LIKE``.
+
+``get_tree()`` keeps the whole tree in memory per worker, in display order
+(position, then name, depth first), for choice lists and sidebars. It is
+rebuilt when this worker commits a category change (a local version bump),
+or when the table signature (row count, newest ``updated_at``) differs.
+That check runs at most every ``CATEGORY_TREE_CHECK_SECONDS``.
+"""
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from agrifarma.extensions import db
+from agrifarma.models.forum import Category
+
+DEFAULT_CHECK_SECONDS = 30
+
+Node = namedtuple('Node', 'id name slug parent_id path depth position is_active icon color')
+
+
+class CategoryCycleError(ValueError):
+    """A category can't be moved under itself or one of its descendants."""
+
+
+def path_ids(path):
+    """``'/3/7/12/'`` -> ``[3, 7, 12]``."""
+    return [int(part) for part in (path or '').strip('/').split('/') if part]
+
+
+# --- Maintaining path and depth ---
+
+def _parent_path(connection, parent_id):
+    if parent_id is None:
+        return '/', -1
+    table = Category.__table__
+    # A parent created before paths were backfilled has none: walk its
+    # parent_id chain up to the first ancestor that has one, or to the root
+    ids, prefix, current = [], '/', parent_id
+    while current is not None and current not in ids:
+        row = connection.execute(select(table.c.path, table.c.parent_id).where(table.c.id == current)).one()
+        if row.path:
+            prefix = row.path
+            break
+        ids.append(current)
+        current = row.parent_id
+    path = prefix + ''.join(f'{category_id}/' for category_id in reversed(ids))
+    return path, len(path_ids(path)) - 1
+
+
+@event.listens_for(Category, 'after_insert')
+def _set_path(mapper, connection, target):
+    parent_path, parent_depth = _parent_path(connection, target.parent_id)
+    path, depth = f'{parent_path}{target.id}/', parent_depth + 1
+    table = Category.__table__
+    connection.execute(update(table).where(table.c.id == target.id).values(path=path, depth=depth))
+    # Record the values on the instance without marking it dirty again
+    set_committed_value(target, 'path', path)
+    set_committed_value(target, 'depth', depth)
+
+
+@event.listens_for(Category, 'before_update')
+def _check_move(mapper, connection, target):
+    if not inspect(target).attrs.parent_id.history.has_changes() or target.parent_id is None or not target.path:
+        return
+    parent_path, _ = _parent_path(connection, target.parent_id)
+    if parent_path.startswith(target.path):
+        raise CategoryCycleError(f'Category {target.id} cannot be moved under its own subtree')
+
+
+@event.listens_for(Category, 'after_update')
+def _move_subtree(mapper, connection, target):
+    if not inspect(target).attrs.parent_id.history.has_changes() or not target.path:
+        return
+    old_path, old_depth = target.path, target.depth
+    parent_path, parent_depth = _parent_path(connection, target.parent_id)
+    new_path, new_depth = f'{parent_path}{target.id}/', parent_depth + 1
+    if new_path == old_path:
+        return
+    table = Category.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.path.like(f'{old_path}%'))
+        .values(path=new_path + func.substr(table.c.path, len(old_path) + 1),
+                depth=table.c.depth + (new_depth - old_depth))
+    )
+    set_committed_value(target, 'path', new_path)
+    set_committed_value(target, 'depth', new_depth)
+    # Loaded descendants now hold stale paths
+    session = inspect(target).session
+    if session is not None:
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Category) and obj is not target and (obj.path or '').startswith(old_path):
+                session.expire(obj, ['path', 'depth'])
+
+
+def rebuild_paths():
+    """Recompute every path and depth from ``parent_id`` (backfill; uncommitted).
+
+    Returns the number of categories written.
+    """
+    rows = db.session.execute(select(Category.id, Category.parent_id)).all()
+    parents = dict(rows)
+    paths = {}
+
+    def resolve(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents.get(category_id)
+            if parent_id is None or parent_id not in parents or parent_id in seen:
+                paths[category_id] = f'/{category_id}/'
+            else:
+                paths[category_id] = f'{resolve(parent_id, seen + (category_id,))}{category_id}/'
+        return paths[category_id]
+
+    for category_id in parents:
+        resolve(category_id)
+    table = Category.__table__
+    if paths:
+        db.session.execute(
+            update(table).where(table.c.id == db.bindparam('cid'))
+            .values(path=db.bindparam('cpath'), depth=db.bindparam('cdepth'), updated_at=table.c.updated_at),
+            [{'cid': cid, 'cpath': path, 'cdepth': len(path_ids(path)) - 1} for cid, path in paths.items()],
+        )
+    return len(paths)
+
+
+# --- Cached tree ---
+
+class CategoryTree:
+    """Immutable snapshot of every category, in display order."""
+
+    def __init__(self, nodes, signature=None):
+        self.signature = signature
+        self.by_id = {node.id: node for node in nodes}
+        children = {}
+        for node in nodes:
+            children.setdefault(node.parent_id if node.parent_id in self.by_id else None, []).append(node)
+        for siblings in children.values():
+            siblings.sort(key=lambda node: (node.position or 0, node.name.lower()))
+        self.children = children
+        self.ordered = []
+        stack = list(reversed(children.get(None, [])))
+        while stack:
+            node = stack.pop()
+            self.ordered.append(node)
+            stack.extend(reversed(children.get(node.id, [])))
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def breadcrumb(self, category_id):
+        node = self.by_id.get(category_id)
+        return [self.by_id[i] for i in path_ids(node.path) if i in self.by_id] if node else []
+
+    def subtree_ids(self, category_id):
+        node = self.by_id.get(category_id)
+        if node is None:
+            return set()
+        return {n.id for n in self.ordered if (n.path or '').startswith(node.path)}
+
+    def choices(self, exclude_subtree=None, active_only=False, indent='— '):
+        """``[(id, indented name), ...]`` in tree order, optionally without a subtree."""
+        excluded = self.subtree_ids(exclude_subtree) if exclude_subtree else set()
+        return [
+            (node.id, indent * node.depth + node.name) for node in self.ordered
+            if node.id not in excluded and (node.is_active or not active_only)
+        ]
+
+
+def _signature():
+    return tuple(db.session.execute(select(func.count(Category.id), func.max(Category.updated_at))).one())
+
+
+def load_tree():
+    rows = db.session.execute(select(
+        Category.id, Category.name, Category.slug, Category.parent_id, Category.path, Category.depth,
+        Category.position, Category.is_active, Category.icon, Category.color,
+    )).all()
+    return CategoryTree([Node(*row) for row in rows], _signature())
+
+
+class TreeCache:
+    """Per-app cached tree, rebuilt on a local version bump or a changed table signature."""
+
+    def __init__(self, check_seconds=DEFAULT_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.version = 0
+        self._built_version = -1
+        self._tree = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        self.version += 1
+
+    def get(self):
+        tree, now = self._tree, time.monotonic()
+        if tree is not None and self._built_version == self.version:
+            if now - self._checked_at < self.check_seconds:
+                return tree
+            self._checked_at = now
+            if _signature() == tree.signature:
+                return tree
+        with self._lock:
+            if self._tree is tree:
+                version = self.version
+                self._tree = load_tree()
+                self._built_version, self._checked_at = version, time.monotonic()
+            return self._tree
+
+
+def init_category_tree(app):
+    app.extensions['category_tree'] = TreeCache(app.config.get('CATEGORY_TREE_CHECK_SECONDS', DEFAULT_CHECK_SECONDS))
+
+
+def get_tree():
+    return current_app.extensions['category_tree'].get()
+
+
+_CHANGED = 'category_tree_changed'
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _category_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop(_CHANGED, False) and has_app_context():
+        cache = current_app.extensions.get('category_tree')
+        if cache is not None:
+            cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_CHANGED, None)
@@ -0,0 +1,213 @@
+"""
+Write-time rendering of user content.
+
+Thread and reply text is plain: it is escaped, split into paragraphs and line
+breaks, and bare http(s) links become ``rel="nofollow"`` anchors. Blog posts
+are HTML. They go through an allow-list sanitizer: unknown tags are dropped
+(``script``/``style``/``iframe`` with their contents), event handler and style
+attributes are removed, and only http(s), mailto and relative URLs survive.
+
+The result is stored in ``content_html`` when the row is flushed, together
+with ``content_html_version``. Templates print it with the ``rendered``
+filter. That filter renders on the fly only for rows written before the
+current ``RENDERER_VERSION``, until ``flask rerender-content`` has migrated
+them. Bump ``RENDERER_VERSION`` whenever the output of these functions
+changes.
+"""
+import re
+from html.parser import HTMLParser
+from markupsafe import Markup, escape
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from agrifarma.extensions import db
+from agrifarma.models.forum import Thread, Reply, ArchivedThread, ArchivedReply
+from agrifarma.models.blog import BlogPost
+
+RENDERER_VERSION = 2  # 2: self-closing <svg/>/<math/> no longer swallow the rest of a post
+DEFAULT_BATCH = 500
+
+_URL = re.compile(r'''(https?://[^\s<>"']+[^\s<>"'.,;:!?)\]])''')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def render_text(text):
+    """Escape plain text and turn paragraphs, line breaks and links into HTML."""
+    text = (text or '').replace('\r\n', '\n').replace('\r', '\n').strip()
+    paragraphs = []
+    for block in _PARAGRAPH_BREAK.split(text):
+        if block.strip():
+            html = str(escape(block.strip()))
+            html = _URL.sub(r'<a href="\1" rel="nofollow noopener">\1</a>', html)
+            paragraphs.append('<p>' + html.replace('\n', '<br>\n') + '</p>')
+    return '\n'.join(paragraphs)
+
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'div', 'em', 'figcaption', 'figure',
+    'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'small', 'span',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+DROP_WITH_CONTENT = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math'}
+VOID_TAGS = {'br', 'hr', 'img'}
+IMPLICIT_END = {'li': {'li'}, 'p': {'p'}, 'tr': {'tr', 'td', 'th'}, 'td': {'td', 'th'}, 'th': {'td', 'th'}}
+
+_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+_INVISIBLE = re.compile(r'[\x00-\x20\x7f]+')
+
+
+def safe_url(value, tag):
+    """The URL if its scheme is allowed for ``tag``, else None."""
+    compact = _INVISIBLE.sub('', value or '')
+    match = _SCHEME.match(compact)
+    if match is None:
+        return value.strip()  # relative
+    allowed = {'http', 'https'} if tag == 'img' else {'http', 'https', 'mailto'}
+    return value.strip() if match.group(1).lower() in allowed else None
+
+
+class _Sanitizer(HTMLParser):
+    """Re-emits allowed tags and attributes; everything else becomes text or disappears."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_WITH_CONTENT:
+            self.skipping += 1
+            return
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRIBUTES.get(tag, ()) or value is None:
+                continue
+            if name in URL_ATTRIBUTES:
+                value = safe_url(value, tag)
+                if value is None:
+                    continue
+            kept.append(f' {name}="{escape(value)}"')
+        if tag == 'a':
+            kept.append(' rel="nofollow noopener"')
+        while self.open and self.open[-1] in IMPLICIT_END.get(tag, ()):
+            self.out.append(f'</{self.open.pop()}>')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROP_WITH_CONTENT:
+            return  # no content to drop, and no end tag will come to stop skipping
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_WITH_CONTENT:
+            self.skipping = max(0, self.skipping - 1)
+            return
+        if self.skipping or tag not in self.open:
+            return
+        # Close anything left open inside it so the output stays balanced
+        while self.open:
+            current = self.open.pop()
+            self.out.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.out.append(str(escape(data)))
+
+    def close(self):
+        super().close()
+        self.out.extend(f'</{tag}>' for tag in reversed(self.open))
+        self.open = []
+        return ''.join(self.out)
+
+
+def sanitize_html(html):
+    """Keep only allow-listed tags, attributes and URL schemes."""
+    parser = _Sanitizer()
+    parser.feed(html or '')
+    return parser.close()
+
+
+def render_blog(content):
+    """Blog posts are HTML; a post written as plain text gets paragraphs instead."""
+    if '<' not in (content or ''):
+        return render_text(content)
+    return sanitize_html(content)
+
+
+RENDERERS = {
+    Thread: render_text,
+    Reply: render_text,
+    ArchivedThread: render_text,
+    ArchivedReply: render_text,
+    BlogPost: render_blog,
+}
+
+
+def render(obj):
+    """Fill ``content_html`` for a Thread, Reply or BlogPost from its ``content``."""
+    obj.content_html = RENDERERS[type(obj)](obj.content)
+    obj.content_html_version = RENDERER_VERSION
+    return obj.content_html
+
+
+@event.listens_for(Session, 'before_flush')
+def _render_changed(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty):
+        if type(obj) in RENDERERS and (
+            obj.content_html_version != RENDERER_VERSION or inspect(obj).attrs.content.history.has_changes()
+        ):
+            render(obj)
+
+
+def rendered(obj):
+    """Template filter: the stored HTML, rendered on the fly for rows not migrated yet."""
+    if obj is None:
+        return ''
+    if obj.content_html is None or obj.content_html_version != RENDERER_VERSION:
+        return Markup(RENDERERS[type(obj)](obj.content))
+    return Markup(obj.content_html)
+
+
+def rerender_all(model, batch_size=DEFAULT_BATCH, force=False):
+    """Re-render stale rows of ``model`` in id-ordered batches, one commit per batch.
+
+    Returns the number of rows written.
+    """
+    renderer = RENDERERS[model]
+    written, last_id = 0, 0
+    while True:
+        stmt = select(model.id, model.content).where(model.id > last_id).order_by(model.id).limit(batch_size)
+        if not force:
+            stmt = stmt.where((model.content_html_version.is_(None)) | (model.content_html_version != RENDERER_VERSION))
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            return written
+        db.session.execute(
+            update(model),
+            [{'id': row.id, 'content_html': renderer(row.content), 'content_html_version': RENDERER_VERSION}
+             for row in rows],
+        )
+        db.session.commit()
+        written += len(rows)
+        last_id = rows[-1].id
+
+
+def init_content(app):
+    app.add_template_filter(rendered, 'rendered')
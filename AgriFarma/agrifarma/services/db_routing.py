@@ -0,0 +1,114 @@
+"""
+Read/write splitting between the primary database and a read replica.
+
+Configure the replica as a Flask-SQLAlchemy bind (``SQLALCHEMY_BINDS``, key
+``DB_REPLICA_BIND``; ``REPLICA_DATABASE_URL`` sets it). Views decorated with
+``@read_replica`` (heavy reports and admin listings) run their SELECTs on the
+replica, so they don't compete with checkout for the primary's connection
+pool. Flushes and DML statements always go to the primary, and so does
+everything in views that aren't decorated.
+
+Read-your-writes: when a request commits a change, the browser session
+remembers when. For ``DB_REPLICA_STICKY_SECONDS`` after that, that user's
+requests read from the primary even in decorated views, so their own write
+is never hidden by replica lag.
+
+Locally the replica can be a second SQLite file, copied from the primary
+with the SQLite backup API (``flask replica-sync``).
+"""
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session as browser_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_STICKY_SECONDS = 15
+WRITE_STAMP = 'db_write_at'
+
+
+def replica_engine():
+    """The replica engine, or None when no replica bind is configured."""
+    if not has_app_context():
+        return None
+    return current_app.extensions['sqlalchemy'].engines.get(current_app.config.get('DB_REPLICA_BIND', 'replica'))
+
+
+class RoutingSession(FlaskSession):
+    """Sends reads to the replica while a ``read_replica`` view is running."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('use_replica') \
+                and (clause is None or getattr(clause, 'is_select', False)):
+            engine = replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def is_sticky():
+    """True while the current browser session's last write may not have replicated yet."""
+    written = browser_session.get(WRITE_STAMP)
+    window = current_app.config.get('DB_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+    return written is not None and time.time() - written < window
+
+
+def read_replica(view):
+    """Run the view's queries on the replica unless this user wrote recently."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = replica_engine() is not None and not is_sticky()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# --- Stickiness: committed writes stamp the browser session ---
+
+_WROTE = 'db_routing_wrote'
+
+
+@event.listens_for(Session, 'after_flush')
+def _flushed(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        session.info[_WROTE] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_write(state):
+    if (state.is_insert or state.is_update or state.is_delete) and not state.execution_options.get('counter_only'):
+        state.session.info[_WROTE] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    if session.info.pop(_WROTE, False) and has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop(_WROTE, None)
+
+
+def _stamp_write(response):
+    if g.get('db_wrote'):
+        browser_session[WRITE_STAMP] = time.time()
+    return response
+
+
+def init_db_routing(app):
+    app.after_request(_stamp_write)
+
+
+# --- Local SQLite replica ---
+
+def sync_sqlite(source_engine, target_engine):
+    """Copy the primary SQLite database over the replica with the backup API."""
+    if source_engine.dialect.name != 'sqlite' or target_engine.dialect.name != 'sqlite':
+        raise ValueError('sync_sqlite only copies SQLite databases; use real replication for other backends')
+    source, target = source_engine.raw_connection(), target_engine.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,218 @@
+"""
+Server-side data grid queries for the admin tables.
+
+A grid is a fixed set of column expressions over one or more tables. Requests
+pick sort, filters, a search term and a page; the response is built straight
+from a column-projected SELECT (no ORM objects) and serialised as compact
+row arrays. Total counts are cached separately for a short TTL, because the
+COUNT over a filtered table usually costs more than fetching one page.
+"""
+import threading
+import time
+from datetime import date, datetime
+from sqlalchemy import select, func, or_, false
+from flask import current_app, has_app_context
+from agrifarma.extensions import db
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+DEFAULT_COUNT_TTL = 30  # seconds
+_COUNT_CACHE_LIMIT = 1024
+
+
+class GridColumn:
+    """One grid column: a SQL expression plus what the client may do with it."""
+
+    def __init__(self, name, expr, sortable=True, searchable=False, filterable=False, kind='text'):
+        self.name = name
+        self.expr = expr
+        self.sortable = sortable
+        self.searchable = searchable
+        self.filterable = filterable
+        self.kind = kind  # text, int, number, bool, datetime
+
+
+class Grid:
+    """A named, column-projected listing with sort/filter/search/paging."""
+
+    def __init__(self, name, columns, select_from, joins=(), default_sort='id', default_dir='desc'):
+        self.name = name
+        self.columns = columns
+        self.by_name = {c.name: c for c in columns}
+        self.select_from = select_from
+        self.joins = joins  # [(target, onclause)] applied as LEFT OUTER JOINs
+        self.default_sort = default_sort
+        self.default_dir = default_dir
+
+    def _from(self, stmt):
+        stmt = stmt.select_from(self.select_from)
+        for target, onclause in self.joins:
+            stmt = stmt.outerjoin(target, onclause)
+        return stmt
+
+    def _coerce(self, column, raw):
+        if column.kind == 'bool':
+            return str(raw).lower() in ('1', 'true', 'yes', 'on')
+        if column.kind == 'int':
+            return int(raw)
+        if column.kind == 'number':
+            return float(raw)
+        return raw
+
+    def parse(self, args):
+        """Normalise request args into ``(filters, search, sort, direction, page, per_page)``."""
+        filters = {}
+        for column in self.columns:
+            raw = args.get(f'f_{column.name}')
+            if column.filterable and raw not in (None, ''):
+                try:
+                    filters[column.name] = self._coerce(column, raw)
+                except ValueError:
+                    continue
+        search = (args.get('q') or '').strip()
+        sort = args.get('sort') or self.default_sort
+        if sort not in self.by_name or not self.by_name[sort].sortable:
+            sort = self.default_sort
+        direction = 'asc' if args.get('dir', self.default_dir) == 'asc' else 'desc'
+        try:
+            page = max(1, int(args.get('page', 1)))
+        except (TypeError, ValueError):
+            page = 1
+        try:
+            per_page = min(MAX_PER_PAGE, max(1, int(args.get('per_page', DEFAULT_PER_PAGE))))
+        except (TypeError, ValueError):
+            per_page = DEFAULT_PER_PAGE
+        return filters, search, sort, direction, page, per_page
+
+    def _where(self, filters, search):
+        clauses = [self.by_name[name].expr == value for name, value in filters.items()]
+        if search:
+            like = f'%{search}%'
+            searchable = [c.expr.ilike(like) for c in self.columns if c.searchable]
+            clauses.append(or_(*searchable) if searchable else false())
+        return clauses
+
+    def rows(self, filters, search, sort, direction, page, per_page):
+        """Fetch one page as tuples, in column order."""
+        order = self.by_name[sort].expr
+        order = order.asc() if direction == 'asc' else order.desc()
+        stmt = self._from(select(*[c.expr.label(c.name) for c in self.columns]))
+        stmt = stmt.where(*self._where(filters, search)).order_by(order, self.by_name['id'].expr.desc())
+        stmt = stmt.limit(per_page).offset((page - 1) * per_page)
+        return db.session.execute(stmt).all()
+
+    def count(self, filters, search):
+        """Total matching rows, served from a short-lived cache."""
+        key = (self.name, tuple(sorted(filters.items())), search.lower())
+        cached = _count_cache.get(key)
+        if cached is not None:
+            return cached
+        stmt = self._from(select(func.count(self.by_name['id'].expr)))
+        total = db.session.execute(stmt.where(*self._where(filters, search))).scalar() or 0
+        _count_cache.set(key, total)
+        return total
+
+    def query(self, args):
+        """Run the grid for request ``args`` and return the JSON payload."""
+        filters, search, sort, direction, page, per_page = self.parse(args)
+        rows = self.rows(filters, search, sort, direction, page, per_page)
+        return {
+            'columns': [c.name for c in self.columns],
+            'rows': [[_jsonable(v) for v in row] for row in rows],
+            'total': self.count(filters, search),
+            'page': page,
+            'per_page': per_page,
+            'sort': sort,
+            'dir': direction,
+        }
+
+
+class _CountCache:
+    """Tiny thread-safe TTL cache for grid totals."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _ttl(self):
+        if has_app_context():
+            return current_app.config.get('GRID_COUNT_TTL', DEFAULT_COUNT_TTL)
+        return DEFAULT_COUNT_TTL
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= _COUNT_CACHE_LIMIT:
+                self._data.clear()
+            self._data[key] = (time.monotonic() + self._ttl(), value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_count_cache = _CountCache()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _build_grids():
+    from agrifarma.models.product import Product, Order
+    from agrifarma.models.user import User
+    from agrifarma.models.role import Role
+
+    products = Grid('products', [
+        GridColumn('id', Product.id, kind='int'),
+        GridColumn('name', Product.name, searchable=True),
+        GridColumn('sku', Product.sku, searchable=True),
+        GridColumn('category', Product.category, searchable=True, filterable=True),
+        GridColumn('price', Product.price, kind='number'),
+        GridColumn('stock_quantity', Product.stock_quantity, kind='int'),
+        GridColumn('low_stock', Product.stock_quantity <= Product.low_stock_threshold, sortable=False, kind='bool'),
+        GridColumn('sold_count', Product.sold_count, kind='int'),
+        GridColumn('is_featured', Product.is_featured, filterable=True, kind='bool'),
+        GridColumn('is_active', Product.is_active, filterable=True, kind='bool'),
+        GridColumn('created_at', Product.created_at, kind='datetime'),
+    ], Product.__table__, default_sort='created_at')
+
+    orders = Grid('orders', [
+        GridColumn('id', Order.id, kind='int'),
+        GridColumn('order_number', Order.order_number, searchable=True),
+        GridColumn('customer', User.username, searchable=True),
+        GridColumn('total_amount', Order.total_amount, kind='number'),
+        GridColumn('status', Order.status, filterable=True),
+        GridColumn('payment_status', Order.payment_status, filterable=True),
+        GridColumn('order_date', Order.order_date, kind='datetime'),
+    ], Order.__table__, joins=[(User.__table__, User.id == Order.customer_id)], default_sort='order_date')
+
+    users = Grid('users', [
+        GridColumn('id', User.id, kind='int'),
+        GridColumn('name', User.name, searchable=True),
+        GridColumn('username', User.username, searchable=True),
+        GridColumn('email', User.email, searchable=True),
+        GridColumn('role', Role.name, filterable=True),
+        GridColumn('join_date', User.join_date, kind='datetime'),
+        GridColumn('is_active', User.is_active, filterable=True, kind='bool'),
+    ], User.__table__, joins=[(Role.__table__, Role.id == User.role_id)], default_sort='join_date')
+
+    return {g.name: g for g in (products, orders, users)}
+
+
+_grids = None
+
+
+def get_grid(name):
+    """Return the grid registered under ``name`` (or None)."""
+    global _grids
+    if _grids is None:
+        _grids = _build_grids()
+    return _grids.get(name)
@@ -0,0 +1,180 @@
+"""
+Liveness and readiness.
+
+``/livez`` answers from memory and only says the process can serve. ``/readyz``
+(and ``/health``) report the deep checks below without running them on the
+probe's request. A daemon thread per worker runs them every
+``HEALTH_CHECK_INTERVAL`` seconds and caches the results with timestamps. If
+the results are older than ``HEALTH_STALE_AFTER`` (the thread has died), the
+instance reports not ready.
+
+Checks:
+
+* ``database``: the primary accepts writes. A no-op UPDATE runs inside a
+  transaction that is rolled back, which fails on a read-only replica, a
+  locked SQLite file or a lost connection.
+* ``uploads``: ``UPLOAD_FOLDER`` is writable and has at least
+  ``HEALTH_MIN_FREE_MB`` free.
+* ``schema``: the database is at the Alembic head revision when a
+  ``migrations/`` directory exists. Otherwise (tables created by
+  ``migrate_new_tables``) every model table must be present.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import inspect, text
+from agrifarma.extensions import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15
+DEFAULT_MIN_FREE_MB = 200
+
+
+class CheckFailed(Exception):
+    """A deep check found a problem; the message is reported to the probe."""
+
+
+def check_database(app):
+    with db.engine.connect() as conn:
+        with conn.begin() as trans:
+            conn.execute(text('UPDATE roles SET name = name WHERE 1 = 0'))
+            trans.rollback()
+    return 'writable'
+
+
+def check_uploads(app):
+    folder = app.config['UPLOAD_FOLDER']
+    if not os.path.isdir(folder) or not os.access(folder, os.W_OK):
+        raise CheckFailed(f'{folder} is not a writable directory')
+    free_mb = shutil.disk_usage(folder).free // (1024 * 1024)
+    minimum = app.config.get('HEALTH_MIN_FREE_MB', DEFAULT_MIN_FREE_MB)
+    if free_mb < minimum:
+        raise CheckFailed(f'{free_mb} MB free, need {minimum} MB')
+    return f'{free_mb} MB free'
+
+
+def check_schema(app):
+    directory = os.path.join(os.path.dirname(app.root_path), 'migrations')
+    if os.path.isdir(directory):
+        from alembic.migration import MigrationContext
+        from alembic.script import ScriptDirectory
+        heads = set(ScriptDirectory.from_config(_alembic_config(directory)).get_heads())
+        with db.engine.connect() as conn:
+            current = set(MigrationContext.configure(conn).get_current_heads())
+        if current != heads:
+            raise CheckFailed(f"database at {', '.join(sorted(current)) or 'no revision'}, "
+                              f"head is {', '.join(sorted(heads))}")
+        return f"at head {', '.join(sorted(heads))}"
+    missing = set(db.metadata.tables) - set(inspect(db.engine).get_table_names())
+    if missing:
+        raise CheckFailed(f"missing tables: {', '.join(sorted(missing))}")
+    return f'{len(db.metadata.tables)} tables present'
+
+
+def _alembic_config(directory):
+    from alembic.config import Config
+    config = Config(os.path.join(directory, 'alembic.ini'))
+    config.set_main_option('script_location', directory)
+    return config
+
+
+CHECKS = {
+    'database': check_database,
+    'uploads': check_uploads,
+    'schema': check_schema,
+}
+
+
+def run_checks(app, checks=None):
+    """Run every check (inside an app context) and return the result dict."""
+    results = {}
+    for name, func in (checks or CHECKS).items():
+        started = time.perf_counter()
+        try:
+            detail, ok = func(app), True
+        except CheckFailed as exc:
+            detail, ok = str(exc), False
+        except Exception as exc:
+            detail, ok = f'{type(exc).__name__}: {exc}', False
+        if not ok:
+            logger.warning('Health check %s failed: %s', name, detail)
+        db.session.remove()
+        results[name] = {
+            'ok': ok,
+            'detail': detail,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'checked_at': datetime.utcnow().isoformat() + 'Z',
+        }
+    return results
+
+
+class HealthMonitor:
+    """Cached deep-check results, refreshed by a per-process daemon thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('HEALTH_CHECK_INTERVAL', DEFAULT_INTERVAL)
+        self.stale_after = app.config.get('HEALTH_STALE_AFTER') or 3 * self.interval
+        self.results = None
+        self.updated = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def refresh(self):
+        with self.app.app_context():
+            results = run_checks(self.app)
+        self.results, self.updated = results, time.monotonic()
+        return results
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Health monitor refresh failed')
+
+    def ensure_running(self):
+        # Started lazily, and again after a fork (gunicorn --preload), since threads don't survive it
+        if self.interval and (self._thread is None or self._pid != os.getpid() or not self._thread.is_alive()):
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._loop, name='health-monitor', daemon=True)
+                    self._thread.start()
+
+    def snapshot(self):
+        """``(ready, payload)`` from the cached results.
+
+        Checks run on the caller's thread only before the first result exists,
+        or on every call when ``HEALTH_CHECK_INTERVAL`` is 0.
+        """
+        self.ensure_running()
+        if not self.interval:
+            self.refresh()
+        elif self.results is None:
+            with self._lock:
+                if self.results is None:
+                    self.refresh()
+        age = time.monotonic() - self.updated
+        stale = bool(self.interval) and age > self.stale_after
+        ready = not stale and all(result['ok'] for result in self.results.values())
+        return ready, {
+            'status': 'ready' if ready else 'not ready',
+            'stale': stale,
+            'age_seconds': round(age, 1),
+            'checks': self.results,
+        }
+
+
+def init_health(app):
+    app.extensions['health'] = HealthMonitor(app)
+
+
+def get_monitor(app):
+    return app.extensions['health']
@@ -0,0 +1,113 @@
+"""
+Hot-thread ranking.
+
+``hot_score`` is a Hacker News style score stored on each thread::
+
+    points = 1 + 3 * participants + replies + log2(1 + views) + 5 (if solved)
+    hot_score = points / (age_hours + 2) ** 1.5
+
+Age counts from the thread's creation, so bumping an old thread doesn't
+revive it. Distinct repliers weigh more than the raw reply count, so one
+user posting over and over can't outrank a real discussion.
+
+Scores are refreshed for one thread at a time when it gets a reply, loses one
+or is solved. Because they decay with time, ``recompute_all`` (``flask
+recompute-hot-scores``, run periodically) refreshes every thread created in
+the last ``FORUM_HOT_WINDOW_DAYS`` in one pass and zeroes older ones. The Hot
+tab and the dashboard read the top N with one query on the
+``(is_deleted, hot_score)`` index.
+"""
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, distinct, func, select, update
+from agrifarma.extensions import db
+from agrifarma.models.forum import Thread, Reply
+
+GRAVITY = 1.5
+PARTICIPANT_WEIGHT = 3.0
+REPLY_WEIGHT = 1.0
+SOLVED_BONUS = 5.0
+DEFAULT_WINDOW_DAYS = 14
+
+
+def hot_score(replies, participants, views, solved, created_at, now=None):
+    """Time-decayed score for a thread with the given activity."""
+    now = now or datetime.utcnow()
+    age_hours = max((now - (created_at or now)).total_seconds() / 3600, 0)
+    points = (1 + PARTICIPANT_WEIGHT * participants + REPLY_WEIGHT * replies
+              + math.log2(1 + (views or 0)) + (SOLVED_BONUS if solved else 0))
+    return points / (age_hours + 2) ** GRAVITY
+
+
+def _activity():
+    """Reply and distinct-replier counts per thread, for non-deleted replies."""
+    return (
+        select(Reply.thread_id, func.count(Reply.id).label('replies'),
+               func.count(distinct(Reply.author_id)).label('participants'))
+        .where(Reply.is_deleted.is_not(True))
+        .group_by(Reply.thread_id)
+        .subquery()
+    )
+
+
+def _scores_stmt():
+    activity = _activity()
+    return (
+        select(Thread.id, Thread.created_at, Thread.view_count, Thread.is_solved,
+               func.coalesce(activity.c.replies, 0), func.coalesce(activity.c.participants, 0))
+        .outerjoin(activity, activity.c.thread_id == Thread.id)
+    )
+
+
+def _write(scores):
+    """Store ``{thread_id: score}`` in one executemany, leaving ``updated_at`` (page ETags) alone."""
+    table = Thread.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('thread_id'))
+        .values(hot_score=bindparam('score'), updated_at=table.c.updated_at),
+        [{'thread_id': thread_id, 'score': score} for thread_id, score in scores.items()],
+    )
+
+
+def refresh(thread_id):
+    """Recompute one thread's score after activity on it (uncommitted)."""
+    row = db.session.execute(_scores_stmt().where(Thread.id == thread_id)).one_or_none()
+    if row is None:
+        return None
+    _, created_at, views, solved, replies, participants = row
+    score = hot_score(replies, participants, views, solved, created_at)
+    _write({thread_id: score})
+    return score
+
+
+def recompute_all(window_days=DEFAULT_WINDOW_DAYS, now=None):
+    """Refresh every recent thread's score and zero the rest (uncommitted).
+
+    Returns ``(refreshed, zeroed)``.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=window_days)
+    rows = db.session.execute(_scores_stmt().where(Thread.created_at >= since)).all()
+    scores = {
+        thread_id: hot_score(replies, participants, views, solved, created_at, now)
+        for thread_id, created_at, views, solved, replies, participants in rows
+    }
+    if scores:
+        _write(scores)
+    table = Thread.__table__
+    zeroed = db.session.execute(
+        update(table)
+        .where(table.c.created_at < since, table.c.hot_score != 0)
+        .values(hot_score=0, updated_at=table.c.updated_at)
+    ).rowcount
+    return len(scores), zeroed
+
+
+def hot_threads_query():
+    """Non-deleted threads, hottest first (served by ``ix_forum_threads_hot``)."""
+    return Thread.query.filter_by(is_deleted=False).order_by(Thread.hot_score.desc(), Thread.id.desc())
+
+
+def hot_threads(limit=5):
+    return hot_threads_query().limit(limit).all()
@@ -0,0 +1,254 @@
+"""
+Live forum thread updates over Server-Sent Events.
+
+Off unless ``LIVE_ENABLED`` is set. While it is off, thread pages carry no
+stream URL, the endpoint answers ``404`` and nothing is published.
+
+``post_reply`` publishes each new reply, after its commit, to the channel
+``thread:<id>`` as a small JSON fragment. The same applies to anything else
+that calls ``publish``. ``GET /forum/thread/<id>/events`` streams that
+channel:
+
+* every event carries an ``id``. A reconnecting ``EventSource`` sends it back
+  as ``Last-Event-ID`` and gets what it missed (within the broker's backlog)
+  before live events;
+* a comment line goes out every ``LIVE_HEARTBEAT_SECONDS`` so proxies keep
+  the connection open and dead clients are noticed;
+* a stream ends after ``LIVE_STREAM_MAX_SECONDS``, and the browser
+  reconnects (``retry:``), so workers are recycled rather than held forever;
+* each worker serves at most ``LIVE_MAX_STREAMS`` streams at once. Beyond
+  that the answer is ``503`` with ``Retry-After``, and the page keeps working
+  without live updates.
+
+Brokers (``LIVE_BROKER``):
+
+* ``memory``: in-process pub/sub with a per-channel backlog. Only clients
+  connected to the publishing worker see the event. Fine for a single
+  process. Channels with no event for ``RETENTION_SECONDS`` are dropped.
+* ``sqlite``: an append-only event log in a small SQLite file
+  (``LIVE_BROKER_PATH``, default ``instance/live_events.sqlite3``) shared by
+  every worker on the host. Streams poll it every ``LIVE_POLL_SECONDS``.
+  AUTOINCREMENT ids never repeat, so ``Last-Event-ID`` works across
+  workers.
+
+Streams hold a worker thread for their lifetime. Run a threaded or gevent
+worker class when enabling this behind gunicorn (the Procfile runs
+``gthread`` with 8 threads), and keep ``LIVE_MAX_STREAMS`` below the thread
+count so ordinary page views always have a thread.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKLOG = 100
+DEFAULT_HEARTBEAT_SECONDS = 15
+DEFAULT_MAX_STREAMS = 4
+DEFAULT_STREAM_MAX_SECONDS = 300
+DEFAULT_POLL_SECONDS = 1.0
+RETENTION_SECONDS = 900  # comfortably longer than any reconnect gap
+RETRY_MS = 3000
+
+Event = namedtuple('Event', 'id kind data')
+
+
+class MemoryBroker:
+    """Pub/sub inside one process; keeps the last ``backlog`` events per channel."""
+
+    def __init__(self, backlog=DEFAULT_BACKLOG, retention=RETENTION_SECONDS):
+        self.backlog = backlog
+        self.retention = retention
+        self._channels = {}
+        self._published = {}
+        self._swept = time.monotonic()
+        self._next_id = 0
+        self._cond = threading.Condition()
+
+    def publish(self, channel, kind, data):
+        with self._cond:
+            now = time.monotonic()
+            self._next_id += 1
+            events = self._channels.setdefault(channel, deque(maxlen=self.backlog))
+            events.append(Event(self._next_id, kind, json.dumps(data)))
+            self._published[channel] = now
+            if now - self._swept > self.retention:
+                self._sweep(now)
+            self._cond.notify_all()
+            return self._next_id
+
+    def _sweep(self, now):
+        # Quiet channels (a thread nobody replied to lately) would otherwise be
+        # kept forever. Ids only grow, so a stream waiting on one still works.
+        for channel, published in list(self._published.items()):
+            if now - published > self.retention:
+                del self._channels[channel], self._published[channel]
+        self._swept = now
+
+    def latest_id(self, channel):
+        events = self._channels.get(channel)
+        return events[-1].id if events else 0
+
+    def _since(self, channel, last_id):
+        return [event for event in self._channels.get(channel, ()) if event.id > last_id]
+
+    def wait(self, channel, last_id, timeout):
+        """Events after ``last_id``, blocking up to ``timeout`` seconds for the first one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.latest_id(channel) > last_id, timeout)
+            return self._since(channel, last_id)
+
+
+class SQLiteBroker:
+    """Event log in a SQLite file shared by the workers on one host."""
+
+    def __init__(self, path, backlog=DEFAULT_BACKLOG, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.path = path
+        self.backlog = backlog
+        self.poll_seconds = poll_seconds
+        self._local = threading.local()
+        self._published = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'channel TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_events_channel ON events (channel, id)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # live events are best effort
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def publish(self, channel, kind, data):
+        conn = self._connect()
+        now = time.time()
+        event_id = conn.execute('INSERT INTO events (channel, kind, data, created) VALUES (?, ?, ?, ?)',
+                                (channel, kind, json.dumps(data), now)).lastrowid
+        self._published += 1
+        if self._published % 100 == 0:
+            conn.execute('DELETE FROM events WHERE created < ?', (now - RETENTION_SECONDS,))
+        return event_id
+
+    def latest_id(self, channel):
+        row = self._connect().execute('SELECT MAX(id) FROM events WHERE channel = ?', (channel,)).fetchone()
+        return row[0] or 0
+
+    def _since(self, channel, last_id):
+        rows = self._connect().execute(
+            'SELECT id, kind, data FROM events WHERE channel = ? AND id > ? ORDER BY id LIMIT ?',
+            (channel, last_id, self.backlog)).fetchall()
+        return [Event(*row) for row in rows]
+
+    def wait(self, channel, last_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._since(channel, last_id)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            time.sleep(min(self.poll_seconds, remaining))
+
+
+class StreamSlots:
+    """Counts this worker's open streams against a cap."""
+
+    def __init__(self, limit=DEFAULT_MAX_STREAMS):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+def format_event(event):
+    """One SSE frame (``data`` is already JSON, so it never contains a newline)."""
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n'
+
+
+def stream(broker, channel, last_id=None, heartbeat=DEFAULT_HEARTBEAT_SECONDS,
+           max_seconds=DEFAULT_STREAM_MAX_SECONDS):
+    """Generate SSE frames for ``channel`` until ``max_seconds`` pass or the client leaves."""
+    yield f'retry: {RETRY_MS}\n\n'
+    if last_id is None:
+        last_id = broker.latest_id(channel)  # new viewers don't need history
+    deadline = time.monotonic() + max_seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = broker.wait(channel, last_id, min(heartbeat, remaining))
+        for event in events:
+            last_id = event.id
+            yield format_event(event)
+        if not events:
+            yield ': heartbeat\n\n'
+
+
+def init_live(app):
+    """Attach the configured broker and stream cap to ``app``."""
+    backlog = app.config.get('LIVE_BACKLOG', DEFAULT_BACKLOG)
+    if app.config.get('LIVE_BROKER', 'memory') == 'sqlite':
+        path = app.config.get('LIVE_BROKER_PATH') or os.path.join(app.instance_path, 'live_events.sqlite3')
+        broker = SQLiteBroker(path, backlog, app.config.get('LIVE_POLL_SECONDS', DEFAULT_POLL_SECONDS))
+    else:
+        broker = MemoryBroker(backlog)
+    app.extensions['live'] = {
+        'broker': broker,
+        'slots': StreamSlots(app.config.get('LIVE_MAX_STREAMS', DEFAULT_MAX_STREAMS)),
+    }
+
+
+def enabled():
+    return has_app_context() and bool(current_app.config.get('LIVE_ENABLED')) and 'live' in current_app.extensions
+
+
+def get_broker():
+    return current_app.extensions['live']['broker']
+
+
+def get_slots():
+    return current_app.extensions['live']['slots']
+
+
+def thread_channel(thread_id):
+    return f'thread:{thread_id}'
+
+
+def publish(channel, kind, data):
+    """Publish an event; failures are logged, never raised into the request."""
+    if not enabled():
+        return None
+    try:
+        return get_broker().publish(channel, kind, data)
+    except Exception:
+        logger.exception('Live event %s on %s not published', kind, channel)
+        return None
+
+
+def publish_reply(reply, url=None):
+    """Tell viewers of the reply's thread about it (call after the commit)."""
+    return publish(thread_channel(reply.thread_id), 'reply', {
+        'id': reply.id,
+        'author': reply.author.name if reply.author else 'Unknown',
+        'created_at': reply.created_at.isoformat() if reply.created_at else None,
+        'html': reply.content_html or '',
+        'url': url,
+    })
@@ -0,0 +1,39 @@
+"""
+Outgoing email.
+
+Sends through SMTP using the ``MAIL_*`` config keys. When ``MAIL_SERVER`` is
+unset (development), messages are only logged. Meant to be called from
+outbox handlers in the worker, never inline in a request.
+"""
+import logging
+import smtplib
+from email.message import EmailMessage
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(to, subject, body, sender=None):
+    message = EmailMessage()
+    message['From'] = sender or current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('ADMIN_EMAIL')
+    message['To'] = to if isinstance(to, str) else ', '.join(to)
+    message['Subject'] = subject
+    message.set_content(body)
+    return message
+
+
+def send_mail(to, subject, body, sender=None):
+    """Send one plain-text email; SMTP errors propagate so the outbox can retry."""
+    message = build_message(to, subject, body, sender)
+    config = current_app.config
+    server = config.get('MAIL_SERVER')
+    if not server:
+        logger.info('Mail (not sent, MAIL_SERVER unset) to=%s subject=%s', message['To'], subject)
+        return message
+    with smtplib.SMTP(server, config.get('MAIL_PORT') or 25, timeout=config.get('MAIL_TIMEOUT', 10)) as smtp:
+        if config.get('MAIL_USE_TLS'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        smtp.send_message(message)
+    return message
@@ -0,0 +1,338 @@
+"""
+Prometheus-style metrics, exposed on ``/metrics`` in the text exposition format.
+
+Collected here:
+
+* request latency per endpoint, method and status (histogram);
+* DB statements per operation, with durations (counter and histogram, from
+  SQLAlchemy cursor events on every engine);
+* upload and export durations per kind (histograms, via ``Histogram.time``
+  and ``observe_iter`` at the call sites);
+* connection pool checkouts, new connections and currently checked-out
+  connections.
+
+Values live in this process. With ``METRICS_MULTIPROC_DIR`` (or the usual
+``PROMETHEUS_MULTIPROC_DIR``) set, each worker writes its totals to
+``<dir>/<pid>.json`` every ``METRICS_FLUSH_SECONDS`` and at exit. A scrape
+merges every file: counters and histograms are summed, including those of
+workers that have since exited, and gauges are summed over the files written
+within ``METRICS_GAUGE_MAX_AGE``. Empty the directory when the server is
+(re)started, as with prometheus_client.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+TRANSFER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_FLUSH_SECONDS = 5
+DEFAULT_GAUGE_MAX_AGE = 60
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): (list(value) if isinstance(value, list) else value)
+                    for key, value in self.values.items()}
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    """Stores per-bucket (non-cumulative) counts followed by sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1  # +Inf
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'agrifarma_http_request_duration_seconds', 'Request latency by endpoint, method and status.',
+    ('endpoint', 'method', 'status')))
+DB_STATEMENTS = REGISTRY.register(Counter(
+    'agrifarma_db_statements_total', 'SQL statements executed, by operation.', ('operation',)))
+DB_STATEMENT_SECONDS = REGISTRY.register(Histogram(
+    'agrifarma_db_statement_duration_seconds', 'SQL statement execution time, by operation.', ('operation',), DB_BUCKETS))
+UPLOAD_SECONDS = REGISTRY.register(Histogram(
+    'agrifarma_upload_duration_seconds', 'Time spent storing or processing an upload, by kind.', ('kind',),
+    TRANSFER_BUCKETS))
+EXPORT_SECONDS = REGISTRY.register(Histogram(
+    'agrifarma_export_duration_seconds', 'Time spent producing an export, by kind.', ('kind',), TRANSFER_BUCKETS))
+POOL_CHECKOUTS = REGISTRY.register(Counter(
+    'agrifarma_db_pool_checkouts_total', 'Connections checked out of the pool.'))
+POOL_CONNECTS = REGISTRY.register(Counter(
+    'agrifarma_db_pool_connects_total', 'New DBAPI connections opened by the pool.'))
+POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    'agrifarma_db_pool_checked_out', 'Connections currently checked out of the pool.'))
+
+
+def observe_iter(iterable, histogram, **labels):
+    """Yield from ``iterable`` and record the time until it is exhausted (or closed)."""
+    started = time.perf_counter()
+    try:
+        yield from iterable
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+# --- SQLAlchemy instrumentation (every engine; a cheap no-op when nobody scrapes) ---
+
+def _operation(statement):
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete') else 'other'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_started')
+    if not starts:
+        return
+    operation = _operation(statement)
+    DB_STATEMENTS.inc(operation=operation)
+    DB_STATEMENT_SECONDS.observe(time.perf_counter() - starts.pop(), operation=operation)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _statement_failed(context):
+    starts = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+@event.listens_for(Pool, 'connect')
+def _pool_connect(dbapi_connection, connection_record):
+    POOL_CONNECTS.inc()
+
+
+@event.listens_for(Pool, 'checkout')
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+    POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _pool_checkin(dbapi_connection, connection_record):
+    POOL_CHECKED_OUT.dec()
+
+
+# --- Multiprocess files ---
+
+def multiproc_dir(app):
+    return app.config.get('METRICS_MULTIPROC_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def flush(directory):
+    """Write this process's totals to ``<directory>/<pid>.json`` (replaced atomically)."""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        json.dump({'written_at': time.time(), 'metrics': REGISTRY.snapshot()}, fh)
+    os.replace(tmp, os.path.join(directory, f'{os.getpid()}.json'))
+
+
+def merge(snapshots, gauge_max_age=DEFAULT_GAUGE_MAX_AGE, now=None):
+    """Sum per-process snapshots (``{'written_at', 'metrics'}``) into one."""
+    now = now or time.time()
+    merged = {}
+    for snapshot in snapshots:
+        fresh = now - snapshot.get('written_at', now) <= gauge_max_age
+        for name, values in snapshot['metrics'].items():
+            metric = REGISTRY.metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not fresh):
+                continue
+            into = merged.setdefault(name, {})
+            for key, value in values.items():
+                if isinstance(value, list):
+                    into[key] = [a + b for a, b in zip(into[key], value)] if key in into else list(value)
+                else:
+                    into[key] = into.get(key, 0) + value
+    return merged
+
+
+def collect(app):
+    """Current values: this process alone, or every worker in multiprocess mode."""
+    directory = multiproc_dir(app)
+    if not directory:
+        return REGISTRY.snapshot()
+    flush(directory)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots, app.config.get('METRICS_GAUGE_MAX_AGE', DEFAULT_GAUGE_MAX_AGE))
+
+
+# --- Exposition ---
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """Prometheus text exposition of ``collect()`` output."""
+    lines = []
+    for name, metric in REGISTRY.metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(values.get(name, {}).items()):
+            labelvalues = json.loads(key)
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_labels(metric.labelnames, labelvalues)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value):
+                cumulative += count
+                le = (('le', _number(float(bound))),)
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labelvalues, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, labelvalues)} {_number(float(value[-2]))}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, labelvalues)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Flask wiring ---
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # Unmatched URLs share one label so scanners can't blow up the series count
+        endpoint = request.endpoint or '<unmatched>'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=str(response.status_code))
+    app = current_app._get_current_object()
+    directory = multiproc_dir(app)
+    state = app.extensions['metrics']
+    if directory and time.monotonic() - state['flushed_at'] >= app.config.get('METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+        state['flushed_at'] = time.monotonic()
+        flush(directory)
+    return response
+
+
+def init_metrics(app):
+    """Time requests and flush multiprocess files as configured."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.extensions['metrics'] = {'flushed_at': time.monotonic()}
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    directory = multiproc_dir(app)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(flush, directory)
@@ -0,0 +1,76 @@
+"""
+Outbox handlers: emails sent by ``flask worker`` after the triggering change commits.
+
+Each handler receives the JSON payload stored by ``enqueue`` and reloads
+what it needs. A missing row means the change was undone, so the event is
+dropped rather than retried.
+"""
+from flask import current_app
+from agrifarma.extensions import db
+from agrifarma.services.mail import send_mail
+from agrifarma.services.outbox import handler
+
+
+@handler('order.placed')
+def order_placed(payload):
+    from agrifarma.models.product import Order
+    order = db.session.get(Order, payload['order_id'])
+    if order is None or not order.customer or not order.customer.email:
+        return
+    lines = [f'- {item.product_name} x{item.quantity}: PKR {item.total_price:.2f}' for item in order.order_items]
+    body = '\n'.join([
+        f'Dear {order.customer.name or order.customer.username},',
+        '',
+        f'Thank you for your order {order.order_number}.',
+        '',
+        *lines,
+        '',
+        f'Total: PKR {order.total_amount:.2f} ({order.payment_method or "cod"})',
+        'We will let you know when it ships.',
+        '',
+        'AgriFarma',
+    ])
+    send_mail(order.customer.email, f'Order confirmation {order.order_number}', body)
+
+
+@handler('forum.reply_posted')
+def reply_posted(payload):
+    from agrifarma.models.forum import Reply
+    reply = db.session.get(Reply, payload['reply_id'])
+    if reply is None:
+        return
+    thread = reply.thread
+    recipient = thread.author
+    if recipient is None or recipient.id == reply.author_id or not recipient.email:
+        return
+    body = (
+        f'{reply.author.username} replied to your thread "{thread.title}":\n\n'
+        f'{reply.content[:500]}\n\nAgriFarma Forum'
+    )
+    send_mail(recipient.email, f'New reply: {thread.title}', body)
+
+
+@handler('consultancy.booking_confirmed')
+def booking_confirmed(payload):
+    from agrifarma.models.consultancy import ConsultationBooking
+    booking = db.session.get(ConsultationBooking, payload['booking_id'])
+    if booking is None or booking.status != 'confirmed' or not booking.user.email:
+        return
+    slot = booking.slot
+    consultant = slot.profile.user
+    body = (
+        f'Dear {booking.user.name or booking.user.username},\n\n'
+        f'Your consultation with {consultant.name or consultant.username} on '
+        f'{slot.start_time:%d %b %Y %H:%M} has been confirmed.\n\nAgriFarma'
+    )
+    send_mail(booking.user.email, 'Consultation booking confirmed', body)
+
+
+@handler('contact.message')
+def contact_message(payload):
+    body = (
+        f"From: {payload.get('name')} <{payload.get('email')}>\n"
+        f"Phone: {payload.get('phone') or '-'}\n\n"
+        f"{payload.get('message') or ''}"
+    )
+    send_mail(current_app.config['ADMIN_EMAIL'], f"Contact form: {payload.get('subject') or 'No subject'}", body)
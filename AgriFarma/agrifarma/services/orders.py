@@ -0,0 +1,136 @@
+"""
+Order state machine and set-based bulk transitions.
+
+Two small machines share one API: fulfilment ``status`` and ``payment_status``.
+A transition is validated against the machine, stamps its timestamp column
+(``shipped_at``, ``paid_at``, ...) only if it is still empty, and writes one
+OrderEvent per order. ``transition_orders`` moves any number of orders with one
+SELECT, one UPDATE guarded by the allowed source states and one executemany
+INSERT for the event log. Nothing here commits; the caller owns the
+transaction, so a bulk action is all-or-nothing.
+"""
+from datetime import datetime
+from sqlalchemy import select, update, insert, func
+from agrifarma.extensions import db
+from agrifarma.models.product import Order, OrderEvent
+
+STATUS_TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+PAYMENT_TRANSITIONS = {
+    'unpaid': ('paid',),
+    'paid': ('refunded',),
+    'refunded': (),
+}
+MACHINES = {'status': STATUS_TRANSITIONS, 'payment_status': PAYMENT_TRANSITIONS}
+
+# Timestamp column stamped when an order first enters a state
+STAMPS = {
+    'shipped': 'shipped_at',
+    'delivered': 'delivered_at',
+    'cancelled': 'cancelled_at',
+    'paid': 'paid_at',
+}
+
+
+class InvalidTransition(ValueError):
+    """Raised for a state change the order state machine does not allow."""
+
+
+def allowed_targets(current, field='status'):
+    """States reachable from ``current`` in one step."""
+    return MACHINES[field].get(current, ())
+
+
+def can_transition(current, target, field='status'):
+    return target in allowed_targets(current, field)
+
+
+def _sources(target, field):
+    machine = MACHINES.get(field)
+    if machine is None:
+        raise InvalidTransition(f'Unknown order field: {field}')
+    if target not in machine:
+        raise InvalidTransition(f'Unknown {field} value: {target}')
+    return [state for state, targets in machine.items() if target in targets]
+
+
+class TransitionResult:
+    """Which orders moved and why the others did not."""
+
+    def __init__(self):
+        self.moved = []
+        self.rejected = {}  # {order_id: reason}
+
+    def merge(self, other):
+        self.moved.extend(other.moved)
+        self.rejected.update(other.rejected)
+        return self
+
+
+def transition_orders(order_ids, target, field='status', actor_id=None, note=None, now=None):
+    """Move ``order_ids`` to ``target`` in one set-based UPDATE and log the events."""
+    sources = _sources(target, field)
+    column = getattr(Order, field)
+    now = now or datetime.utcnow()
+    result = TransitionResult()
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return result
+
+    current = dict(db.session.execute(select(Order.id, column).where(Order.id.in_(order_ids))).all())
+    candidates = []
+    for order_id in order_ids:
+        if order_id not in current:
+            result.rejected[order_id] = 'order not found'
+        elif current[order_id] not in sources:
+            result.rejected[order_id] = f'cannot change {field} from {current[order_id]} to {target}'
+        else:
+            candidates.append(order_id)
+    if not candidates:
+        return result
+
+    values = {field: target, 'updated_at': now}
+    stamp = STAMPS.get(target)
+    if stamp:
+        values[stamp] = func.coalesce(getattr(Order, stamp), now)
+    # Re-checking the source state in the WHERE keeps concurrent changes from being overwritten
+    stmt = (
+        update(Order)
+        .where(Order.id.in_(candidates), column.in_(sources))
+        .values(**values)
+        .execution_options(synchronize_session='fetch')
+    )
+    if db.session.get_bind().dialect.update_returning:
+        moved = set(db.session.execute(stmt.returning(Order.id)).scalars())
+    else:
+        db.session.execute(stmt)
+        moved = set(candidates)
+    for order_id in candidates:
+        if order_id in moved:
+            result.moved.append(order_id)
+        else:
+            result.rejected[order_id] = f'{field} changed concurrently'
+
+    if result.moved:
+        db.session.execute(insert(OrderEvent), [
+            {
+                'order_id': order_id, 'field': field, 'from_value': current[order_id], 'to_value': target,
+                'actor_id': actor_id, 'note': note, 'created_at': now, 'updated_at': now,
+            }
+            for order_id in result.moved
+        ])
+    return result
+
+
+def apply_transitions(plan, field='status', actor_id=None, note=None):
+    """Apply ``{target_state: [order_ids]}``: one UPDATE (and one event insert) per target."""
+    result = TransitionResult()
+    now = datetime.utcnow()
+    for target, order_ids in plan.items():
+        result.merge(transition_orders(order_ids, target, field=field, actor_id=actor_id, note=note, now=now))
+    return result
@@ -0,0 +1,181 @@
+"""
+Transactional outbox and the local worker that drains it.
+
+Request handlers call ``enqueue`` before their own commit, so a side effect
+(an email, say) is recorded if and only if the domain change is. ``flask worker``
+then claims due events in batches under a lease, dispatches them to the
+handler registered for their topic, and either marks them done, reschedules
+them with exponential backoff, or dead-letters them after
+``OUTBOX_MAX_ATTEMPTS``.
+
+Claiming is one guarded UPDATE stamped with a per-batch lease token. It is
+safe with several workers on SQLite (the UPDATE is atomic). On PostgreSQL the
+candidate SELECT also uses ``FOR UPDATE SKIP LOCKED``, so workers don't queue
+behind each other. A worker that dies mid-batch loses its lease after
+``OUTBOX_LEASE_SECONDS`` and the events are claimed again.
+"""
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, or_, and_
+from agrifarma.extensions import db
+from agrifarma.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+
+_handlers = {}
+
+
+def handler(topic):
+    """Register ``func(payload)`` as the handler for ``topic``."""
+    def decorator(func):
+        _handlers[topic] = func
+        return func
+    return decorator
+
+
+def get_handler(topic):
+    return _handlers.get(topic)
+
+
+def enqueue(topic, payload=None, delay=0):
+    """Add an event to the current session; it is committed with the caller's changes."""
+    event = OutboxEvent(
+        topic=topic,
+        payload=json.dumps(payload or {}, default=str),
+        status='pending',
+        attempts=0,
+        available_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(event)
+    return event
+
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+
+def claim_batch(worker_id, batch_size=None, lease_seconds=None, now=None):
+    """Lease up to ``batch_size`` due events for this worker and return them.
+
+    Due means pending with ``available_at`` reached, or processing with an
+    expired lease (its worker died).
+    """
+    batch_size = batch_size or _config('OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    lease_seconds = lease_seconds or _config('OUTBOX_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+    now = now or datetime.utcnow()
+    claimable = or_(
+        and_(OutboxEvent.status == 'pending', OutboxEvent.available_at <= now),
+        and_(OutboxEvent.status == 'processing', OutboxEvent.locked_until < now),
+    )
+    candidates = select(OutboxEvent.id).where(claimable).order_by(OutboxEvent.id).limit(batch_size)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+    ids = list(db.session.execute(candidates).scalars())
+    if not ids:
+        db.session.rollback()
+        return []
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    # The claimable condition is re-checked, so a row another worker grabbed in between is skipped
+    db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(ids), claimable)
+        .values(status='processing', locked_by=token, locked_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return list(db.session.execute(
+        select(OutboxEvent).where(OutboxEvent.locked_by == token).order_by(OutboxEvent.id)
+    ).scalars())
+
+
+def _backoff(attempts):
+    base = _config('OUTBOX_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+    return min(MAX_BACKOFF_SECONDS, base * 2 ** (attempts - 1))
+
+
+def dispatch(event, now=None):
+    """Run one claimed event's handler and record the outcome (commits)."""
+    func = get_handler(event.topic)
+    try:
+        if func is None:
+            raise LookupError(f'No outbox handler for topic {event.topic!r}')
+        func(event.data)
+    except Exception as exc:
+        db.session.rollback()
+        event = db.session.get(OutboxEvent, event.id)
+        now = now or datetime.utcnow()
+        event.attempts += 1
+        event.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+        event.locked_by = event.locked_until = None
+        if event.attempts >= _config('OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS) or func is None:
+            event.status = 'dead'
+            logger.error('Outbox event %s (%s) dead-lettered: %s', event.id, event.topic, event.last_error)
+        else:
+            event.status = 'pending'
+            event.available_at = now + timedelta(seconds=_backoff(event.attempts))
+            logger.warning('Outbox event %s (%s) failed, attempt %s: %s',
+                           event.id, event.topic, event.attempts, event.last_error)
+        db.session.commit()
+        return False
+    event.status = 'done'
+    event.processed_at = now or datetime.utcnow()
+    event.locked_by = event.locked_until = None
+    db.session.commit()
+    return True
+
+
+def run_once(worker_id=None, batch_size=None):
+    """Claim and dispatch one batch. Returns ``(succeeded, failed)``."""
+    _load_handlers()
+    worker_id = worker_id or default_worker_id()
+    succeeded = failed = 0
+    for event in claim_batch(worker_id, batch_size):
+        if dispatch(event):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def run_worker(poll_interval=2.0, batch_size=None, once=False, should_stop=None):
+    """Drain the outbox until stopped; sleeps ``poll_interval`` when idle."""
+    worker_id = default_worker_id()
+    logger.info('Outbox worker %s started', worker_id)
+    while not (should_stop and should_stop()):
+        succeeded, failed = run_once(worker_id, batch_size)
+        if once:
+            return succeeded, failed
+        if not succeeded and not failed:
+            time.sleep(poll_interval)
+    return 0, 0
+
+
+def requeue_dead(topic=None):
+    """Move dead-lettered events back to pending with a fresh attempt budget."""
+    stmt = update(OutboxEvent).where(OutboxEvent.status == 'dead')
+    if topic:
+        stmt = stmt.where(OutboxEvent.topic == topic)
+    result = db.session.execute(stmt.values(status='pending', attempts=0, available_at=datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _load_handlers():
+    # Handlers register themselves on import
+    import agrifarma.services.notifications  # noqa: F401
@@ -0,0 +1,328 @@
+"""
+Full-page cache for anonymous visitors.
+
+Listing pages decorated with ``@cached_page(tags=...)`` are served from the
+cache when the visitor is anonymous, has no pending flash messages and sends a
+plain GET. Keys are built from the path, the normalised query string (sorted,
+blanks and tracking parameters dropped) and the preferred locale.
+
+Invalidation is tag based. Each tag has a version, and an entry remembers the
+versions its tags had before the page was rendered. Committing a change to a
+model listed in ``MODEL_TAGS`` bumps its tag, so older entries stop matching.
+Bulk statements flagged ``counter_only`` (view counters) don't invalidate.
+
+Backends: ``memory`` (per process, LRU) and ``filesystem`` (shared by every
+worker on the host). Configure with ``PAGE_CACHE_*``. Hit/miss/bypass counters
+are kept per process and exposed through ``stats()``.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, g, has_app_context, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1000
+IGNORED_PARAMS = {'fbclid', 'gclid'}
+
+# Model class name -> cache tag; any committed insert/update/delete bumps the tag
+MODEL_TAGS = {
+    'Product': 'products',
+    'ProductReview': 'products',
+    'Category': 'forum',
+    'Thread': 'forum',
+    'Reply': 'forum',
+    'BlogPost': 'blog',
+    'BlogCategory': 'blog',
+    'BlogComment': 'blog',
+    'BlogLike': 'blog',
+    'ConsultantProfile': 'consultancy',
+    'ConsultationSlot': 'consultancy',
+}
+
+
+class MemoryBackend:
+    """Process-local LRU store."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        return {tag: self._tags.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        version = time.time_ns()
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileSystemBackend:
+    """Pickled entries under a directory; tag versions are small files next to them."""
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.tag_dir = os.path.join(directory, 'tags')
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(self.tag_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.page')
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                expires, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        self._write(self._path(key), pickle.dumps((time.time() + ttl, value), pickle.HIGHEST_PROTOCOL))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith('.page')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def tag_versions(self, tags):
+        versions = {}
+        for tag in tags:
+            try:
+                with open(os.path.join(self.tag_dir, tag), 'rb') as fh:
+                    versions[tag] = int(fh.read() or 0)
+            except (OSError, ValueError):
+                versions[tag] = 0
+        return versions
+
+    def bump(self, tags):
+        version = str(time.time_ns()).encode()
+        for tag in tags:
+            self._write(os.path.join(self.tag_dir, tag), version)
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page'):
+                os.unlink(entry.path)
+
+    def __len__(self):
+        return sum(1 for e in os.scandir(self.directory) if e.name.endswith('.page'))
+
+
+class PageCache:
+    """Per-app cache facade: keys, eligibility, tags and metrics."""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.metrics = Counter()
+
+    def key(self):
+        params = sorted(
+            (k, v) for k, v in request.args.items(multi=True)
+            if v != '' and k not in IGNORED_PARAMS and not k.startswith('utm_')
+        )
+        locale = (request.accept_languages.best or '')[:2].lower()
+        raw = f'{request.path}?{urlencode(params)}|{locale}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def eligible():
+        """Only anonymous plain GETs with nothing pending in the session."""
+        return (
+            request.method == 'GET'
+            and '_flashes' not in session
+            and not current_user.is_authenticated
+        )
+
+    def lookup(self, key, tags):
+        entry = self.backend.get(key)
+        if entry is None or entry['tags'] != self.backend.tag_versions(tags):
+            return None
+        return entry
+
+    def store(self, key, response, versions, ttl=None):
+        self.backend.set(key, {
+            'status': response.status_code,
+            'headers': [(k, v) for k, v in response.headers.items() if k.lower() not in ('set-cookie', 'content-length')],
+            'body': response.get_data(),
+            'tags': versions,
+        }, ttl or self.ttl)
+        self.metrics['stores'] += 1
+
+    def invalidate(self, tags):
+        self.backend.bump(tags)
+        self.metrics['invalidations'] += len(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.metrics['hits'] + self.metrics['misses']
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.metrics['hits'],
+            'misses': self.metrics['misses'],
+            'bypasses': self.metrics['bypasses'],
+            'stores': self.metrics['stores'],
+            'invalidations': self.metrics['invalidations'],
+            'hit_ratio': round(self.metrics['hits'] / lookups, 3) if lookups else 0.0,
+        }
+
+
+def _cacheable(response):
+    # A view that touched the session (flash, CSRF token, cart) rendered visitor-specific output
+    csrf_field = current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and response.mimetype == 'text/html'
+        and not session.modified
+        and csrf_field not in g
+    )
+
+
+def cached_page(tags, ttl=None):
+    """Serve an anonymous-only cached copy of the view, invalidated by ``tags``."""
+    tags = tuple(tags)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_page_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+            if not cache.eligible():
+                cache.metrics['bypasses'] += 1
+                return view(*args, **kwargs)
+            key = cache.key()
+            entry = cache.lookup(key, tags)
+            if entry is not None:
+                cache.metrics['hits'] += 1
+                response = current_app.response_class(entry['body'], status=entry['status'], headers=entry['headers'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            cache.metrics['misses'] += 1
+            # Versions are read before rendering so a change committed meanwhile invalidates this copy
+            versions = cache.backend.tag_versions(tags)
+            response = current_app.make_response(view(*args, **kwargs))
+            if _cacheable(response):
+                cache.store(key, response, versions, ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def init_page_cache(app):
+    """Attach the configured cache (or None when disabled) to ``app``."""
+    if not app.config.get('PAGE_CACHE_ENABLED'):
+        app.extensions['page_cache'] = None
+        return None
+    max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    if app.config.get('PAGE_CACHE_BACKEND', 'memory') == 'filesystem':
+        directory = app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache')
+        backend = FileSystemBackend(directory, max_entries)
+    else:
+        backend = MemoryBackend(max_entries)
+    cache = app.extensions['page_cache'] = PageCache(backend, app.config.get('PAGE_CACHE_TTL', DEFAULT_TTL))
+    return cache
+
+
+def get_page_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('page_cache')
+
+
+# --- Invalidation from committed model changes ---
+
+_PENDING = 'page_cache_tags'
+
+
+def _note(session, class_name):
+    tag = MODEL_TAGS.get(class_name)
+    if tag:
+        session.info.setdefault(_PENDING, set()).add(tag)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_flushed(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _note(session, type(obj).__name__)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None \
+            and not state.execution_options.get('counter_only'):
+        _note(state.session, state.bind_mapper.class_.__name__)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop(_PENDING, None)
+    cache = get_page_cache()
+    if tags and cache is not None:
+        cache.invalidate(tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,107 @@
+"""
+Keyword-based product image resolution.
+
+Shared by the product forms, ``flask seed-data`` and bulk imports/backfills.
+The keyword map lives in ``agrifarma/data/product_images.json`` (override with
+the ``PRODUCT_IMAGE_MAP_FILE`` config key) and is compiled once into a single
+alternation regex, so resolving an image is one scan of the product name.
+"""
+import json
+import os
+import re
+from flask import current_app, has_app_context
+
+DEFAULT_MAP_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'product_images.json')
+
+
+class ImageMatcher:
+    """Precompiled keyword -> image URL matcher.
+
+    When several keywords occur in a name the longest wins (ties go to the
+    keyword listed first), matching the original sorted substring scan.
+    """
+
+    def __init__(self, keywords, category_defaults=None, fallback=None):
+        self.keywords = {kw.lower(): url for kw, url in keywords.items()}
+        self.category_defaults = {
+            cat.lower(): self.keywords.get(kw.lower(), kw)
+            for cat, kw in (category_defaults or {}).items()
+        }
+        self.fallback = fallback
+        order = {kw: i for i, kw in enumerate(self.keywords)}
+        # Priority: longer keywords first, then declaration order
+        self._priority = {kw: (-len(kw), order[kw]) for kw in self.keywords}
+        ranked = sorted(self.keywords, key=self._priority.get)
+        # Zero-width lookahead so overlapping keywords are all seen in one pass
+        self._pattern = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in ranked) + '))') if ranked else None
+
+    @classmethod
+    def from_file(cls, path):
+        """Build a matcher from a JSON mapping file."""
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        return cls(data.get('keywords', {}), data.get('category_defaults'), data.get('fallback'))
+
+    def match_keyword(self, text):
+        """Return the image for the best keyword found in ``text``, or None."""
+        if not text or self._pattern is None:
+            return None
+        best = None
+        for m in self._pattern.finditer(text.lower()):
+            kw = m.group(1)
+            if best is None or self._priority[kw] < self._priority[best]:
+                best = kw
+        return self.keywords[best] if best else None
+
+    def resolve(self, name, category=None, provided=None, default=None):
+        """Pick an image: provided URL -> keyword in name -> category default -> fallback.
+
+        ``default`` overrides the configured fallback (pass ``False`` to get
+        None back when nothing matched, e.g. to apply a custom pool).
+        """
+        if provided:
+            return provided
+        url = self.match_keyword(name) or self.category_defaults.get((category or '').lower())
+        if url:
+            return url
+        if default is False:
+            return None
+        return default or self.fallback
+
+    def resolve_many(self, rows, default=None):
+        """Resolve images for many ``(name, category, provided)`` rows in one pass.
+
+        Rows may also be mappings with ``name``, ``category`` and ``image_url`` keys.
+        """
+        resolve = self.resolve
+        results = []
+        for row in rows:
+            if isinstance(row, dict):
+                results.append(resolve(row.get('name'), row.get('category'), row.get('image_url'), default))
+            else:
+                name, category, provided = (tuple(row) + (None, None))[:3]
+                results.append(resolve(name, category, provided, default))
+        return results
+
+
+_matchers = {}
+
+
+def get_matcher(path=None):
+    """Return the (cached) matcher for ``path`` or the configured/default map file."""
+    if path is None and has_app_context():
+        path = current_app.config.get('PRODUCT_IMAGE_MAP_FILE')
+    path = os.path.abspath(path or DEFAULT_MAP_FILE)
+    matcher = _matchers.get(path)
+    if matcher is None:
+        matcher = _matchers[path] = ImageMatcher.from_file(path)
+    return matcher
+
+
+def resolve_product_image(name, category=None, provided=None):
+    """Convenience wrapper around ``get_matcher().resolve``."""
+    return get_matcher().resolve(name, category, provided)
+
+
+# Build the default matcher at import so the first request doesn't pay for it
+get_matcher(DEFAULT_MAP_FILE)
@@ -0,0 +1,192 @@
+"""
+Token-bucket rate limiting for write endpoints.
+
+``@rate_limit(limit, per)`` gives every key a bucket of ``burst`` (default
+``limit``) tokens that refills at ``limit / per`` tokens a second. Each
+request spends one token. An empty bucket answers ``429 Too Many Requests``
+with ``Retry-After`` set to the time until the next token. Keys are
+``by='user'`` (the logged-in user, falling back to the client IP) or
+``by='ip'``. Stack the decorator to apply both, with the ``by='ip'`` one on
+top: the outer bucket is checked first, and a request it rejects does not
+spend a token from the user's bucket. Only the listed ``methods`` (POST by
+default) spend tokens, so a form still renders.
+
+Client IPs come from ``request.remote_addr``. Behind a reverse proxy set
+``TRUSTED_PROXIES`` to the number of hops, so ``create_app`` applies
+werkzeug's ``ProxyFix`` and the address is the client's, not the router's.
+
+A bucket is two numbers, its tokens and when it was last updated. A bucket
+that has refilled completely is the same as no bucket, so it expires then.
+Memory per active key stays O(1), and idle keys disappear.
+
+Storage (``RATE_LIMIT_STORAGE``):
+
+* ``memory``: per process, LRU-ordered, capped at ``RATE_LIMIT_MAX_KEYS``.
+* ``sqlite``: one small SQLite file (``RATE_LIMIT_STORAGE_PATH``, default
+  ``instance/rate_limit.sqlite3``) shared by every worker on the host. It is
+  separate from the application database, so throttling never takes the
+  writer lock it protects.
+
+If the store fails, requests are let through and the failure is logged.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_app_context, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_KEYS = 100000
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + max(now - updated, 0) * rate)
+
+
+class MemoryStorage:
+    """Buckets in this process, least recently used first."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, updated, expires)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now=None):
+        """Spend one token; returns ``(allowed, retry_after_seconds)``."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated, _ = self.buckets.pop(key, (capacity, now, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._expire(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _expire(self, now):
+        # Refilled buckets go first; then the least recently used beyond the cap
+        while self.buckets:
+            key, (_, _, expires) = next(iter(self.buckets.items()))
+            if expires > now and len(self.buckets) <= self.max_keys:
+                break
+            del self.buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self.buckets.clear()
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SQLiteStorage:
+    """Buckets in a SQLite file shared by the workers on one host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_expires ON buckets (expires)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # losing a bucket on power loss is harmless
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT INTO buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, '
+                         'expires = excluded.expires',
+                         (key, tokens, now, now + (capacity - tokens) / rate))
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute('DELETE FROM buckets WHERE expires < ?', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        self._connect().execute('DELETE FROM buckets')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM buckets').fetchone()[0]
+
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def _key(by):
+    if by == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{client_ip()}'
+
+
+def rate_limit(limit, per, burst=None, by='user', methods=('POST',), scope=None):
+    """Allow ``limit`` requests per ``per`` seconds (bursts up to ``burst``) per key."""
+    capacity = burst or limit
+    rate = limit / per
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            storage = get_storage()
+            if storage is not None and request.method in methods:
+                key = f'{scope or request.endpoint}|{_key(by)}'
+                try:
+                    allowed, retry_after = storage.take(key, capacity, rate)
+                except Exception:
+                    logger.exception('Rate limit store failed; letting %s through', key)
+                    allowed = True
+                if not allowed:
+                    raise TooManyRequests(retry_after=max(1, math.ceil(retry_after)))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_rate_limit(app):
+    """Attach the configured bucket store (or None when disabled) to ``app``."""
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        app.extensions['rate_limit'] = None
+        return None
+    if app.config.get('RATE_LIMIT_STORAGE', 'memory') == 'sqlite':
+        path = app.config.get('RATE_LIMIT_STORAGE_PATH') or os.path.join(app.instance_path, 'rate_limit.sqlite3')
+        storage = SQLiteStorage(path)
+    else:
+        storage = MemoryStorage(app.config.get('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS))
+    app.extensions['rate_limit'] = storage
+    return storage
+
+
+def get_storage():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('rate_limit')
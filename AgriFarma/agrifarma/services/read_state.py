@@ -0,0 +1,260 @@
+"""
+Per-user unread state for forum threads.
+
+Opening a thread records the newest reply id the user saw (a high-water mark
+per user and thread, ``forum_read_marks``). Marks are buffered in the worker
+and written in one upsert per batch, every ``FORUM_READ_MARK_FLUSH_SECONDS``
+or once ``FORUM_READ_MARK_BATCH`` marks are pending, and at exit. A mark only
+ever moves forward.
+
+Listings ask ``unread_thread_ids`` for the threads on the page. That is one
+query joining each thread's newest reply id with the user's mark and the
+category watermark; this worker's pending marks are folded in so a user's
+own reads show up before they are flushed. A thread is read when the mark
+has reached its newest reply, when it had no activity since the user's
+"mark all read" in that category, or when its last activity predates the
+user's account.
+
+Storage stays bounded: ``compact`` (``flask compact-read-marks``) turns
+marks older than ``FORUM_READ_MARK_RETENTION_DAYS`` into a category
+watermark at the cutoff and deletes them. Unread state older than the
+retention window is treated as read.
+"""
+import atexit
+import logging
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, case, delete, func, inspect, select
+from agrifarma.extensions import db
+from agrifarma.models.forum import Thread, Reply, ThreadReadMark, CategoryReadMark
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SECONDS = 10
+DEFAULT_BATCH = 500
+DEFAULT_RETENTION_DAYS = 30
+
+# Buffers still holding marks at interpreter exit; one atexit hook serves them all
+_live_buffers = weakref.WeakSet()
+_exit_hook = []
+
+
+def _dialect_insert(table, dialect):
+    """Return a dialect-specific INSERT supporting ``on_conflict_do_update``."""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _upsert_marks(conn, marks, now):
+    """Write ``{(user_id, thread_id): last_reply_id}``, never moving a mark back."""
+    table = ThreadReadMark.__table__
+    rows = [
+        {'user_id': user_id, 'thread_id': thread_id, 'last_reply_id': reply_id, 'created_at': now, 'updated_at': now}
+        for (user_id, thread_id), reply_id in marks.items()
+    ]
+    stmt = _dialect_insert(table, conn.dialect.name)
+    if stmt is None:
+        _upsert_marks_fallback(conn, rows, now)
+        return
+    stmt = stmt.values(rows)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'thread_id'],
+        set_={
+            'last_reply_id': case((stmt.excluded.last_reply_id > table.c.last_reply_id, stmt.excluded.last_reply_id),
+                                  else_=table.c.last_reply_id),
+            'updated_at': now,
+        },
+    ))
+
+
+def _upsert_marks_fallback(conn, rows, now):
+    """Portable upsert for dialects without ON CONFLICT (update, then insert the misses)."""
+    table = ThreadReadMark.__table__
+    for row in rows:
+        updated = conn.execute(
+            table.update()
+            .where(table.c.user_id == row['user_id'], table.c.thread_id == row['thread_id'])
+            .values(last_reply_id=case((table.c.last_reply_id < row['last_reply_id'], row['last_reply_id']),
+                                       else_=table.c.last_reply_id),
+                    updated_at=now)
+        ).rowcount
+        if not updated:
+            conn.execute(table.insert().values(**row))
+
+
+class ReadMarkBuffer:
+    """Read marks recorded by this worker and not yet written."""
+
+    def __init__(self, app):
+        self.app = app
+        self.flush_seconds = app.config.get('FORUM_READ_MARK_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+        self.batch = app.config.get('FORUM_READ_MARK_BATCH', DEFAULT_BATCH)
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, user_id, thread_id, last_reply_id):
+        key = (user_id, thread_id)
+        with self._lock:
+            if not self.pending:
+                _watch_at_exit(self)
+            if last_reply_id > self.pending.get(key, -1):
+                self.pending[key] = last_reply_id
+
+    def pending_for(self, user_id, thread_ids):
+        with self._lock:
+            return {tid: self.pending[(user_id, tid)] for tid in thread_ids if (user_id, tid) in self.pending}
+
+    def due(self):
+        return len(self.pending) >= self.batch or time.monotonic() - self.flushed_at >= self.flush_seconds
+
+    def flush(self):
+        """Write every pending mark in one statement; returns how many were written."""
+        with self._lock:
+            marks, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not marks:
+            return 0
+        try:
+            with db.engine.begin() as conn:
+                _upsert_marks(conn, marks, datetime.utcnow())
+        except Exception:
+            # Keep them for the next attempt; a newer mark recorded meanwhile wins
+            with self._lock:
+                for key, reply_id in marks.items():
+                    if reply_id > self.pending.get(key, -1):
+                        self.pending[key] = reply_id
+            raise
+        return len(marks)
+
+    def flush_at_exit(self):
+        if not self.pending:
+            return
+        try:
+            with self.app.app_context():
+                # The database may be gone already (tests drop it); nothing to save into
+                if not inspect(db.engine).has_table(ThreadReadMark.__tablename__):
+                    return
+                self.flush()
+        except Exception as exc:
+            logger.warning('Dropped %d forum read marks at exit: %s', len(self.pending), exc)
+
+
+def _watch_at_exit(buffer):
+    _live_buffers.add(buffer)
+    if not _exit_hook:
+        _exit_hook.append(atexit.register(_flush_all_at_exit))
+
+
+def _flush_all_at_exit():
+    for buffer in list(_live_buffers):
+        buffer.flush_at_exit()
+
+
+def get_buffer():
+    return current_app.extensions['read_state']
+
+
+def record_read(user_id, thread_id, replies):
+    """Remember that a user has seen ``replies`` (the page just rendered) of a thread."""
+    get_buffer().record(user_id, thread_id, max((reply.id for reply in replies), default=0))
+
+
+def unread_thread_ids(user, threads):
+    """Ids of ``threads`` with replies or activity ``user`` hasn't seen, in one query."""
+    if not threads or not user.is_authenticated:
+        return set()
+    ids = [thread.id for thread in threads]
+    latest_reply = (
+        select(func.max(Reply.id))
+        .where(Reply.thread_id == Thread.id, Reply.is_deleted.is_not(True))
+        .correlate(Thread)
+        .scalar_subquery()
+    )
+    rows = db.session.execute(
+        select(Thread.id, Thread.last_activity, latest_reply, ThreadReadMark.last_reply_id, CategoryReadMark.read_at)
+        .outerjoin(ThreadReadMark, and_(ThreadReadMark.thread_id == Thread.id, ThreadReadMark.user_id == user.id))
+        .outerjoin(CategoryReadMark, and_(CategoryReadMark.category_id == Thread.category_id,
+                                          CategoryReadMark.user_id == user.id))
+        .where(Thread.id.in_(ids))
+    ).all()
+    pending = get_buffer().pending_for(user.id, ids)
+    joined = user.created_at
+    unread = set()
+    for thread_id, last_activity, newest, mark, watermark in rows:
+        seen = max(mark if mark is not None else -1, pending.get(thread_id, -1))
+        if seen >= (newest or 0):
+            continue
+        if watermark is not None and last_activity <= watermark:
+            continue
+        if joined is not None and last_activity <= joined:
+            continue
+        unread.add(thread_id)
+    return unread
+
+
+def _upsert_watermarks(pairs, read_at):
+    """Set the watermark for each ``(user_id, category_id)``, never moving one back (uncommitted)."""
+    existing = {}
+    if pairs:
+        users = {user_id for user_id, _ in pairs}
+        for mark in CategoryReadMark.query.filter(CategoryReadMark.user_id.in_(users)).all():
+            existing[(mark.user_id, mark.category_id)] = mark
+    for user_id, category_id in pairs:
+        mark = existing.get((user_id, category_id))
+        if mark is None:
+            db.session.add(CategoryReadMark(user_id=user_id, category_id=category_id, read_at=read_at))
+        elif mark.read_at < read_at:
+            mark.read_at = read_at
+
+
+def mark_category_read(user_id, category_id):
+    """Mark every thread in a category read for a user and drop their now-redundant marks (uncommitted)."""
+    _upsert_watermarks([(user_id, category_id)], datetime.utcnow())
+    db.session.execute(
+        delete(ThreadReadMark)
+        .where(ThreadReadMark.user_id == user_id,
+               ThreadReadMark.thread_id.in_(select(Thread.id).where(Thread.category_id == category_id)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def compact(retention_days=DEFAULT_RETENTION_DAYS):
+    """Collapse marks older than ``retention_days`` into category watermarks (uncommitted).
+
+    Returns the number of marks removed.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pairs = db.session.execute(
+        select(ThreadReadMark.user_id, Thread.category_id)
+        .join(Thread, Thread.id == ThreadReadMark.thread_id)
+        .where(ThreadReadMark.updated_at < cutoff)
+        .distinct()
+    ).all()
+    _upsert_watermarks([tuple(pair) for pair in pairs], cutoff)
+    return db.session.execute(
+        delete(ThreadReadMark).where(ThreadReadMark.updated_at < cutoff).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _flush_if_due(response):
+    buffer = get_buffer()
+    if buffer.pending and buffer.due():
+        try:
+            buffer.flush()
+        except Exception:
+            logger.exception('Could not write forum read marks')
+    return response
+
+
+def init_read_state(app):
+    app.extensions['read_state'] = ReadMarkBuffer(app)
+    app.after_request(_flush_if_due)
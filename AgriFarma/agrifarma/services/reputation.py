@@ -0,0 +1,206 @@
+"""
+Forum reputation.
+
+Points are awarded when something happens, not computed on read:
+
+* ``reply_posted``: the reply's author, for every reply that isn't deleted;
+* ``reply_accepted``: the author of the reply marked as a thread's solution,
+  unless they also started the thread;
+* ``thread_solved``: the thread's author, once the thread has a solution;
+* ``blog_like_received``: a blog post's author, per like from someone else.
+
+``award`` adds the points with one ``UPDATE users SET reputation_score =
+reputation_score + n`` in the caller's transaction, so the score commits or
+rolls back with the action that earned it and concurrent awards never lose
+an update. ``recompute_all`` (``flask recompute-reputation``) rebuilds every
+score from the same rules with one GROUP BY query per event type, for
+backfills and after rule changes.
+
+The leaderboard is cached per process for ``REPUTATION_LEADERBOARD_TTL``
+seconds and dropped as soon as this process commits an award.
+"""
+import threading
+import time
+from collections import Counter
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session, aliased
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.forum import Thread, Reply, ArchivedThread, ArchivedReply
+from agrifarma.models.blog import BlogPost, BlogLike
+
+POINTS = {
+    'reply_posted': 2,
+    'reply_accepted': 15,
+    'thread_solved': 5,
+    'blog_like_received': 5,
+}
+DEFAULT_LEADERBOARD_TTL = 300
+LEADERBOARD_MAX = 100
+
+_AWARDED = 'reputation_awarded'
+
+
+def award(user_id, event_name, sign=1):
+    """Add (``sign=-1``: take back) the points for ``event_name`` to a user, uncommitted."""
+    points = POINTS[event_name] * sign
+    if not user_id or not points:
+        return
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(reputation_score=func.coalesce(User.reputation_score, 0) + points)
+        .execution_options(synchronize_session=False, counter_only=True)
+    )
+    db.session.info[_AWARDED] = True
+
+
+# --- Event helpers used by the forum and blog views ---
+
+def reply_posted(reply):
+    award(reply.author_id, 'reply_posted')
+
+
+def reply_deleted(reply):
+    """Take back what a reply earned before it is soft-deleted."""
+    award(reply.author_id, 'reply_posted', -1)
+    if reply.is_solution and reply.author_id != reply.thread.author_id:
+        award(reply.author_id, 'reply_accepted', -1)
+
+
+def solution_marked(reply):
+    """Move the accepted-answer points to ``reply``; call before ``mark_as_solution``."""
+    thread = reply.thread
+    if reply.is_solution:
+        return
+    for previous in thread.replies:
+        if previous.is_solution and not previous.is_deleted and previous.author_id != thread.author_id:
+            award(previous.author_id, 'reply_accepted', -1)
+    if reply.author_id != thread.author_id:
+        award(reply.author_id, 'reply_accepted')
+    if not thread.is_solved:
+        award(thread.author_id, 'thread_solved')
+
+
+def blog_liked(post, liker_id, sign=1):
+    """Like (``sign=-1``: unlike) of ``post`` by ``liker_id``; self-likes earn nothing."""
+    if post.author_id != liker_id:
+        award(post.author_id, 'blog_like_received', sign)
+
+
+# --- Batch rebuild ---
+
+def _tallies():
+    """``{user_id: {event: count}}`` from one GROUP BY per event type and table.
+
+    Archived threads and replies keep earning their points, so a recompute
+    after ``flask archive-forum`` changes nothing.
+    """
+    queries = []
+    for thread_model, reply_model in ((Thread, Reply), (ArchivedThread, ArchivedReply)):
+        thread = aliased(thread_model)
+        queries += [
+            ('reply_posted', select(reply_model.author_id, func.count())
+             .where(reply_model.is_deleted.is_not(True))
+             .group_by(reply_model.author_id)),
+            ('reply_accepted', select(reply_model.author_id, func.count())
+             .join(thread, thread.id == reply_model.thread_id)
+             .where(reply_model.is_solution.is_(True), reply_model.is_deleted.is_not(True),
+                    reply_model.author_id != thread.author_id)
+             .group_by(reply_model.author_id)),
+            ('thread_solved', select(thread_model.author_id, func.count())
+             .where(thread_model.is_solved.is_(True))
+             .group_by(thread_model.author_id)),
+        ]
+    queries.append(('blog_like_received', select(BlogPost.author_id, func.count())
+                    .join(BlogLike, BlogLike.post_id == BlogPost.id)
+                    .where(BlogLike.user_id != BlogPost.author_id)
+                    .group_by(BlogPost.author_id)))
+    tallies = {}
+    for event_name, stmt in queries:
+        for user_id, count in db.session.execute(stmt):
+            tallies.setdefault(user_id, Counter())[event_name] += count
+    return tallies
+
+
+def score(counts):
+    return sum(POINTS[event_name] * count for event_name, count in counts.items())
+
+
+def recompute_all():
+    """Rebuild every user's score from the forum and blog tables (uncommitted).
+
+    Returns the number of users whose score changed.
+    """
+    tallies = _tallies()
+    scores = {user_id: score(counts) for user_id, counts in tallies.items()}
+    current = dict(db.session.execute(select(User.id, func.coalesce(User.reputation_score, 0))).all())
+    changes = [
+        {'id': user_id, 'reputation_score': scores.get(user_id, 0)}
+        for user_id, value in current.items()
+        if scores.get(user_id, 0) != value
+    ]
+    if changes:
+        db.session.execute(update(User), changes)  # bulk UPDATE ... WHERE id = ? (executemany)
+        db.session.info[_AWARDED] = True
+    return len(changes)
+
+
+# --- Cached leaderboard ---
+
+class Leaderboard:
+    """Top users by reputation, cached for ``ttl`` seconds."""
+
+    def __init__(self, ttl=DEFAULT_LEADERBOARD_TTL):
+        self.ttl = ttl
+        self._rows = None
+        self._loaded = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        stmt = (
+            select(User.id, User.username, User.name, User.reputation_score)
+            .where(User.is_active.is_(True), User.reputation_score > 0)
+            .order_by(User.reputation_score.desc(), User.id)
+            .limit(LEADERBOARD_MAX)
+        )
+        return [
+            {'rank': rank, 'user_id': row.id, 'username': row.username, 'name': row.name,
+             'reputation': row.reputation_score}
+            for rank, row in enumerate(db.session.execute(stmt), start=1)
+        ]
+
+    def top(self, limit=20):
+        limit = max(1, min(limit, LEADERBOARD_MAX))
+        rows = self._rows
+        if rows is None or time.monotonic() - self._loaded > self.ttl:
+            with self._lock:
+                if self._rows is None or time.monotonic() - self._loaded > self.ttl:
+                    self._rows, self._loaded = self._load(), time.monotonic()
+                rows = self._rows
+        return rows[:limit]
+
+    def invalidate(self):
+        self._rows = None
+
+
+def init_reputation(app):
+    app.extensions['reputation'] = Leaderboard(app.config.get('REPUTATION_LEADERBOARD_TTL', DEFAULT_LEADERBOARD_TTL))
+
+
+def get_leaderboard():
+    return current_app.extensions['reputation']
+
+
+@event.listens_for(Session, 'after_commit')
+def _awards_committed(session):
+    if session.info.pop(_AWARDED, False) and has_app_context():
+        leaderboard = current_app.extensions.get('reputation')
+        if leaderboard is not None:
+            leaderboard.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _awards_rolled_back(session):
+    session.info.pop(_AWARDED, None)
@@ -0,0 +1,285 @@
+"""
+Near-duplicate forum thread detection ("similar questions").
+
+Each thread is reduced to a set of shingles: the words of its title, title
+word pairs, and the first ``CONTENT_WORDS`` words of its body, minus
+stopwords. Title words are added twice (once tagged), so the title weighs
+more than the body. A MinHash signature of ``NUM_PERM`` values estimates
+the Jaccard similarity of two sets. Locality-sensitive hashing splits the
+signature into ``BANDS`` bands of ``ROWS`` values. Threads that share any band bucket are
+candidates. With 32 bands of 2 rows, pairs at about 0.2 similarity or more
+are found with high probability.
+
+A lookup hashes the text being composed, collects candidates from the
+buckets and ranks them by estimated similarity, with solved threads boosted.
+It never scans ``forum_threads``. One primary-key query fetches the current
+title and status of a few more threads than asked for. Threads deleted since
+are dropped from the answer and from the index.
+
+The index lives in memory per worker. It is built in one streamed batch by a
+background thread, started on first use and again every
+``SIMILAR_THREADS_REFRESH_SECONDS`` (which bounds how long threads posted
+through other workers stay invisible), and swapped in when complete. Lookups
+never wait for a build: until the first one finishes they find nothing.
+``add_thread`` updates the index from ``new_thread``; threads added while a
+build runs are replayed into the new index. ``SIMILAR_THREADS_BACKGROUND_BUILD``
+set to false builds on the request instead, as the tests do.
+"""
+import hashlib
+import logging
+import struct
+import threading
+import time
+from collections import defaultdict, namedtuple
+from flask import current_app
+from sqlalchemy import select
+from agrifarma.extensions import db
+from agrifarma.models.forum import Thread
+from agrifarma.services.autocomplete import normalize
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+CONTENT_WORDS = 60
+MIN_SIMILARITY = 0.15
+SOLVED_BOOST = 1.25
+OVERFETCH = 5  # extra candidates fetched so threads deleted since indexing don't shorten the list
+DEFAULT_REFRESH_SECONDS = 600
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations():
+    # Fixed seeds, so signatures are comparable across workers and restarts
+    params = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f'minhash-{i}'.encode(), digest_size=16).digest()
+        a, b = struct.unpack('<QQ', digest)
+        params.append((a % (_MERSENNE - 1) + 1, b % _MERSENNE))
+    return params
+
+
+PERMUTATIONS = _permutations()
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i in is it its me my of on or so that the
+this to was what when where which who why will with you your any should there their them we our
+hai hain ka ki ke ko se mein main kya kaise kyun aur ya bhi nahi
+""".split())
+
+Similar = namedtuple('Similar', 'id title slug is_solved similarity')
+
+
+def _words(text):
+    return [word for word in normalize(text).split() if word not in STOPWORDS and len(word) > 1]
+
+
+def shingles(title, content=''):
+    """Shingle set for a thread: tagged title words and pairs plus leading body words."""
+    title_words = _words(title)
+    result = {f't:{word}' for word in title_words}
+    result.update(f't:{a} {b}' for a, b in zip(title_words, title_words[1:]))
+    result.update(title_words)
+    result.update(_words(content)[:CONTENT_WORDS])
+    return result
+
+
+def _hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), 'little')
+
+
+def signature(shingle_set):
+    """MinHash signature (tuple of ``NUM_PERM`` ints) of a shingle set."""
+    if not shingle_set:
+        return None
+    hashes = [_hash(s) for s in shingle_set]
+    return tuple(
+        min(((a * h + b) % _MERSENNE) & _MAX_HASH for h in hashes)
+        for a, b in PERMUTATIONS
+    )
+
+
+def estimate(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(sig):
+    return [(band, hash(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class SimilarityIndex:
+    """MinHash signatures plus LSH band buckets for a set of threads."""
+
+    def __init__(self):
+        self.signatures = {}
+        self.solved = {}
+        self.buckets = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, thread_id, title, content='', is_solved=False):
+        sig = signature(shingles(title, content))
+        if sig is None:
+            return
+        with self._lock:
+            self._remove(thread_id)
+            self.signatures[thread_id] = sig
+            self.solved[thread_id] = bool(is_solved)
+            for key in _bands(sig):
+                self.buckets[key].add(thread_id)
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._remove(thread_id)
+
+    def _remove(self, thread_id):
+        sig = self.signatures.pop(thread_id, None)
+        self.solved.pop(thread_id, None)
+        if sig is not None:
+            for key in _bands(sig):
+                self.buckets[key].discard(thread_id)
+
+    def query(self, title, content='', limit=5, exclude=None):
+        """``[(thread_id, similarity), ...]`` best first, solved threads boosted."""
+        sig = signature(shingles(title, content))
+        if sig is None:
+            return []
+        # Snapshot under the lock (add/remove run on other request threads);
+        # score outside it
+        with self._lock:
+            candidates = set()
+            for key in _bands(sig):
+                candidates.update(self.buckets.get(key, ()))
+            candidates.discard(exclude)
+            found = [(thread_id, self.signatures[thread_id], self.solved.get(thread_id)) for thread_id in candidates]
+        scored = []
+        for thread_id, other, solved in found:
+            similarity = estimate(sig, other)
+            if similarity >= MIN_SIMILARITY:
+                rank = similarity * (SOLVED_BOOST if solved else 1)
+                scored.append((rank, thread_id, similarity))
+        scored.sort(reverse=True)
+        return [(thread_id, similarity) for _, thread_id, similarity in scored[:limit]]
+
+    def __len__(self):
+        return len(self.signatures)
+
+
+def build_index(batch_size=500):
+    """Index every non-deleted thread, streaming rows in batches."""
+    index = SimilarityIndex()
+    rows = db.session.execute(
+        select(Thread.id, Thread.title, Thread.content, Thread.is_solved)
+        .where(Thread.is_deleted.is_not(True))
+        .execution_options(yield_per=batch_size)
+    )
+    for thread_id, title, content, is_solved in rows:
+        index.add(thread_id, title, content, is_solved)
+    return index
+
+
+class IndexHolder:
+    """Per-app index, rebuilt after ``refresh_seconds`` and swapped in whole."""
+
+    def __init__(self, refresh_seconds=DEFAULT_REFRESH_SECONDS, background=True):
+        self.refresh_seconds = refresh_seconds
+        self.background = background
+        self.index = None
+        self.built_at = 0.0
+        self._building = False
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _due(self):
+        return self.index is None or (
+            self.refresh_seconds and time.monotonic() - self.built_at > self.refresh_seconds)
+
+    def _swap(self, index):
+        with self._lock:
+            # Threads posted while the build streamed rows may not be in it
+            for thread_id, title, content, is_solved in self._pending:
+                index.add(thread_id, title, content, is_solved)
+            self._pending = []
+            self.index, self.built_at = index, time.monotonic()
+
+    def _build(self, app):
+        try:
+            with app.app_context():
+                index = build_index()
+            self._swap(index)
+        except Exception:
+            logger.exception('Similar threads index build failed')
+        finally:
+            with self._lock:
+                self._building = False
+
+    def get(self):
+        """The current index, or an empty one until the first build is done."""
+        if self._due():
+            if not self.background:
+                with self._lock:
+                    if self._due():
+                        self.index, self.built_at = build_index(), time.monotonic()
+            else:
+                with self._lock:
+                    start = not self._building
+                    self._building = True
+                if start:
+                    threading.Thread(target=self._build, args=(current_app._get_current_object(),),
+                                     name='similar-threads-build', daemon=True).start()
+        return self.index if self.index is not None else SimilarityIndex()
+
+    def add(self, thread_id, title, content='', is_solved=False):
+        with self._lock:
+            if self._building:
+                self._pending.append((thread_id, title, content, is_solved))
+            index = self.index
+        if index is not None:
+            index.add(thread_id, title, content, is_solved)
+
+
+def init_similar_threads(app):
+    app.extensions['similar_threads'] = IndexHolder(
+        app.config.get('SIMILAR_THREADS_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS),
+        app.config.get('SIMILAR_THREADS_BACKGROUND_BUILD', True))
+
+
+def get_index():
+    return current_app.extensions['similar_threads'].get()
+
+
+def add_thread(thread):
+    """Index a newly posted thread in this worker (the others pick it up on refresh)."""
+    current_app.extensions['similar_threads'].add(thread.id, thread.title, thread.content, thread.is_solved)
+
+
+def mark_solved(thread_id):
+    """Let a newly solved thread rank higher in this worker's index."""
+    holder = current_app.extensions['similar_threads']
+    if holder.index is not None and thread_id in holder.index.solved:
+        holder.index.solved[thread_id] = True
+
+
+def similar_threads(title, content='', limit=5, exclude=None):
+    """Similar, still-visible threads for the given text, best first."""
+    index = get_index()
+    matches = index.query(title, content, limit + OVERFETCH, exclude)
+    if not matches:
+        return []
+    rows = {
+        row.id: row for row in db.session.execute(
+            select(Thread.id, Thread.title, Thread.slug, Thread.is_solved, Thread.is_deleted)
+            .where(Thread.id.in_([thread_id for thread_id, _ in matches]))
+        )
+    }
+    found = []
+    for thread_id, similarity in matches:
+        row = rows.get(thread_id)
+        if row is None or row.is_deleted:
+            index.remove(thread_id)
+        elif len(found) < limit:
+            found.append(Similar(thread_id, row.title, row.slug, bool(row.is_solved), similarity))
+    return found
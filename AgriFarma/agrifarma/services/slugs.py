@@ -0,0 +1,115 @@
+"""
+Unique slug allocation.
+
+``next_free_slug`` finds a free slug with one query: it reads every existing
+``base`` / ``base-N`` value (``slug = base OR slug LIKE 'base-%'``) and takes
+the highest N in Python. ``assign_unique_slug`` sets the slug and flushes
+inside a savepoint. If a concurrent request took the same slug first, the
+unique constraint rejects the flush and it allocates again, so there is no
+check-then-insert race. ``allocate_slugs`` is the bulk form for seeds and
+imports: one query per chunk of titles, with duplicates inside the batch
+numbered too.
+"""
+import re
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from agrifarma.extensions import db
+
+DEFAULT_ATTEMPTS = 5
+BULK_CHUNK = 200
+
+
+def slugify(text):
+    """Convert text to URL-friendly slug."""
+    text = text.lower().strip()
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[-\s]+', '-', text)
+    return text
+
+
+def _max_length(column):
+    return getattr(column.type, 'length', None)
+
+
+def _base(text, column, suffix_room=6):
+    """Slugify and leave room for a ``-NNNNN`` suffix within the column length."""
+    base = slugify(text or '').strip('-') or 'item'
+    limit = _max_length(column)
+    if limit:
+        base = base[:limit - suffix_room].rstrip('-') or 'item'
+    return base
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _taken(column, bases, exclude_id=None):
+    """Existing values of ``column`` equal to a base or shaped ``base-...``."""
+    conditions = [column.in_(bases)] + [column.like(f'{_like_escape(b)}-%', escape='\\') for b in bases]
+    stmt = select(column).where(or_(*conditions))
+    if exclude_id is not None:
+        stmt = stmt.where(column.class_.id != exclude_id)
+    return set(db.session.execute(stmt).scalars())
+
+
+def _next(base, taken):
+    if base not in taken:
+        return base
+    pattern = re.compile(re.escape(base) + r'-(\d+)$')
+    highest = max((int(m.group(1)) for m in map(pattern.match, taken) if m), default=0)
+    return f'{base}-{highest + 1}'
+
+
+def next_free_slug(column, text, exclude_id=None):
+    """First free ``base`` or ``base-N`` for ``column`` (e.g. ``Thread.slug``), in one query."""
+    base = _base(text, column)
+    return _next(base, _taken(column, [base], exclude_id))
+
+
+def _is_slug_conflict(exc, column):
+    message = str(exc.orig).lower()
+    return column.key in message and ('unique' in message or 'duplicate' in message)
+
+
+def assign_unique_slug(obj, text, attr='slug', attempts=DEFAULT_ATTEMPTS):
+    """Give ``obj`` a unique slug derived from ``text`` and flush it.
+
+    Keeps the current slug when it already matches ``text``. Retries when a
+    concurrent writer claims the chosen slug between the lookup and the flush.
+    """
+    column = getattr(type(obj), attr)
+    current = getattr(obj, attr)
+    base = _base(text, column)
+    if current and (current == base or re.fullmatch(re.escape(base) + r'-\d+', current)):
+        return current
+    for attempt in range(attempts):
+        slug = next_free_slug(column, text, exclude_id=obj.id)
+        setattr(obj, attr, slug)
+        try:
+            with db.session.begin_nested():
+                db.session.add(obj)
+                db.session.flush()
+            return slug
+        except IntegrityError as exc:
+            if not _is_slug_conflict(exc, column) or attempt == attempts - 1:
+                raise
+    return getattr(obj, attr)
+
+
+def allocate_slugs(column, texts, reserved=()):
+    """Unique slugs for many new rows at once (seed scripts, imports), in input order.
+
+    ``reserved`` holds slugs already claimed by rows not yet written.
+    """
+    bases = [_base(text, column) for text in texts]
+    taken = set(reserved)
+    unique_bases = list(dict.fromkeys(bases))
+    for i in range(0, len(unique_bases), BULK_CHUNK):
+        taken |= _taken(column, unique_bases[i:i + BULK_CHUNK])
+    slugs = []
+    for base in bases:
+        slug = _next(base, taken)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
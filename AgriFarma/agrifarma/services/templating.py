@@ -0,0 +1,180 @@
+"""
+Jinja bytecode cache, template warm-up and render timing.
+
+* ``TEMPLATE_BYTECODE_CACHE`` stores compiled templates under
+  ``TEMPLATE_CACHE_DIR`` (default ``instance/jinja_cache``). Every worker on the
+  host shares it, so a template is compiled once per deploy, not once per worker.
+* ``TEMPLATE_PRECOMPILE`` compiles every template at startup (also available as
+  ``flask templates warm``), so the first requests don't pay for compilation.
+* ``TEMPLATE_PROFILING`` times each ``render_template`` between the
+  ``before_render_template`` and ``template_rendered`` signals. The request's
+  timings go into one log line, and per-template totals are kept per process.
+  They are flushed every ``TEMPLATE_STATS_FLUSH_SECONDS`` to
+  ``<TEMPLATE_STATS_DIR>/<pid>.json``, which ``flask templates report`` merges.
+  It is off by default and on in ``DevelopmentConfig``.
+"""
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import before_render_template, current_app, g, request, template_rendered
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = ('.html', '.txt', '.xml')
+DEFAULT_FLUSH_SECONDS = 30
+
+
+class RenderStats:
+    """Per-template render counters for this process."""
+
+    def __init__(self):
+        self.templates = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            entry = self.templates.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self.templates.items()}
+
+    def reset(self):
+        with self._lock:
+            self.templates.clear()
+
+
+def merge_stats(snapshots):
+    """Combine several ``RenderStats.snapshot()`` dicts."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            into = merged.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            into['count'] += entry['count']
+            into['total'] += entry['total']
+            into['max'] = max(into['max'], entry['max'])
+    return merged
+
+
+def report_rows(stats, sort='total', limit=None):
+    """``(name, count, total_ms, avg_ms, max_ms)`` rows, heaviest first."""
+    rows = [
+        (name, e['count'], e['total'] * 1000, e['total'] * 1000 / e['count'] if e['count'] else 0.0, e['max'] * 1000)
+        for name, e in stats.items()
+    ]
+    column = {'count': 1, 'total': 2, 'avg': 3, 'max': 4}[sort]
+    rows.sort(key=lambda row: row[column], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+# --- Stats files shared between processes ---
+
+def stats_dir(app):
+    return app.config.get('TEMPLATE_STATS_DIR') or os.path.join(app.instance_path, 'template_stats')
+
+
+def flush_stats(app):
+    """Write this process's totals to its own file (replaced atomically)."""
+    directory = stats_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        json.dump(app.extensions['template_stats'].snapshot(), fh)
+    os.replace(tmp, os.path.join(directory, f'{os.getpid()}.json'))
+
+
+def load_stats(app):
+    """Merge the files written by every process (including dead ones since the last reset)."""
+    snapshots = []
+    for path in glob.glob(os.path.join(stats_dir(app), '*.json')):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return merge_stats(snapshots)
+
+
+def reset_stats(app):
+    for path in glob.glob(os.path.join(stats_dir(app), '*.json')):
+        os.unlink(path)
+    app.extensions['template_stats'].reset()
+
+
+# --- Warm-up ---
+
+def warm_templates(app):
+    """Compile every template (filling the bytecode cache). Returns ``(count, errors)``."""
+    env = app.jinja_env
+    count, errors = 0, []
+    for name in env.list_templates(filter_func=lambda n: n.endswith(TEMPLATE_SUFFIXES)):
+        try:
+            env.get_template(name)
+            count += 1
+        except TemplateError as exc:
+            errors.append((name, f'{type(exc).__name__}: {exc}'))
+    return count, errors
+
+
+# --- Render timing ---
+
+def _before_render(app, template, context, **extra):
+    g.setdefault('_template_starts', []).append(time.perf_counter())
+
+
+def _rendered(app, template, context, **extra):
+    starts = g.get('_template_starts')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    name = template.name or '<string>'
+    app.extensions['template_stats'].record(name, elapsed)
+    g.setdefault('template_timings', []).append((name, elapsed))
+
+
+def _log_request(response):
+    timings = g.get('template_timings')
+    if timings:
+        total = sum(seconds for _, seconds in timings)
+        logger.info(
+            '%s %s %s templates %.1fms: %s', request.method, request.path, response.status_code, total * 1000,
+            ', '.join(f'{name} {seconds * 1000:.1f}ms' for name, seconds in timings),
+        )
+    app = current_app._get_current_object()
+    state = app.extensions['template_flush']
+    if time.monotonic() - state['at'] >= app.config.get('TEMPLATE_STATS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+        state['at'] = time.monotonic()
+        try:
+            flush_stats(app)
+        except OSError as exc:
+            logger.warning('Could not write template stats: %s', exc)
+    return response
+
+
+def init_templating(app):
+    """Attach the bytecode cache, warm templates and hook up render timing as configured."""
+    if app.config.get('TEMPLATE_BYTECODE_CACHE'):
+        directory = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    app.extensions['template_stats'] = RenderStats()
+    if app.config.get('TEMPLATE_PROFILING'):
+        app.extensions['template_flush'] = {'at': time.monotonic()}
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_rendered, app)
+        app.after_request(_log_request)
+
+    if app.config.get('TEMPLATE_PRECOMPILE'):
+        count, errors = warm_templates(app)
+        for name, error in errors:
+            logger.warning('Template %s failed to compile: %s', name, error)
+        logger.info('Precompiled %s template(s)', count)
@@ -0,0 +1,76 @@
+"""
+Conditional GET (ETag / Last-Modified) for detail pages.
+
+A page's validators are derived from the entity's ``updated_at``, counters of
+the child rows it renders (reviews, replies, comments) and the viewer: user,
+role and the session's CSRF secret, because rendered forms embed a token. When
+the browser's ``If-None-Match`` / ``If-Modified-Since`` still match, a bare 304
+is returned and the template is never rendered. View counting stays with the
+caller, which increments before asking, so it happens either way.
+"""
+import hashlib
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from agrifarma.extensions import db
+
+
+def viewer_key():
+    """Identify what varies per viewer in a rendered page."""
+    if current_user.is_authenticated:
+        role = current_user.role.name if current_user.role else ''
+        viewer = f'u{current_user.id}:{role}'
+    else:
+        viewer = 'anon'
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        generate_csrf()  # make sure the session secret exists before hashing it
+        viewer += ':' + str(session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'), ''))
+    return viewer
+
+
+def compute_etag(last_modified, *parts):
+    """Opaque digest of the page's inputs (the raw values never leave the server)."""
+    raw = '|'.join(str(p) for p in (last_modified.isoformat() if last_modified else '', viewer_key()) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def rows_signature(model, *criteria):
+    """``(count, newest updated_at)`` of the rows matching ``criteria``, in one query."""
+    return tuple(db.session.query(db.func.count(model.id), db.func.max(model.updated_at)).filter(*criteria).one())
+
+
+def newest(*timestamps):
+    """Latest of the given timestamps, ignoring None."""
+    present = [t for t in timestamps if t is not None]
+    return max(present) if present else None
+
+
+def _is_fresh(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2); weak comparison
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+    return False
+
+
+def conditional_page(render, last_modified, *parts):
+    """Render ``render()`` unless the client's cached copy is still valid.
+
+    ``last_modified`` is the newest naive-UTC timestamp among the page's data,
+    ``parts`` any further values that change the output (child counts, ids).
+    Pages with pending flash messages are always rendered.
+    """
+    etag = compute_etag(last_modified, *parts)
+    if '_flashes' not in session and _is_fresh(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Per-viewer content: browsers may keep it but must revalidate, shared caches must not
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
@@ -0,0 +1,84 @@
+"""
+Startup-time benchmark.
+
+Runs ``from agrifarma import create_app; create_app(config)`` in a fresh
+interpreter under ``python -X importtime``. It reports the import and
+``create_app`` wall times, the heaviest top-level imports, and whether any
+module in ``LAZY_MODULES`` was loaded. Those modules are only imported where
+they are used (pandas for CSV export, alembic for ``flask db``), so a worker
+that never touches them never pays for them.
+
+``flask startup-benchmark`` prints the report; ``tests/test_startup.py``
+enforces ``STARTUP_BUDGET_MS``.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+LAZY_MODULES = ('pandas', 'numpy', 'alembic', 'flask_migrate')
+DEFAULT_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS') or 2500)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ImportRecord = namedtuple('ImportRecord', 'module self_us cumulative_us depth')
+StartupReport = namedtuple('StartupReport', 'import_ms create_app_ms total_ms lazy_loaded imports')
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from agrifarma import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (done - imported) * 1000,
+    'lazy_loaded': [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def parse_importtime(text):
+    """Parse ``-X importtime`` stderr into ``ImportRecord``s (nesting from indentation)."""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            head, cumulative_us, name = line.split('|', 2)
+            self_us = int(head.rsplit(':', 1)[1])
+            cumulative_us = int(cumulative_us)
+        except (IndexError, ValueError):
+            continue
+        module = name.lstrip()
+        # One leading space, then two per nesting level
+        records.append(ImportRecord(module.rstrip(), self_us, cumulative_us, (len(name) - len(module) - 1) // 2))
+    return records
+
+
+def top_imports(records, limit=15, depth=0):
+    """Heaviest imports at ``depth`` (0 = imported directly by the probe)."""
+    return sorted((r for r in records if r.depth == depth), key=lambda r: r.cumulative_us, reverse=True)[:limit]
+
+
+def measure(config_name='testing', python=None, lazy_modules=LAZY_MODULES):
+    """Run the probe in a fresh interpreter and return a ``StartupReport``."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', _PROBE, config_name, json.dumps(list(lazy_modules))],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return StartupReport(
+        import_ms=timings['import_ms'],
+        create_app_ms=timings['create_app_ms'],
+        total_ms=timings['import_ms'] + timings['create_app_ms'],
+        lazy_loaded=timings['lazy_loaded'],
+        imports=parse_importtime(result.stderr),
+    )
+
+
+def best_of(runs, config_name='testing'):
+    """Fastest of ``runs`` measurements (the others mostly measure a cold disk cache)."""
+    return min((measure(config_name) for _ in range(max(1, runs))), key=lambda report: report.total_ms)
@@ -3,13 +3,16 @@ AgriFarma - Digital Hub for Farmers in Sindh, Pakistan
 Main application entry point using the app factory pattern.
 """
 import os
+import click
 from agrifarma import create_app
 from agrifarma.extensions import db
 from agrifarma.models.user import User
 from agrifarma.models.role import Role
-from agrifarma.models.product import Product, Order, OrderItem
+from agrifarma.models.product import Product, Order, OrderItem, OrderEvent
 from agrifarma.models.blog import BlogPost, BlogCategory, BlogComment, BlogAttachment
 from agrifarma.models.consultancy import ConsultancyMessage
+from agrifarma.models.outbox import OutboxEvent
+from agrifarma.models.forum import ThreadReadMark, CategoryReadMark, ArchivedThread, ArchivedReply
 from agrifarma.models.srs_compliance import SRSModule, SRSRequirement
 
 # Create the Flask application instance
@@ -153,37 +156,10 @@ def seed_data():
         ]
     }
     
-    # Product-specific image mapper: prefer local static images under /static/images/products
-    # File convention: products/<keyword>.jpg or .png. Add your own images to match keywords below.
-    keyword_image_map = {
-        # Seeds
-        'wheat': '/static/images/products/wheat.jpg',
-        'rice': '/static/images/products/rice.jpg',
-        'cotton': '/static/images/products/cotton.jpg',
-        'corn': '/static/images/products/corn.jpg',
-        'potato': '/static/images/products/potato.jpg',
-        'tomato': '/static/images/products/tomato.jpg',
-        'onion': '/static/images/products/onion.jpg',
-        'sugarcane': '/static/images/products/sugarcane.jpg',
-        # Fertilizers
-        'npk': '/static/images/products/npk.jpg',
-        'urea': '/static/images/products/urea.jpg',
-        'dap': '/static/images/products/dap.jpg',
-        'compost': '/static/images/products/compost.jpg',
-        'organic': '/static/images/products/compost.jpg',
-        # Pesticides
-        'insecticide': '/static/images/products/insecticide.jpg',
-        'fungicide': '/static/images/products/fungicide.jpg',
-        'herbicide': '/static/images/products/herbicide.jpg',
-        # Tools / Equipment
-        'sprinkler': '/static/images/products/sprinkler.jpg',
-        'hoe': '/static/images/products/hoe.jpg',
-        'shears': '/static/images/products/shears.jpg',
-        'water pump': '/static/images/products/water-pump.jpg',
-        'tractor tire': '/static/images/products/tractor-tire.jpg',
-        'plow': '/static/images/products/plow.jpg',
-        'harvester': '/static/images/products/harvester.jpg',
-    }
+    # Product-specific images come from the shared keyword matcher
+    # (agrifarma/data/product_images.json); add images to match its keywords.
+    from agrifarma.services.product_images import get_matcher
+    matcher = get_matcher()
 
     # Generic fallback pool (farm backgrounds) only used when no specific image is available
     image_pool = [
@@ -200,22 +176,9 @@ def seed_data():
         """Pick the most specific image for a product.
         Priority: exact keyword hit in name -> category keywords -> fallback pool.
         """
-        key = name.lower()
-        # try multi-word keys first
-        for kw in sorted(keyword_image_map.keys(), key=lambda k: -len(k)):
-            if kw in key:
-                return keyword_image_map[kw]
-        # category-based defaults
-        cat = (category or '').lower()
-        category_defaults = {
-            'seeds': keyword_image_map.get('wheat'),
-            'fertilizers': keyword_image_map.get('npk'),
-            'pesticides': keyword_image_map.get('insecticide'),
-            'tools': keyword_image_map.get('sprinkler'),
-            'equipment': keyword_image_map.get('tractor tire') or keyword_image_map.get('plow'),
-        }
-        if category_defaults.get(cat):
-            return category_defaults[cat]
+        url = matcher.resolve(name, category, default=False)
+        if url:
+            return url
         # fallback rotating pool
         nonlocal pool_index
         url = image_pool[pool_index % len(image_pool)]
@@ -392,7 +355,8 @@ def migrate_profile_fields():
 def migrate_new_tables():
     """Create newly added tables if they don't exist yet (idempotent).
 
-    Currently ensures: blog_attachments, consultancy_messages
+    Currently ensures: blog_attachments, consultancy_messages, order_events, outbox_events,
+    forum_read_marks, forum_category_read_marks, forum_threads_archive, forum_replies_archive
     """
     from sqlalchemy import inspect
     engine = db.engine
@@ -410,16 +374,308 @@ def migrate_new_tables():
             created.append('consultancy_messages')
     except Exception as e:
         print(f"! Failed creating consultancy_messages: {e}")
+    try:
+        if not insp.has_table('order_events'):
+            OrderEvent.__table__.create(engine)
+            created.append('order_events')
+    except Exception as e:
+        print(f"! Failed creating order_events: {e}")
+    try:
+        if not insp.has_table('outbox_events'):
+            OutboxEvent.__table__.create(engine)
+            created.append('outbox_events')
+    except Exception as e:
+        print(f"! Failed creating outbox_events: {e}")
+    for model in (ThreadReadMark, CategoryReadMark, ArchivedThread, ArchivedReply):
+        try:
+            if not insp.has_table(model.__tablename__):
+                model.__table__.create(engine)
+                created.append(model.__tablename__)
+        except Exception as e:
+            print(f"! Failed creating {model.__tablename__}: {e}")
     if created:
         print("Created tables:", ", ".join(created))
     else:
         print("No new tables to create.")
 
 
+@app.cli.command()
+def migrate_cart_items():
+    """Collapse duplicate cart lines and add the (user_id, product_id) unique index.
+
+    Required by the cart upsert (INSERT ... ON CONFLICT). Safe to re-run.
+    """
+    from sqlalchemy import text
+    with db.engine.begin() as conn:
+        # Keep the newest line per (user, product); quantities were kept in sync by the old code
+        removed = conn.execute(text(
+            "DELETE FROM cart_items WHERE id NOT IN ("
+            "SELECT MAX(id) FROM cart_items GROUP BY user_id, product_id)"
+        )).rowcount
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS _user_product_cart_uc "
+            "ON cart_items (user_id, product_id)"
+        ))
+    print(f"Removed {removed} duplicate cart lines; unique index ensured.")
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=1000, show_default=True, help='Products resolved per batch.')
+def backfill_product_images(chunk_size):
+    """Fill in missing product images from the shared keyword matcher."""
+    from sqlalchemy import select, update, or_
+    from agrifarma.services.product_images import get_matcher
+    matcher = get_matcher()
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.category)
+            .where(Product.id > last_id, or_(Product.image_url.is_(None), Product.image_url == ''))
+            .order_by(Product.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        urls = matcher.resolve_many((r.name, r.category, None) for r in rows)
+        # ORM bulk UPDATE by primary key: one executemany per chunk
+        db.session.execute(update(Product), [{'id': r.id, 'image_url': url} for r, url in zip(rows, urls)])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+    print(f"Backfilled images for {updated} products.")
+
+
+@app.cli.command()
+@click.option('--batch-size', default=None, type=int, help='Events claimed per batch (default OUTBOX_BATCH_SIZE).')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to sleep when the outbox is empty.')
+@click.option('--once', is_flag=True, help='Process a single batch and exit.')
+def worker(batch_size, poll_interval, once):
+    """Dispatch outbox events (emails etc.) until interrupted."""
+    from agrifarma.services.outbox import run_worker
+    try:
+        succeeded, failed = run_worker(poll_interval=poll_interval, batch_size=batch_size, once=once)
+    except KeyboardInterrupt:
+        print("Worker stopped.")
+        return
+    if once:
+        print(f"Dispatched {succeeded} event(s), {failed} failed.")
+
+
+@app.cli.command()
+@click.option('--topic', default=None, help='Only requeue events of this topic.')
+def outbox_requeue(topic):
+    """Move dead-lettered outbox events back to pending."""
+    from agrifarma.services.outbox import requeue_dead
+    print(f"Requeued {requeue_dead(topic)} dead event(s).")
+
+
+@app.cli.group()
+def assets():
+    """Static asset pipeline."""
+
+
+@assets.command('build')
+@click.option('--no-clean', is_flag=True, help='Keep files from earlier builds in static/dist.')
+def assets_build(no_clean):
+    """Minify, fingerprint and precompress static assets into static/dist."""
+    from agrifarma.services.assets import build
+    summary = build(app.static_folder, clean=not no_clean)
+    print(f"Built {summary['files']} asset(s), {summary['compressed']} precompressed "
+          f"({'gzip + brotli' if summary['brotli'] else 'gzip only; install brotli for .br'}).")
+    print(f"{summary['bytes_in']} -> {summary['bytes_out']} bytes before compression.")
+
+
+@app.cli.group()
+def templates():
+    """Jinja template cache and render timing."""
+
+
+@templates.command('warm')
+def templates_warm():
+    """Compile every template into the bytecode cache."""
+    import time
+    from agrifarma.services.templating import warm_templates
+    started = time.perf_counter()
+    count, errors = warm_templates(app)
+    print(f"Compiled {count} template(s) in {(time.perf_counter() - started) * 1000:.0f}ms.")
+    for name, error in errors:
+        print(f"  FAILED {name}: {error}")
+
+
+@templates.command('report')
+@click.option('--sort', type=click.Choice(['total', 'avg', 'max', 'count']), default='total', show_default=True)
+@click.option('--limit', default=20, show_default=True, help='Rows to show (0 for all).')
+@click.option('--reset', is_flag=True, help='Clear collected timings after printing.')
+def templates_report(sort, limit, reset):
+    """Per-template render times collected by the running app's workers."""
+    from agrifarma.services.templating import load_stats, report_rows, reset_stats
+    rows = report_rows(load_stats(app), sort=sort, limit=limit or None)
+    if not rows:
+        print("No template timings recorded yet (is TEMPLATE_PROFILING on?).")
+    else:
+        width = max(len(row[0]) for row in rows)
+        print(f"{'template':<{width}}  {'renders':>8}  {'total ms':>10}  {'avg ms':>8}  {'max ms':>8}")
+        for name, count, total, avg, peak in rows:
+            print(f"{name:<{width}}  {count:>8}  {total:>10.1f}  {avg:>8.2f}  {peak:>8.2f}")
+    if reset:
+        reset_stats(app)
+        print("Timings reset.")
+
+
+@app.cli.command()
+@click.option('--runs', default=3, show_default=True, help='Fresh interpreters to start; the fastest is reported.')
+@click.option('--top', default=15, show_default=True, help='Heaviest imports to list.')
+@click.option('--depth', default=0, show_default=True, help='Import nesting level to list (0 = top level).')
+@click.option('--budget-ms', default=None, type=int, help='Fail when import + create_app exceeds this (default STARTUP_BUDGET_MS).')
+def startup_benchmark(runs, top, depth, budget_ms):
+    """Measure import and create_app() time in a fresh interpreter."""
+    from agrifarma.utils.startup import DEFAULT_BUDGET_MS, best_of, top_imports
+    budget_ms = budget_ms or DEFAULT_BUDGET_MS
+    report = best_of(runs)
+    print(f"import agrifarma: {report.import_ms:.0f}ms, create_app: {report.create_app_ms:.0f}ms, "
+          f"total: {report.total_ms:.0f}ms (budget {budget_ms}ms)")
+    if report.lazy_loaded:
+        print(f"Loaded at startup but meant to be lazy: {', '.join(report.lazy_loaded)}")
+    print(f"\n{'cumulative ms':>13}  {'self ms':>8}  module")
+    for record in top_imports(report.imports, top, depth):
+        print(f"{record.cumulative_us / 1000:>13.1f}  {record.self_us / 1000:>8.1f}  {record.module}")
+    if report.total_ms > budget_ms or report.lazy_loaded:
+        raise SystemExit(1)
+
+
+@app.cli.command()
+@click.option('--interval', default=0, show_default=True, help='Repeat every N seconds (0 = copy once).')
+def replica_sync(interval):
+    """Copy the primary SQLite database to the replica bind (local read/write split)."""
+    import time
+    from agrifarma.services.db_routing import replica_engine, sync_sqlite
+    replica = replica_engine()
+    if replica is None:
+        print("No replica bind configured (set REPLICA_DATABASE_URL).")
+        return
+    while True:
+        sync_sqlite(db.engine, replica)
+        print(f"Replica synced at {time.strftime('%H:%M:%S')}.")
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@app.cli.command()
+@click.option('--dry-run', is_flag=True, help='Report how many scores would change without saving.')
+def recompute_reputation(dry_run):
+    """Rebuild every user's forum reputation from replies, solutions and likes."""
+    from agrifarma.services.reputation import recompute_all
+    changed = recompute_all()
+    if dry_run:
+        db.session.rollback()
+        print(f"{changed} reputation scores would change.")
+    else:
+        db.session.commit()
+        print(f"✓ Recomputed reputation; {changed} scores changed.")
+
+
+@app.cli.command()
+@click.option('--days', default=None, type=int, help='Keep marks this recent (default FORUM_READ_MARK_RETENTION_DAYS).')
+def compact_read_marks(days):
+    """Collapse old per-thread forum read marks into per-category watermarks."""
+    from agrifarma.services.read_state import DEFAULT_RETENTION_DAYS, compact
+    days = days or app.config.get('FORUM_READ_MARK_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    removed = compact(days)
+    db.session.commit()
+    print(f"✓ Collapsed {removed} read marks older than {days} days into category watermarks.")
+
+
+@app.cli.command()
+@click.option('--months', default=None, type=int, help='Archive threads inactive this long (default FORUM_ARCHIVE_INACTIVE_MONTHS).')
+@click.option('--batch-size', default=500, show_default=True, help='Threads (or replies) moved and committed per batch.')
+def archive_forum(months, batch_size):
+    """Move soft-deleted and long-inactive forum content into the archive tables."""
+    from sqlalchemy import inspect
+    from agrifarma.services.archive import DEFAULT_INACTIVE_MONTHS, archive
+    insp = inspect(db.engine)
+    for model in (ArchivedThread, ArchivedReply):
+        if not insp.has_table(model.__tablename__):
+            model.__table__.create(db.engine)
+    months = months or app.config.get('FORUM_ARCHIVE_INACTIVE_MONTHS', DEFAULT_INACTIVE_MONTHS)
+
+    def progress(report):
+        print(f"  … {report.threads} threads, {report.replies} replies ({report.rows_per_second:.0f} rows/s)")
+
+    report = archive(months, batch_size, progress=progress)
+    print(f"✓ Archived {report.threads} threads and {report.replies} replies in {report.seconds:.1f}s "
+          f"({report.rows_per_second:.0f} rows/s).")
+
+
+@app.cli.command()
+@click.option('--batch-size', default=500, show_default=True, help='Rows rendered and committed per batch.')
+@click.option('--all', 'force', is_flag=True, help='Re-render every row, not only rows from older renderer versions.')
+def rerender_content(batch_size, force):
+    """Render thread, reply and blog content into content_html with the current renderer."""
+    from sqlalchemy import inspect, text
+    from agrifarma.services.content import RENDERER_VERSION, RENDERERS, rerender_all
+    insp = inspect(db.engine)
+    models = [model for model in RENDERERS if insp.has_table(model.__tablename__)]  # archive tables are optional
+    for model in models:
+        existing = {column['name'] for column in insp.get_columns(model.__tablename__)}
+        with db.engine.begin() as conn:
+            if 'content_html' not in existing:
+                conn.execute(text(f'ALTER TABLE {model.__tablename__} ADD COLUMN content_html TEXT'))
+            if 'content_html_version' not in existing:
+                conn.execute(text(f'ALTER TABLE {model.__tablename__} ADD COLUMN content_html_version INTEGER'))
+    for model in models:
+        written = rerender_all(model, batch_size=batch_size, force=force)
+        print(f"✓ {model.__tablename__}: {written} rows rendered (renderer v{RENDERER_VERSION})")
+
+
+@app.cli.command()
+@click.option('--window-days', default=None, type=int, help='Refresh threads created this recently (default FORUM_HOT_WINDOW_DAYS).')
+@click.option('--interval', default=0, show_default=True, help='Repeat every N seconds (0 = run once).')
+def recompute_hot_scores(window_days, interval):
+    """Refresh the time-decayed hot_score of recent forum threads."""
+    import time
+    from sqlalchemy import inspect, text
+    from agrifarma.models.forum import Thread
+    from agrifarma.services.hot import DEFAULT_WINDOW_DAYS, recompute_all
+    existing = {column['name'] for column in inspect(db.engine).get_columns(Thread.__tablename__)}
+    if 'hot_score' not in existing:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE forum_threads ADD COLUMN hot_score FLOAT NOT NULL DEFAULT 0'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_forum_threads_hot ON forum_threads (is_deleted, hot_score)'))
+    window_days = window_days or app.config.get('FORUM_HOT_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)
+    while True:
+        refreshed, zeroed = recompute_all(window_days)
+        db.session.commit()
+        print(f"✓ Hot scores: {refreshed} refreshed, {zeroed} older threads zeroed ({time.strftime('%H:%M:%S')}).")
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@app.cli.command()
+def rebuild_category_paths():
+    """Backfill the materialized path and depth of every forum category."""
+    from sqlalchemy import inspect, text
+    from agrifarma.models.forum import Category
+    from agrifarma.services.category_tree import rebuild_paths
+    existing = {column['name'] for column in inspect(db.engine).get_columns(Category.__tablename__)}
+    with db.engine.begin() as conn:
+        if 'path' not in existing:
+            conn.execute(text('ALTER TABLE forum_categories ADD COLUMN path VARCHAR(255)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_forum_categories_path ON forum_categories (path)'))
+        if 'depth' not in existing:
+            conn.execute(text('ALTER TABLE forum_categories ADD COLUMN depth INTEGER DEFAULT 0'))
+    written = rebuild_paths()
+    db.session.commit()
+    print(f"✓ Category paths rebuilt for {written} categories.")
+
+
 @app.cli.command()
 def seed_forum():
     """Seed forum with sample categories, threads, and replies."""
     from agrifarma.models.forum import Category, Thread, Reply
+    from agrifarma.services.slugs import allocate_slugs
+    from agrifarma.services.hot import recompute_all as recompute_hot
     from datetime import datetime, timedelta
     import random
     
@@ -512,13 +768,12 @@ def seed_forum():
     ]
     
     threads = []
-    for cat_name, title, content in threads_data:
+    # One slug lookup for all titles (duplicate titles get -1, -2, ...)
+    slugs = allocate_slugs(Thread.slug, [title for _, title, _ in threads_data])
+    for (cat_name, title, content), slug in zip(threads_data, slugs):
         category = next((c for c in categories if cat_name in c.name), categories[0])
         author = random.choice(farmers)
         
-        # Create slug from title
-        slug = title.lower().replace(' ', '-').replace('?', '').replace('!', '')[:50]
-        
         thread = Thread(
             title=title,
             slug=slug,
@@ -568,6 +823,10 @@ def seed_forum():
         thread.is_pinned = True
     
     db.session.commit()
+    
+    # Rank the seeded threads for the Hot tab
+    recompute_hot()
+    db.session.commit()
     print(f"✓ Created {len(categories)} categories")
     print(f"✓ Created {len(threads)} discussion threads")
     print(f"✓ Created replies for all threads")
@@ -578,6 +837,7 @@ def seed_forum():
 def seed_blog():
     """Seed blog with sample categories, posts, and comments."""
     from agrifarma.models.blog import BlogCategory, BlogPost, BlogComment
+    from agrifarma.services.slugs import allocate_slugs
     from datetime import datetime, timedelta
     import random
     
@@ -720,12 +980,11 @@ def seed_blog():
     ]
     
     posts = []
-    for cat_name, title, excerpt, content, tags in posts_data:
+    slugs = allocate_slugs(BlogPost.slug, [row[1] for row in posts_data])
+    for (cat_name, title, excerpt, content, tags), slug in zip(posts_data, slugs):
         category = next((c for c in categories if cat_name in c.name), categories[0])
         author = random.choice(authors)
         
-        slug = title.lower().replace(' ', '-').replace(':', '').replace('?', '')[:100]
-        
         post = BlogPost(
             title=title,
             slug=slug,
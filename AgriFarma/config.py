@@ -16,6 +16,10 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///agrifarma.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for reports/admin listings (see agrifarma.services.db_routing)
+    SQLALCHEMY_BINDS = {'replica': os.environ['REPLICA_DATABASE_URL']} if os.environ.get('REPLICA_DATABASE_URL') else {}
+    DB_REPLICA_BIND = 'replica'
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 15)
     SQLALCHEMY_ECHO = False
     
     # Session configuration
@@ -35,19 +39,98 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
     
-    # Assets configuration
-    ASSETS_ROOT = '/static'
+    # Assets configuration (asset_url() serves fingerprinted copies once `flask assets build` has run)
+    ASSETS_ROOT = os.environ.get('ASSETS_ROOT') or '/static'
     
     # Pagination
     POSTS_PER_PAGE = 10
     USERS_PER_PAGE = 20
+    GRID_COUNT_TTL = int(os.environ.get('GRID_COUNT_TTL') or 30)  # seconds admin grid totals are cached
     
-    # Email configuration (for future use)
+    # Anonymous full-page cache for listing pages (see agrifarma.services.page_cache)
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'  # memory or filesystem
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')  # filesystem backend; defaults to instance/page_cache
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL') or 60)
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES') or 1000)
+    
+    # Write-endpoint throttling (see agrifarma.services.rate_limit)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE') or 'memory'  # memory (one process) or sqlite (all workers on the host)
+    RATE_LIMIT_STORAGE_PATH = os.environ.get('RATE_LIMIT_STORAGE_PATH')  # sqlite store; defaults to instance/rate_limit.sqlite3
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS') or 100000)
+    # Reverse proxies in front of the app (Render/Heroku: 1); X-Forwarded-For is trusted for this many hops
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES') or 0)
+    
+    # Jinja templates (see agrifarma.services.templating)
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() in ['true', 'on', '1']
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # defaults to instance/jinja_cache
+    TEMPLATE_PRECOMPILE = os.environ.get('TEMPLATE_PRECOMPILE', 'false').lower() in ['true', 'on', '1']
+    TEMPLATE_PROFILING = os.environ.get('TEMPLATE_PROFILING', 'false').lower() in ['true', 'on', '1']
+    TEMPLATE_STATS_DIR = os.environ.get('TEMPLATE_STATS_DIR')  # defaults to instance/template_stats
+    TEMPLATE_STATS_FLUSH_SECONDS = int(os.environ.get('TEMPLATE_STATS_FLUSH_SECONDS') or 30)
+    
+    # Readiness checks (/readyz); 0 runs them on every probe instead of in the background
+    HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL') or 15)
+    HEALTH_STALE_AFTER = int(os.environ.get('HEALTH_STALE_AFTER') or 0)  # 0: three intervals
+    HEALTH_MIN_FREE_MB = int(os.environ.get('HEALTH_MIN_FREE_MB') or 200)
+    
+    # Prometheus metrics on /metrics (see agrifarma.services.metrics)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token required by /metrics when set
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS') or 5)
+    METRICS_GAUGE_MAX_AGE = int(os.environ.get('METRICS_GAUGE_MAX_AGE') or 60)
+    
+    # Marketplace autocomplete (index rebuilds on product changes; this bounds staleness across workers)
+    AUTOCOMPLETE_REFRESH_SECONDS = int(os.environ.get('AUTOCOMPLETE_REFRESH_SECONDS') or 300)
+    AUTOCOMPLETE_BACKGROUND_BUILD = os.environ.get('AUTOCOMPLETE_BACKGROUND_BUILD', 'true').lower() in ['true', 'on', '1']
+    
+    # Forum reputation leaderboard (scores update on every award; the top list is cached this long)
+    REPUTATION_LEADERBOARD_TTL = int(os.environ.get('REPUTATION_LEADERBOARD_TTL') or 300)
+    
+    # Forum unread tracking: read marks are buffered per worker and written in batches
+    FORUM_READ_MARK_FLUSH_SECONDS = int(os.environ.get('FORUM_READ_MARK_FLUSH_SECONDS') or 10)
+    FORUM_READ_MARK_BATCH = int(os.environ.get('FORUM_READ_MARK_BATCH') or 500)
+    FORUM_READ_MARK_RETENTION_DAYS = int(os.environ.get('FORUM_READ_MARK_RETENTION_DAYS') or 30)  # older marks become category watermarks
+    
+    # Forum "Hot" ranking: `flask recompute-hot-scores` refreshes threads created within this window
+    FORUM_HOT_WINDOW_DAYS = int(os.environ.get('FORUM_HOT_WINDOW_DAYS') or 14)
+    
+    # Forum category tree: cached per worker; changes from other workers are noticed within this many seconds
+    CATEGORY_TREE_CHECK_SECONDS = int(os.environ.get('CATEGORY_TREE_CHECK_SECONDS') or 30)
+    
+    # "Similar threads" index: rebuilt in the background this often so threads posted via other workers show up
+    SIMILAR_THREADS_REFRESH_SECONDS = int(os.environ.get('SIMILAR_THREADS_REFRESH_SECONDS') or 600)
+    SIMILAR_THREADS_BACKGROUND_BUILD = os.environ.get('SIMILAR_THREADS_BACKGROUND_BUILD', 'true').lower() in ['true', 'on', '1']
+    
+    # Forum archival: `flask archive-forum` moves threads with no activity for this many months to cold tables
+    FORUM_ARCHIVE_INACTIVE_MONTHS = int(os.environ.get('FORUM_ARCHIVE_INACTIVE_MONTHS') or 12)
+    
+    # Live thread updates (SSE): off by default, since every open stream holds a worker thread.
+    # Enable only with a threaded/async worker class, and keep LIVE_MAX_STREAMS below its thread count.
+    LIVE_ENABLED = os.environ.get('LIVE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    # Memory broker (one process) or sqlite (all workers on the host)
+    LIVE_BROKER = os.environ.get('LIVE_BROKER') or 'memory'
+    LIVE_BROKER_PATH = os.environ.get('LIVE_BROKER_PATH')  # sqlite broker; defaults to instance/live_events.sqlite3
+    LIVE_POLL_SECONDS = float(os.environ.get('LIVE_POLL_SECONDS') or 1.0)
+    LIVE_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_HEARTBEAT_SECONDS') or 15)
+    LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS') or 300)  # clients reconnect with Last-Event-ID
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS') or 4)  # per worker; Procfile runs 8 threads
+    
+    # Email configuration (sent by the outbox worker)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'no-reply@agrifarma.com'
+    
+    # Outbox worker (`flask worker`)
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE') or 20)
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS') or 60)
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS') or 5)
+    OUTBOX_BACKOFF_SECONDS = int(os.environ.get('OUTBOX_BACKOFF_SECONDS') or 30)
     
     # Admin settings
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@agrifarma.com'
@@ -57,12 +140,14 @@ class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    TEMPLATE_PROFILING = os.environ.get('TEMPLATE_PROFILING', 'true').lower() in ['true', 'on', '1']
 
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    TEMPLATE_PRECOMPILE = os.environ.get('TEMPLATE_PRECOMPILE', 'true').lower() in ['true', 'on', '1']
     
     # Override with production database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -74,6 +159,13 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PAGE_CACHE_ENABLED = False
+    TEMPLATE_BYTECODE_CACHE = False
+    TEMPLATE_PROFILING = False
+    HEALTH_CHECK_INTERVAL = 0
+    AUTOCOMPLETE_BACKGROUND_BUILD = False
+    SIMILAR_THREADS_BACKGROUND_BUILD = False
+    RATE_LIMIT_ENABLED = False
 
 
 # Configuration dictionary
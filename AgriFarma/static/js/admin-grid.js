@@ -0,0 +1,195 @@
+/*
+ * Lazy-loading admin data grids.
+ *
+ * Markup: <table data-grid-url="/admin/grid/users"> with one <th data-col="...">
+ * per displayed column. Optional attributes on the <th>: data-sortable,
+ * data-render (text|bool|money|date|badge|link|select|actions) and data-href
+ * (a URL template such as "/admin/users/{id}"); select columns take data-name
+ * and data-form for the checkboxes they render. Search boxes use data-grid-search,
+ * filter selects data-grid-filter="<column>", and the pager data-grid-pager.
+ * Rows arrive as compact arrays; the "columns" field of the response maps
+ * array positions to names.
+ */
+(function () {
+  'use strict';
+
+  function escapeHtml(value) {
+    return String(value == null ? '' : value)
+      .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  function fillTemplate(template, record) {
+    return template.replace(/\{(\w+)\}/g, function (_, key) {
+      return encodeURIComponent(record[key] == null ? '' : record[key]);
+    });
+  }
+
+  var renderers = {
+    text: function (v) { return escapeHtml(v); },
+    bool: function (v) { return v ? '✅' : '❌'; },
+    money: function (v) { return v == null ? '' : 'PKR ' + Number(v).toFixed(2); },
+    date: function (v) { return v ? escapeHtml(String(v).slice(0, 10)) : 'N/A'; },
+    badge: function (v) {
+      var label = v || 'none';
+      return '<span class="role-badge ' + escapeHtml(String(label).toLowerCase()) + '">' + escapeHtml(label) + '</span>';
+    },
+    link: function (v, record, th) {
+      return '<a href="' + escapeHtml(fillTemplate(th.dataset.href, record)) + '">' + escapeHtml(v) + '</a>';
+    },
+    select: function (v, record, th) {
+      var form = th.dataset.form ? ' form="' + escapeHtml(th.dataset.form) + '"' : '';
+      return '<input type="checkbox" class="form-check-input" name="' + escapeHtml(th.dataset.name || 'ids') +
+        '" value="' + escapeHtml(v) + '"' + form + ' aria-label="Select row">';
+    },
+    actions: function (v, record, th, grid) {
+      var html = '<a href="' + escapeHtml(fillTemplate(th.dataset.href, record)) + '" class="btn btn-sm btn-outline-primary">View</a>';
+      if (th.dataset.toggle) {
+        html += ' <form method="POST" class="d-inline" action="' + escapeHtml(fillTemplate(th.dataset.toggle, record)) + '">' +
+          '<input type="hidden" name="csrf_token" value="' + escapeHtml(grid.csrf) + '">' +
+          '<button type="submit" class="btn btn-sm btn-' + (record.is_active ? 'warning' : 'success') + '">' +
+          (record.is_active ? 'Deactivate' : 'Activate') + '</button></form>';
+      }
+      return html;
+    }
+  };
+
+  function AdminGrid(table) {
+    this.table = table;
+    this.url = table.dataset.gridUrl;
+    this.csrf = table.dataset.csrf || '';
+    this.headers = Array.prototype.slice.call(table.querySelectorAll('thead th[data-col]'));
+    this.body = table.querySelector('tbody');
+    this.root = table.closest('[data-grid-root]') || document;
+    this.pager = this.root.querySelector('[data-grid-pager]');
+    this.state = { page: 1, per_page: Number(table.dataset.perPage || 25), sort: '', dir: '', q: '' };
+    this.filters = {};
+    this.requestId = 0;
+    this.bind();
+    this.load();
+  }
+
+  AdminGrid.prototype.bind = function () {
+    var self = this;
+    this.headers.forEach(function (th) {
+      if (th.dataset.render === 'select') {
+        var all = document.createElement('input');
+        all.type = 'checkbox';
+        all.className = 'form-check-input';
+        all.setAttribute('aria-label', 'Select all rows');
+        all.addEventListener('change', function () {
+          Array.prototype.forEach.call(self.body.querySelectorAll('input[type=checkbox]'), function (box) {
+            box.checked = all.checked;
+          });
+        });
+        th.appendChild(all);
+        self.selectAll = all;
+      }
+      if (!th.hasAttribute('data-sortable')) { return; }
+      th.style.cursor = 'pointer';
+      th.addEventListener('click', function () {
+        var col = th.dataset.col;
+        self.state.dir = (self.state.sort === col && self.state.dir === 'desc') ? 'asc' : 'desc';
+        self.state.sort = col;
+        self.state.page = 1;
+        self.load();
+      });
+    });
+    var search = this.root.querySelector('[data-grid-search]');
+    if (search) {
+      var timer = null;
+      search.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+          self.state.q = search.value.trim();
+          self.state.page = 1;
+          self.load();
+        }, 250);
+      });
+    }
+    Array.prototype.forEach.call(this.root.querySelectorAll('[data-grid-filter]'), function (el) {
+      if (el.value) { self.filters[el.dataset.gridFilter] = el.value; }
+      el.addEventListener('change', function () {
+        self.filters[el.dataset.gridFilter] = el.value;
+        self.state.page = 1;
+        self.load();
+      });
+    });
+  };
+
+  AdminGrid.prototype.params = function () {
+    var params = new URLSearchParams();
+    var state = this.state;
+    Object.keys(state).forEach(function (key) {
+      if (state[key] !== '' && state[key] != null) { params.set(key, state[key]); }
+    });
+    var filters = this.filters;
+    Object.keys(filters).forEach(function (key) {
+      if (filters[key]) { params.set('f_' + key, filters[key]); }
+    });
+    return params.toString();
+  };
+
+  AdminGrid.prototype.load = function () {
+    var self = this;
+    var requestId = ++this.requestId;
+    this.body.setAttribute('aria-busy', 'true');
+    fetch(this.url + '?' + this.params(), { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+      .then(function (response) {
+        if (!response.ok) { throw new Error('HTTP ' + response.status); }
+        return response.json();
+      })
+      .then(function (data) {
+        if (requestId === self.requestId) { self.render(data); }
+      })
+      .catch(function () {
+        if (requestId === self.requestId) {
+          self.body.innerHTML = '<tr><td colspan="' + self.headers.length + '" class="text-danger text-center">Could not load rows.</td></tr>';
+        }
+      })
+      .then(function () { self.body.removeAttribute('aria-busy'); });
+  };
+
+  AdminGrid.prototype.render = function (data) {
+    var self = this;
+    var html = data.rows.map(function (row) {
+      var record = {};
+      data.columns.forEach(function (name, i) { record[name] = row[i]; });
+      return '<tr>' + self.headers.map(function (th) {
+        var render = renderers[th.dataset.render || 'text'] || renderers.text;
+        return '<td>' + render(record[th.dataset.col], record, th, self) + '</td>';
+      }).join('') + '</tr>';
+    }).join('');
+    if (this.selectAll) { this.selectAll.checked = false; }
+    this.body.innerHTML = html || '<tr><td colspan="' + this.headers.length + '" class="text-muted text-center">No rows found.</td></tr>';
+    this.headers.forEach(function (th) {
+      th.classList.toggle('sorted-asc', th.dataset.col === data.sort && data.dir === 'asc');
+      th.classList.toggle('sorted-desc', th.dataset.col === data.sort && data.dir === 'desc');
+    });
+    this.renderPager(data);
+  };
+
+  AdminGrid.prototype.renderPager = function (data) {
+    if (!this.pager) { return; }
+    var self = this;
+    var pages = Math.max(1, Math.ceil(data.total / data.per_page));
+    var first = data.total ? (data.page - 1) * data.per_page + 1 : 0;
+    var last = Math.min(data.total, data.page * data.per_page);
+    this.pager.innerHTML =
+      '<span class="text-muted me-2">' + first + '–' + last + ' of ' + data.total + '</span>' +
+      '<button type="button" class="btn btn-sm btn-outline-secondary me-1" data-page="' + (data.page - 1) + '"' + (data.page <= 1 ? ' disabled' : '') + '>&laquo; Prev</button>' +
+      '<button type="button" class="btn btn-sm btn-outline-secondary" data-page="' + (data.page + 1) + '"' + (data.page >= pages ? ' disabled' : '') + '>Next &raquo;</button>';
+    Array.prototype.forEach.call(this.pager.querySelectorAll('button[data-page]'), function (btn) {
+      btn.addEventListener('click', function () {
+        self.state.page = Number(btn.dataset.page);
+        self.load();
+      });
+    });
+  };
+
+  document.addEventListener('DOMContentLoaded', function () {
+    Array.prototype.forEach.call(document.querySelectorAll('table[data-grid-url]'), function (table) {
+      table.adminGrid = new AdminGrid(table);
+    });
+  });
+})();
@@ -0,0 +1,80 @@
+/*
+ * Marketplace search-as-you-type.
+ *
+ * Queries the autocomplete endpoint (debounced, latest request wins) and shows
+ * suggestions under the search box; arrow keys move, Enter follows a
+ * highlighted suggestion, Escape closes the menu.
+ */
+(function () {
+  'use strict';
+
+  function escapeHtml(value) {
+    return String(value == null ? '' : value)
+      .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  var labels = { product: 'Product', brand: 'Brand', category: 'Category' };
+
+  function attach(input) {
+    var menu = input.form.querySelector('[data-autocomplete-menu]');
+    var url = input.dataset.autocompleteUrl;
+    var timer = null;
+    var requestId = 0;
+    var active = -1;
+
+    function close() {
+      menu.classList.add('d-none');
+      menu.innerHTML = '';
+      active = -1;
+    }
+
+    function highlight(index) {
+      var items = menu.querySelectorAll('a');
+      if (!items.length) { return; }
+      active = (index + items.length) % items.length;
+      Array.prototype.forEach.call(items, function (item, i) {
+        item.classList.toggle('active', i === active);
+      });
+    }
+
+    function render(suggestions) {
+      if (!suggestions.length) { close(); return; }
+      menu.innerHTML = suggestions.map(function (s) {
+        return '<a class="list-group-item list-group-item-action d-flex justify-content-between" href="' + escapeHtml(s.url) + '">' +
+          '<span>' + escapeHtml(s.text) + '</span><small class="text-muted">' + escapeHtml(labels[s.type] || s.type) + '</small></a>';
+      }).join('');
+      menu.classList.remove('d-none');
+      active = -1;
+    }
+
+    function lookup() {
+      var q = input.value.trim();
+      var id = ++requestId;
+      if (q.length < 2) { close(); return; }
+      fetch(url + '?q=' + encodeURIComponent(q), { headers: { 'Accept': 'application/json' } })
+        .then(function (response) { return response.ok ? response.json() : { suggestions: [] }; })
+        .then(function (data) { if (id === requestId) { render(data.suggestions || []); } })
+        .catch(function () { if (id === requestId) { close(); } });
+    }
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(lookup, 120);
+    });
+    input.addEventListener('keydown', function (event) {
+      if (event.key === 'ArrowDown') { highlight(active + 1); event.preventDefault(); }
+      else if (event.key === 'ArrowUp') { highlight(active - 1); event.preventDefault(); }
+      else if (event.key === 'Escape') { close(); }
+      else if (event.key === 'Enter' && active >= 0) {
+        var item = menu.querySelectorAll('a')[active];
+        if (item) { window.location.href = item.href; event.preventDefault(); }
+      }
+    });
+    input.addEventListener('blur', function () { setTimeout(close, 150); });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    Array.prototype.forEach.call(document.querySelectorAll('input[data-autocomplete-url]'), attach);
+  });
+})();
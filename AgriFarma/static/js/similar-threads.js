@@ -0,0 +1,59 @@
+/*
+ * "Similar questions" while composing a forum thread.
+ *
+ * Sends the title and the start of the body to the similar-threads endpoint
+ * (debounced, latest request wins) and lists matching threads under the
+ * title, solved ones marked.
+ */
+(function () {
+  'use strict';
+
+  function escapeHtml(value) {
+    return String(value == null ? '' : value)
+      .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  function attach(input) {
+    var form = input.form;
+    var box = form.querySelector('[data-similar-box]');
+    var list = form.querySelector('[data-similar-list]');
+    var body = form.querySelector('textarea');
+    var url = input.dataset.similarUrl;
+    var timer = null;
+    var requestId = 0;
+
+    function render(threads) {
+      if (!threads.length) { box.classList.add('d-none'); list.innerHTML = ''; return; }
+      list.innerHTML = threads.map(function (t) {
+        return '<li><a href="' + escapeHtml(t.url) + '" target="_blank" rel="noopener">' + escapeHtml(t.title) + '</a>' +
+          (t.is_solved ? ' <span class="badge bg-success">Solved</span>' : '') + '</li>';
+      }).join('');
+      box.classList.remove('d-none');
+    }
+
+    function lookup() {
+      var title = input.value.trim();
+      var id = ++requestId;
+      if (title.length < 3) { render([]); return; }
+      var query = '?title=' + encodeURIComponent(title) +
+        '&content=' + encodeURIComponent(body ? body.value.slice(0, 500) : '');
+      fetch(url + query, { headers: { 'Accept': 'application/json' } })
+        .then(function (response) { return response.ok ? response.json() : { threads: [] }; })
+        .then(function (data) { if (id === requestId) { render(data.threads || []); } })
+        .catch(function () { if (id === requestId) { render([]); } });
+    }
+
+    function schedule() {
+      clearTimeout(timer);
+      timer = setTimeout(lookup, 300);
+    }
+
+    input.addEventListener('input', schedule);
+    if (body) { body.addEventListener('change', schedule); }
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    Array.prototype.forEach.call(document.querySelectorAll('input[data-similar-url]'), attach);
+  });
+})();
@@ -0,0 +1,40 @@
+/*
+ * Live replies on a forum thread.
+ *
+ * Opens an EventSource on the thread's event stream and appends each new
+ * reply under the existing ones. The browser reconnects on its own (sending
+ * Last-Event-ID), so nothing is missed across short drops or server-side
+ * stream rotation.
+ */
+(function () {
+  'use strict';
+
+  function escapeHtml(value) {
+    return String(value == null ? '' : value)
+      .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  function attach(container) {
+    if (!window.EventSource) { return; }
+    var source = new EventSource(container.dataset.liveUrl);
+
+    source.addEventListener('reply', function (message) {
+      var reply = JSON.parse(message.data);
+      if (document.getElementById('reply-' + reply.id)) { return; }
+      var when = reply.created_at ? new Date(reply.created_at + 'Z').toLocaleString() : 'Just now';
+      var card = document.createElement('div');
+      card.className = 'reply-card mb-3 p-3 bg-white border rounded';
+      card.id = 'reply-' + reply.id;
+      // reply.html is the sanitized content_html stored with the reply
+      card.innerHTML = '<strong class="text-primary">' + escapeHtml(reply.author) + '</strong>' +
+        '<div class="text-muted small mt-1"><i class="fas fa-clock"></i> ' + escapeHtml(when) + '</div>' +
+        '<div class="reply-content mt-2">' + reply.html + '</div>';
+      container.appendChild(card);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    Array.prototype.forEach.call(document.querySelectorAll('[data-live-url]'), attach);
+  });
+})();
@@ -0,0 +1,85 @@
+"""
+Pytest tests for the server-side admin data grids.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product, Order
+from agrifarma.services.grid import get_grid, _count_cache
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        admin_role, farmer_role = Role(name='admin'), Role(name='farmer')
+        db.session.add_all([admin_role, farmer_role])
+        db.session.flush()
+        admin = User(username='gridadmin', name='Grid Admin', email='gridadmin@test.com', role_id=admin_role.id, is_active=True)
+        admin.set_password('admin12345')
+        farmer = User(username='gridfarmer', name='Grid Farmer', email='farmer@test.com', role_id=farmer_role.id, is_active=True)
+        farmer.set_password('farmer12345')
+        db.session.add_all([admin, farmer])
+        db.session.flush()
+        for i in range(30):
+            db.session.add(Product(name=f'Item {i:02d}', slug=f'item-{i:02d}', category='Seeds' if i % 2 else 'Tools',
+                                   price=10 + i, stock_quantity=i, vendor_id=farmer.id, is_active=i != 3))
+        for i, status in enumerate(['pending', 'shipped', 'pending']):
+            db.session.add(Order(order_number=f'ORD-{i}', customer_id=farmer.id, subtotal=100, total_amount=100 + i, status=status))
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'gridadmin', 'password': 'admin12345'})
+    return client
+
+
+def test_products_grid_pages_sorts_and_filters(app, admin_client):
+    _count_cache.clear()
+    resp = admin_client.get('/admin/grid/products?sort=price&dir=asc&per_page=10&page=2&f_category=Seeds')
+    data = resp.get_json()
+    assert resp.status_code == 200
+    assert data['total'] == 15 and data['page'] == 2 and len(data['rows']) == 5
+    price = data['columns'].index('price')
+    prices = [row[price] for row in data['rows']]
+    assert prices == sorted(prices) and prices[0] == 31
+
+    data = admin_client.get('/admin/grid/products?f_is_active=false').get_json()
+    assert data['total'] == 1 and data['rows'][0][data['columns'].index('name')] == 'Item 03'
+
+
+def test_orders_and_users_grids_search_joined_columns(admin_client):
+    data = admin_client.get('/admin/grid/orders?f_status=pending&q=farmer').get_json()
+    assert data['total'] == 2
+    assert {row[data['columns'].index('customer')] for row in data['rows']} == {'gridfarmer'}
+
+    data = admin_client.get('/admin/grid/users?f_role=admin').get_json()
+    assert [row[data['columns'].index('username')] for row in data['rows']] == ['gridadmin']
+    assert admin_client.get('/admin/grid/nope').status_code == 404
+
+
+def test_count_is_cached_until_cleared(app):
+    with app.app_context():
+        _count_cache.clear()
+        grid = get_grid('orders')
+        assert grid.query({})['total'] == 3
+        farmer = User.query.filter_by(username='gridfarmer').first()
+        db.session.add(Order(order_number='ORD-X', customer_id=farmer.id, subtotal=1, total_amount=1))
+        db.session.commit()
+        payload = grid.query({})
+        assert payload['total'] == 3 and len(payload['rows']) == 4
+        _count_cache.clear()
+        assert grid.query({})['total'] == 4
+
+
+def test_admin_pages_render_lazy_grids(admin_client):
+    for path in ('/admin/users', '/admin/orders', '/admin/products'):
+        resp = admin_client.get(path)
+        assert resp.status_code == 200
+        assert b'data-grid-url' in resp.data
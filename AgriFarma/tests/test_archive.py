@@ -0,0 +1,87 @@
+"""
+Pytest tests for forum archival to cold tables.
+"""
+from datetime import datetime, timedelta
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import ArchivedReply, ArchivedThread, Category, Reply, Thread
+from agrifarma.services.archive import archive
+from agrifarma.services.reputation import recompute_all
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='farmer', name='Farmer', email='farmer@test.com', role_id=role.id, is_active=True)
+        user.set_password('farm12345')
+        helper = User(username='helper', name='Helper', email='helper@test.com', role_id=role.id, is_active=True)
+        helper.set_password('help12345')
+        db.session.add_all([user, helper])
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        old = datetime.utcnow() - timedelta(days=800)
+        specs = [
+            ('old', old, False, False),
+            ('old-pinned', old, False, True),
+            ('deleted', datetime.utcnow(), True, False),
+            ('live', datetime.utcnow(), False, False),
+            ('newest', old, False, False),
+        ]
+        for slug, last_activity, deleted, pinned in specs:
+            thread = Thread(title=slug.title(), slug=slug, content=f'About {slug}', author_id=user.id,
+                            category_id=category.id, last_activity=last_activity, is_deleted=deleted,
+                            is_pinned=pinned, is_solved=slug == 'old')
+            db.session.add(thread)
+            db.session.flush()
+            db.session.add(Reply(content=f'{slug} answer', author_id=helper.id, thread_id=thread.id,
+                                 is_solution=slug == 'old'))
+            db.session.add(Reply(content=f'{slug} removed', author_id=helper.id, thread_id=thread.id,
+                                 is_deleted=True))
+        db.session.flush()
+        db.session.add(Reply(content='latest', author_id=helper.id, thread_id=Thread.query.filter_by(slug='live').one().id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_archive_moves_stale_content_in_batches(app):
+    chunks = []
+    report = archive(inactive_months=12, batch_size=1, progress=chunks.append)
+    live_slugs = {thread.slug for thread in Thread.query}
+    # 'newest' is kept: its id is the table maximum
+    assert live_slugs == {'old-pinned', 'live', 'newest'}
+    assert {(t.slug, t.archive_reason) for t in ArchivedThread.query} == {('old', 'inactive'), ('deleted', 'deleted')}
+    # 2 threads with 2 replies each, plus the removed replies of the 3 that stay
+    assert (report.threads, report.replies) == (2, 7)
+    assert Reply.query.filter_by(is_deleted=True).count() == 0
+    assert len(chunks) == 5 and report.rows_per_second > 0
+    assert archive().rows == 0
+
+
+def test_archived_thread_is_still_readable(app):
+    old_id = Thread.query.filter_by(slug='old').one().id
+    deleted_id = Thread.query.filter_by(slug='deleted').one().id
+    archive()
+    client = app.test_client()
+    page = client.get(f'/forum/thread/{old_id}/old').data.decode()
+    assert 'archived' in page and 'old answer' in page and 'old removed' not in page
+    assert client.get(f'/forum/thread/{deleted_id}/deleted').status_code == 404
+
+
+def test_reputation_survives_archival(app):
+    recompute_all()
+    db.session.commit()
+    before = {user.username: user.reputation_score for user in User.query}
+    archive()
+    assert recompute_all() == 0
+    assert ArchivedReply.query.filter_by(is_solution=True).count() == 1
+    assert before['helper'] > 0
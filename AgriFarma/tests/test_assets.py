@@ -0,0 +1,88 @@
+"""
+Pytest tests for the static asset pipeline.
+"""
+import gzip
+import json
+import pytest
+from agrifarma import create_app
+from agrifarma.services.assets import AssetManifest, build, minify_css, rewrite_css_urls
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    static = tmp_path / 'static'
+    css = (
+        '/* theme */\n.hero , .banner {\n  color : #fff;\n  background: url("../images/bg.jpg") center;\n}\n'
+        'a :hover { content: "a  b"; }\n' * 10
+    )
+    _write(static / 'css' / 'site.css', css.encode())
+    _write(static / 'js' / 'app.js', b'console.log("hello");\n' * 20)
+    _write(static / 'images' / 'bg.jpg', b'\xff\xd8jpeg-bytes')
+    _write(static / 'uploads' / 'avatar.jpg', b'user upload')
+    return static
+
+
+def test_minify_css_keeps_strings_and_selector_spaces():
+    out = minify_css('/* c */ a :hover , b > i {\n  content: "x  y" ;\n  margin: 0 auto;\n}\n')
+    assert out == 'a :hover,b>i{content:"x  y";margin:0 auto}'
+
+
+def test_rewrite_css_urls_points_at_hashed_files():
+    manifest = {'images/bg.jpg': 'images/bg.abc12345.jpg'}
+    text = "a{background:url('../images/bg.jpg?v=1')}b{background:url(data:image/png;base64,xx)}"
+    assert rewrite_css_urls(text, 'css/site.css', manifest) == \
+        "a{background:url('../images/bg.abc12345.jpg?v=1')}b{background:url(data:image/png;base64,xx)}"
+
+
+def test_build_writes_hashed_files_and_manifest(static_dir):
+    summary = build(str(static_dir))
+    dist = static_dir / 'dist'
+    manifest = json.loads((dist / 'manifest.json').read_text())
+    assert set(manifest) == {'css/site.css', 'js/app.js', 'images/bg.jpg'}
+    css_file = dist / manifest['css/site.css'][len('dist/'):]
+    css = css_file.read_text()
+    assert '/*' not in css and '\n' not in css
+    assert manifest['images/bg.jpg'].split('/')[-1] in css
+    assert gzip.decompress((dist / (manifest['js/app.js'][len('dist/'):] + '.gz')).read_bytes()).startswith(b'console')
+    assert not (dist / (manifest['images/bg.jpg'][len('dist/'):] + '.gz')).exists()
+    assert summary['files'] == 3 and summary['compressed'] == 2
+    # Same input, same names
+    build(str(static_dir))
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+
+
+def test_asset_url_and_immutable_serving(static_dir):
+    build(str(static_dir))
+    app = create_app('testing')
+    app.static_folder = str(static_dir)
+    app.extensions['assets'] = AssetManifest(str(static_dir / 'dist' / 'manifest.json'))
+    with app.test_request_context():
+        url = app.jinja_env.globals['asset_url']('css/site.css')
+        assert url.startswith('/static/dist/css/site.') and url.endswith('.css')
+        assert app.jinja_env.globals['asset_url']('css/missing.css') == '/static/css/missing.css'
+    client = app.test_client()
+
+    plain = client.get(url)
+    assert plain.status_code == 200 and plain.mimetype == 'text/css'
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    gz = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert gz.headers['Content-Encoding'] == 'gzip' and gz.mimetype == 'text/css'
+    assert gzip.decompress(gz.data) == plain.data
+
+    assert client.get('/static/dist/manifest.json').status_code == 404
+    assert client.get('/static/dist/../css/site.css').status_code == 404
+
+
+def test_templates_fall_back_without_manifest():
+    app = create_app('testing')
+    app.extensions['assets'] = AssetManifest('/nonexistent/manifest.json')
+    with app.test_request_context():
+        assert app.jinja_env.globals['asset_url']('css/global.css') == '/static/css/global.css'
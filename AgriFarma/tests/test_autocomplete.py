@@ -0,0 +1,132 @@
+"""
+Pytest tests for the typo-tolerant marketplace autocomplete.
+"""
+import time
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.services.autocomplete import (AutocompleteIndex, SynonymTable, Suggestion,
+                                             _state, get_index, suggest)
+
+
+def _index(*names, synonyms=None):
+    return AutocompleteIndex([Suggestion(n, 'product', i, w) for i, (n, w) in enumerate(names)],
+                             SynonymTable(synonyms or {}))
+
+
+def test_prefix_matches_any_word_in_weight_order():
+    index = _index(('Wheat Seeds Gold', 5), ('Rice Seeds', 9), ('Seed Drill', 1))
+    assert [s.text for s in index.search('see')] == ['Rice Seeds', 'Wheat Seeds Gold', 'Seed Drill']
+    assert [s.text for s in index.search('wheat se')] == ['Wheat Seeds Gold']
+
+
+def test_fuzzy_matches_typos():
+    index = _index(('Urea Fertilizer', 1), ('DAP Fertilizer', 1), ('Garden Hoe', 1))
+    assert index.search('fertilzer')[0].text in ('Urea Fertilizer', 'DAP Fertilizer')
+    assert index.search('ureaa fert')[0].text == 'Urea Fertilizer'
+    assert index.search('zzzz') == []
+
+
+def test_synonyms_full_and_partial():
+    synonyms = {'gandum': ['wheat'], 'urea khad': ['urea'], 'khad': ['fertilizer']}
+    index = _index(('Wheat Seeds', 1), ('Urea Bag', 1), ('NPK Fertilizer', 1), synonyms=synonyms)
+    assert index.search('gandum')[0].text == 'Wheat Seeds'
+    assert index.search('gand')[0].text == 'Wheat Seeds'
+    assert index.search('urea khad')[0].text == 'Urea Bag'
+    assert 'NPK Fertilizer' in [s.text for s in index.search('khad')]
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='vendor')
+        db.session.add(role)
+        db.session.flush()
+        vendor = User(username='acvendor', name='AC Vendor', email='ac@test.com', role_id=role.id, is_active=True)
+        vendor.set_password('vendor12345')
+        db.session.add(vendor)
+        db.session.flush()
+        db.session.add_all([
+            Product(name='Wheat Seeds Premium', slug='wheat-seeds-premium', category='Seeds', brand='Kissan',
+                    price=100, vendor_id=vendor.id, sold_count=40),
+            Product(name='Urea Khad 50kg', slug='urea-khad-50kg', category='Fertilizers', price=300, vendor_id=vendor.id),
+        ] + [
+            Product(name=f'Bulk Item {i}', slug=f'bulk-item-{i}', category='Tools', price=1, vendor_id=vendor.id)
+            for i in range(1500)
+        ])
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+def test_endpoint_returns_suggestions_with_urls(app):
+    client = app.test_client()
+    data = client.get('/marketplace/autocomplete?q=gandum').get_json()
+    first = data['suggestions'][0]
+    assert first['text'] == 'Wheat Seeds Premium' and first['type'] == 'product'
+    assert first['url'].startswith('/marketplace/product/')
+    kinds = {s['type'] for s in client.get('/marketplace/autocomplete?q=kis').get_json()['suggestions']}
+    assert 'brand' in kinds
+    assert client.get('/marketplace/autocomplete?q=').get_json()['suggestions'] == []
+
+
+def test_index_rebuilds_after_committed_changes(app):
+    with app.app_context():
+        get_index()
+        vendor = User.query.filter_by(username='acvendor').first()
+        db.session.add(Product(name='Tractor Tire', slug='tractor-tire', category='Equipment', price=9, vendor_id=vendor.id))
+        db.session.commit()
+        assert suggest('tract')[0].text == 'Tractor Tire'
+        db.session.execute(db.update(Product).where(Product.slug == 'tractor-tire').values(is_active=False))
+        db.session.commit()
+        assert suggest('tract') == []
+
+
+def test_counter_updates_keep_the_index(app):
+    with app.app_context():
+        index = get_index()
+        product = Product.query.filter_by(slug='urea-khad-50kg').one()
+        product.sold_count += 1
+        product.stock_quantity = 7
+        db.session.commit()
+        assert get_index() is index
+        db.session.execute(db.update(Product), [{'id': product.id, 'sold_count': 5}])
+        db.session.commit()
+        assert get_index() is index
+        product.brand = 'Engro'
+        db.session.commit()
+        assert get_index() is not index
+
+
+def test_background_rebuild_serves_previous_index(app):
+    with app.app_context():
+        index = get_index()
+        app.config['AUTOCOMPLETE_BACKGROUND_BUILD'] = True
+        try:
+            vendor = User.query.filter_by(username='acvendor').first()
+            db.session.add(Product(name='Zinc Sulphate', slug='zinc-sulphate', category='Fertilizers', price=5,
+                                   vendor_id=vendor.id))
+            db.session.commit()
+            assert get_index() is index  # served while the new one builds
+            deadline = time.monotonic() + 10
+            while _state['building'] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert suggest('zinc')[0].text == 'Zinc Sulphate'
+        finally:
+            app.config['AUTOCOMPLETE_BACKGROUND_BUILD'] = False
+
+
+def test_lookups_are_fast(app):
+    with app.app_context():
+        index = get_index()
+        queries = ['bul', 'bulk item 14', 'wheet', 'gandum se', 'urea khad', 'tols']
+        started = time.perf_counter()
+        for _ in range(50):
+            for q in queries:
+                index.search(q)
+        per_query_ms = (time.perf_counter() - started) * 1000 / (50 * len(queries))
+        assert per_query_ms < 10
@@ -0,0 +1,102 @@
+"""
+Pytest tests for the persisted cart repository and login-time cart merge.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.models.cart import CartItem
+from agrifarma.services.cart import CartRepository
+
+
+@pytest.fixture(scope='module')
+def app():
+    """Create app with an in-memory database and a couple of products."""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='cartuser', name='Cart User', email='cart@test.com', role_id=role.id, is_active=True)
+        user.set_password('cart12345')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([
+            Product(name='Wheat Seeds', slug='wheat-seeds', category='Seeds', price=100,
+                    stock_quantity=50, vendor_id=user.id),
+            Product(name='Urea Bag', slug='urea-bag', category='Fertilizers', price=250,
+                    stock_quantity=3, vendor_id=user.id),
+        ])
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        CartItem.query.delete()
+        db.session.commit()
+
+
+def _ids():
+    return {p.slug: p.id for p in Product.query.all()}
+
+
+def test_upsert_inserts_and_replaces(ctx):
+    user = User.query.filter_by(username='cartuser').first()
+    ids = _ids()
+    repo = CartRepository(user.id)
+    repo.upsert({ids['wheat-seeds']: 2, ids['urea-bag']: 1})
+    repo.upsert({ids['wheat-seeds']: 5})
+    db.session.commit()
+    assert repo.quantities() == {ids['wheat-seeds']: 5, ids['urea-bag']: 1}
+    assert CartItem.query.filter_by(user_id=user.id).count() == 2
+
+
+def test_upsert_zero_removes_line(ctx):
+    user = User.query.filter_by(username='cartuser').first()
+    ids = _ids()
+    repo = CartRepository(user.id)
+    repo.upsert({ids['wheat-seeds']: 2, ids['urea-bag']: 1})
+    repo.upsert({ids['urea-bag']: 0})
+    db.session.commit()
+    assert repo.quantities() == {ids['wheat-seeds']: 2}
+
+
+def test_merge_session_cart_adds_and_clamps_to_stock(ctx):
+    user = User.query.filter_by(username='cartuser').first()
+    ids = _ids()
+    repo = CartRepository(user.id)
+    repo.upsert({ids['urea-bag']: 2})
+    merged = repo.merge_session_cart({str(ids['urea-bag']): 5, str(ids['wheat-seeds']): 1, '9999': 1, 'x': 1})
+    db.session.commit()
+    assert merged == 2
+    # Urea stock is 3, so 2 + 5 is clamped
+    assert repo.quantities() == {ids['urea-bag']: 3, ids['wheat-seeds']: 1}
+
+
+def test_login_merges_anonymous_cart(app):
+    client = app.test_client()
+    with app.app_context():
+        ids = _ids()
+    client.post(f"/marketplace/cart/add/{ids['wheat-seeds']}", data={'quantity': '4'})
+    with client.session_transaction() as sess:
+        assert sess['cart'] == {str(ids['wheat-seeds']): 4}
+
+    client.post('/auth/login', data={'username': 'cartuser', 'password': 'cart12345'})
+    with client.session_transaction() as sess:
+        assert 'cart' not in sess
+    with app.app_context():
+        user = User.query.filter_by(username='cartuser').first()
+        assert CartRepository(user.id).quantities() == {ids['wheat-seeds']: 4}
+
+    # Authenticated updates go straight to the persisted cart
+    client.post('/marketplace/cart/update', data={f"qty_{ids['wheat-seeds']}": '0', f"qty_{ids['urea-bag']}": '9'})
+    with app.app_context():
+        assert CartRepository(user.id).quantities() == {ids['urea-bag']: 3}
+        CartItem.query.delete()
+        db.session.commit()
@@ -0,0 +1,145 @@
+"""
+Pytest tests for streaming bulk product import/export.
+"""
+import io
+import json
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.services.catalog_io import import_catalog, export_catalog
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='vendor')
+        db.session.add(role)
+        db.session.flush()
+        for username in ('vendor_a', 'vendor_b'):
+            user = User(username=username, name=username, email=f'{username}@test.com', role_id=role.id, is_active=True)
+            user.set_password('vendor12345')
+            db.session.add(user)
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        Product.query.delete()
+        db.session.commit()
+
+
+def _vendor(username):
+    return User.query.filter_by(username=username).first()
+
+
+CSV_UPLOAD = (
+    "name,category,price,stock_quantity,sku,is_featured\n"
+    "Wheat Seeds Gold,Seeds,1500,20,WS-1,yes\n"
+    "Urea Khad,Fertilizers,abc,5,UK-1,no\n"
+    "DAP Bag,Fertilizers,3000,0,DP-1,false\n"
+    "Wheat Seeds Gold,Seeds,1600,10,WS-2,no\n"
+    ",Tools,10,1,,\n"
+)
+
+
+def test_csv_import_creates_rows_and_reports_errors(ctx):
+    vendor = _vendor('vendor_a')
+    report = import_catalog(io.BytesIO(CSV_UPLOAD.encode()), 'csv', vendor.id, chunk_size=2)
+    assert report.rows == 5
+    assert report.created == 2
+    lines = {line: msg for line, msg in report.errors}
+    assert 'price' in lines[3]
+    assert 'duplicate slug' in lines[5]
+    assert 'missing required name' in lines[6]
+
+    wheat = Product.query.filter_by(slug='wheat-seeds-gold').first()
+    assert wheat.price == 1500 and wheat.is_featured and wheat.in_stock
+    assert wheat.image_url == '/static/images/products/wheat.jpg'
+    dap = Product.query.filter_by(slug='dap-bag').first()
+    assert dap.in_stock is False and dap.vendor_id == vendor.id
+
+
+def test_jsonl_import_updates_own_and_renames_foreign_slugs(ctx):
+    vendor_a, vendor_b = _vendor('vendor_a'), _vendor('vendor_b')
+    db.session.add(Product(name='NPK', slug='npk', category='Fertilizers', price=10, sku='NPK-1', vendor_id=vendor_b.id))
+    db.session.add(Product(name='Hoe', slug='hoe', category='Tools', price=5, sku='HOE-1', vendor_id=vendor_a.id))
+    db.session.commit()
+
+    upload = '\n'.join([
+        json.dumps({'slug': 'hoe', 'name': 'Garden Hoe', 'category': 'Tools', 'price': 7.5}),
+        json.dumps({'slug': 'npk', 'name': 'NPK', 'category': 'Fertilizers', 'price': 9}),
+        json.dumps({'name': 'Another', 'category': 'Tools', 'price': 1, 'sku': 'NPK-1'}),
+        '{not json',
+    ])
+    report = import_catalog(io.BytesIO(upload.encode()), 'jsonl', vendor_a.id)
+    assert (report.created, report.updated, report.failed) == (1, 1, 2)
+    assert report.renamed == [(2, 'npk', 'npk-1')]
+    assert Product.query.filter_by(slug='hoe').first().price == 7.5
+    assert Product.query.filter_by(slug='npk').first().price == 10
+    assert Product.query.filter_by(slug='npk-1').first().vendor_id == vendor_a.id
+
+
+def test_export_round_trip(ctx):
+    vendor = _vendor('vendor_a')
+    import_catalog(io.BytesIO(CSV_UPLOAD.encode()), 'csv', vendor.id)
+    exported = ''.join(export_catalog('csv', vendor_id=vendor.id, chunk_size=1))
+    assert exported.splitlines()[0].startswith('sku,slug,name')
+    edited = exported.replace('1500.0', '1450.0')
+    report = import_catalog(io.BytesIO(edited.encode()), 'csv', vendor.id)
+    assert (report.created, report.updated, report.failed) == (0, 2, 0)
+    assert Product.query.filter_by(slug='wheat-seeds-gold').first().price == 1450
+
+    lines = ''.join(export_catalog('jsonl', vendor_id=vendor.id)).splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])['slug']
+
+
+def test_blank_cells_keep_stored_values_and_defaults(ctx):
+    vendor = _vendor('vendor_a')
+    db.session.add(Product(name='Hoe', slug='hoe', category='Tools', price=5, stock_quantity=8, vendor_id=vendor.id))
+    db.session.commit()
+    upload = (
+        "slug,name,category,price,stock_quantity,low_stock_threshold,currency,is_active,is_featured\n"
+        "hoe,Hoe,Tools,6,,,,,\n"
+        "rake,Rake,Tools,4,3,,,,\n"
+        "spade,Spade,Tools,9,,2,USD,no,\n"
+    )
+    report = import_catalog(io.BytesIO(upload.encode()), 'csv', vendor.id)
+    assert (report.created, report.updated, report.failed) == (2, 1, 0)
+    hoe, rake, spade = (Product.query.filter_by(slug=slug).one() for slug in ('hoe', 'rake', 'spade'))
+    assert hoe.price == 6 and hoe.stock_quantity == 8 and hoe.is_active
+    assert rake.is_active and not rake.is_featured and rake.currency == 'PKR'
+    assert spade.is_active is False and spade.stock_quantity == 0
+
+
+def test_rejected_chunk_is_retried_row_by_row(ctx, monkeypatch):
+    vendor, rival = _vendor('vendor_a'), _vendor('vendor_b')
+
+    class RacingMatcher:
+        # Another vendor takes "rake" between the slug lookup and the insert
+        def resolve_many(self, items):
+            db.session.add(Product(name='Rake', slug='rake', category='Tools', price=1, vendor_id=rival.id))
+            db.session.commit()
+            return [None for _ in items]
+
+    monkeypatch.setattr('agrifarma.services.catalog_io.get_matcher', RacingMatcher)
+    upload = "name,category,price\nRake,Tools,4\nSpade,Tools,9\n"
+    report = import_catalog(io.BytesIO(upload.encode()), 'csv', vendor.id)
+    assert report.created == 1 and report.errors == [(2, 'not saved: slug or SKU conflicts with an existing product')]
+    assert Product.query.filter_by(slug='spade').one().vendor_id == vendor.id
+
+
+def test_non_utf8_upload_is_reported(ctx):
+    vendor = _vendor('vendor_a')
+    upload = "name,category,price\nRake,Tools,4\nCaf\xe9 Hoe,Tools,5\n".encode('cp1252')
+    report = import_catalog(io.BytesIO(upload), 'csv', vendor.id)
+    assert report.failed == 1 and 'UTF-8' in report.errors[0][1]
+    jsonl = '{"name": "Caf\xe9", "category": "Tools", "price": 1}\n'.encode('latin-1')
+    assert 'UTF-8' in import_catalog(io.BytesIO(jsonl), 'jsonl', vendor.id).errors[0][1]
@@ -0,0 +1,127 @@
+"""
+Pytest tests for the materialized-path forum category tree.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.services.category_tree import CategoryCycleError, get_tree, rebuild_paths
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='admin')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='admin', name='Admin', email='admin@test.com', role_id=role.id, is_active=True)
+        user.set_password('admin12345')
+        db.session.add(user)
+        crops = Category(name='Crops', slug='crops')
+        wheat = Category(name='Wheat', slug='wheat', parent=crops)
+        diseases = Category(name='Diseases', slug='diseases', parent=wheat)
+        livestock = Category(name='Livestock', slug='livestock', position=1)
+        db.session.add_all([crops, wheat, diseases, livestock])
+        db.session.flush()
+        for category in (crops, diseases, diseases, livestock):
+            thread = Thread(title=f'T{category.id}', slug=f't-{Thread.query.count()}', content='c',
+                            author_id=user.id, category_id=category.id)
+            db.session.add(thread)
+            db.session.flush()
+            db.session.add(Reply(content='r', author_id=user.id, thread_id=thread.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _by_slug(slug):
+    return Category.query.filter_by(slug=slug).one()
+
+
+def test_paths_are_set_on_insert(app):
+    crops, wheat, diseases = _by_slug('crops'), _by_slug('wheat'), _by_slug('diseases')
+    assert diseases.path == f'/{crops.id}/{wheat.id}/{diseases.id}/'
+    assert (crops.depth, wheat.depth, diseases.depth) == (0, 1, 2)
+    assert [c.slug for c in diseases.get_breadcrumb()] == ['crops', 'wheat', 'diseases']
+
+
+def test_subtree_counts(app):
+    crops, wheat = _by_slug('crops'), _by_slug('wheat')
+    assert crops.get_thread_count() == 3 and wheat.get_thread_count() == 2
+    assert crops.get_reply_count() == 3
+    assert crops.get_latest_thread().category.slug == 'diseases'
+
+
+def test_move_rewrites_the_subtree(app):
+    livestock, wheat = _by_slug('livestock'), _by_slug('wheat')
+    wheat.parent_id = livestock.id
+    db.session.commit()
+    diseases = _by_slug('diseases')
+    assert diseases.path == f'/{livestock.id}/{wheat.id}/{diseases.id}/' and diseases.depth == 2
+    assert livestock.get_thread_count() == 3 and _by_slug('crops').get_thread_count() == 1
+
+
+def test_moving_under_a_descendant_is_rejected(app):
+    crops = _by_slug('crops')
+    crops.parent_id = _by_slug('diseases').id
+    with pytest.raises(CategoryCycleError):
+        db.session.commit()
+    db.session.rollback()
+    assert _by_slug('crops').path == f'/{crops.id}/'
+
+
+def test_edit_form_reports_a_move_under_a_descendant(app, monkeypatch):
+    # A stale parent list still offers a descendant of the edited category
+    monkeypatch.setattr('agrifarma.services.category_tree.CategoryTree.subtree_ids', lambda self, root: set())
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'admin12345'})
+    crops = _by_slug('crops')
+    response = client.post(f'/forum/admin/category/{crops.id}/edit', data={
+        'name': 'Crops', 'slug': 'crops', 'parent_id': _by_slug('diseases').id, 'color': 'primary',
+        'position': '0', 'is_active': 'y'})
+    assert response.status_code == 302 and response.location.endswith(f'/forum/admin/category/{crops.id}/edit')
+    db.session.expire_all()
+    assert _by_slug('crops').parent_id is None
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][0] == 'danger'
+
+
+def test_child_of_a_category_without_a_path(app):
+    wheat = _by_slug('wheat')
+    Category.query.filter(Category.slug.in_(['wheat', 'diseases'])).update({'path': None, 'depth': None})
+    db.session.commit()
+    durum = Category(name='Durum', slug='durum', parent_id=_by_slug('diseases').id)
+    db.session.add(durum)
+    db.session.commit()
+    crops, diseases = _by_slug('crops'), _by_slug('diseases')
+    assert durum.path == f'/{crops.id}/{wheat.id}/{diseases.id}/{durum.id}/' and durum.depth == 3
+
+
+def test_tree_cache_order_choices_and_invalidation(app):
+    tree = get_tree()
+    assert [name for _, name in tree.choices()] == ['Crops', '— Wheat', '— — Diseases', 'Livestock']
+    wheat = _by_slug('wheat')
+    assert [name for _, name in tree.choices(exclude_subtree=wheat.id)] == ['Crops', 'Livestock']
+    assert get_tree() is tree
+
+    db.session.add(Category(name='Barley', slug='barley', parent_id=_by_slug('crops').id))
+    db.session.commit()
+    assert [name for _, name in get_tree().choices()][:2] == ['Crops', '— Barley']
+
+
+def test_rebuild_paths_backfills(app):
+    Category.query.update({'path': None, 'depth': None})
+    db.session.commit()
+    assert rebuild_paths() == 4
+    db.session.commit()
+    diseases = _by_slug('diseases')
+    assert diseases.depth == 2 and diseases.path.endswith(f'/{diseases.id}/')
+
+
+def test_breadcrumb_shows_every_ancestor(app):
+    page = app.test_client().get('/forum/category/diseases').data.decode()
+    assert '/forum/category/crops' in page and '/forum/category/wheat' in page
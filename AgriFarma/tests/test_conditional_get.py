@@ -0,0 +1,102 @@
+"""
+Pytest tests for ETag / Last-Modified conditional responses on detail pages.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.models.product_review import ProductReview
+from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.models.blog import BlogPost, BlogCategory, BlogComment
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='etaguser', name='ETag User', email='etag@test.com', role_id=role.id, is_active=True)
+        user.set_password('etag12345')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Product(name='Wheat Seeds', slug='wheat-seeds', category='Seeds', price=100, vendor_id=user.id))
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        db.session.add(Thread(title='Wheat rust', slug='wheat-rust', content='Help', author_id=user.id, category_id=category.id))
+        blog_category = BlogCategory(name='Tips', slug='tips')
+        db.session.add(blog_category)
+        db.session.flush()
+        db.session.add(BlogPost(title='Sowing', slug='sowing', content='Sow early', author_id=user.id,
+                                category_id=blog_category.id, is_published=True))
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+def _revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag'].startswith('W/')
+    assert 'no-cache' in first.headers['Cache-Control']
+    second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    return first, second
+
+
+def test_product_304_still_counts_view(app):
+    client = app.test_client()
+    with app.app_context():
+        product = Product.query.first()
+        url = f'/marketplace/product/{product.id}'
+    first, second = _revalidate(client, url)
+    assert second.status_code == 304 and second.data == b''
+    with app.app_context():
+        product = Product.query.first()
+        assert product.view_count == 2
+        # Counting views must not invalidate the validators
+        assert client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+        db.session.add(ProductReview(product_id=product.id, user_id=product.vendor_id, rating=5, comment='Good'))
+        db.session.commit()
+    third = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert third.status_code == 200 and third.headers['ETag'] != first.headers['ETag']
+
+
+def test_etag_varies_by_viewer(app):
+    with app.app_context():
+        url = f'/marketplace/product/{Product.query.first().id}'
+    anon = app.test_client().get(url).headers['ETag']
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'etaguser', 'password': 'etag12345'})
+    assert client.get(url, headers={'If-None-Match': anon}).status_code == 200
+
+
+def test_thread_changes_with_replies(app):
+    client = app.test_client()
+    with app.app_context():
+        thread = Thread.query.first()
+        url = f'/forum/thread/{thread.id}/{thread.slug}'
+    first, second = _revalidate(client, url)
+    assert second.status_code == 304
+    with app.app_context():
+        thread = Thread.query.first()
+        assert thread.view_count == 2
+        db.session.add(Reply(content='Use fungicide', author_id=thread.author_id, thread_id=thread.id))
+        db.session.commit()
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def test_blog_post_changes_with_comments(app):
+    client = app.test_client()
+    with app.app_context():
+        post = BlogPost.query.first()
+        url = f'/blog/post/{post.id}/{post.slug}'
+    first, second = _revalidate(client, url)
+    assert second.status_code == 304
+    with app.app_context():
+        post = BlogPost.query.first()
+        db.session.add(BlogComment(content='Thanks', author_id=post.author_id, post_id=post.id))
+        db.session.commit()
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 200
@@ -0,0 +1,100 @@
+"""
+Pytest tests for write-time content rendering and sanitization.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.models.blog import BlogCategory, BlogPost
+from agrifarma.services import content
+from agrifarma.services.content import RENDERER_VERSION, render_text, rerender_all, sanitize_html
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='writer', name='Writer', email='writer@test.com', role_id=role.id, is_active=True)
+        user.set_password('write12345')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='Crops', slug='crops')
+        blog_category = BlogCategory(name='Tips', slug='tips')
+        db.session.add_all([category, blog_category])
+        db.session.flush()
+        thread = Thread(title='Wheat rust', slug='wheat-rust', content='Orange spots.\n\nSee https://example.org/rust.',
+                        author_id=user.id, category_id=category.id)
+        db.session.add(thread)
+        db.session.flush()
+        db.session.add(Reply(content='Use <b>fungicide</b>', author_id=user.id, thread_id=thread.id))
+        db.session.add(BlogPost(title='Sowing', slug='sowing', content='<p onclick="x()">Sow <em>early</em></p>'
+                                '<script>alert(1)</script>', author_id=user.id, category_id=blog_category.id,
+                                is_published=True))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_render_text_escapes_and_links():
+    html = render_text('Line one\nline <two>\n\nhttps://example.org/a?b=1&c=2.')
+    assert html == ('<p>Line one<br>\nline &lt;two&gt;</p>\n'
+                    '<p><a href="https://example.org/a?b=1&amp;c=2" rel="nofollow noopener">'
+                    'https://example.org/a?b=1&amp;c=2</a>.</p>')
+
+
+@pytest.mark.parametrize('dirty, clean', [
+    ('<p style="color:red" onmouseover="x()">Hi</p>', '<p>Hi</p>'),
+    ('<script>alert(1)</script><b>ok</b>', '<b>ok</b>'),
+    ('<a href="java\tscript:alert(1)">x</a>', '<a rel="nofollow noopener">x</a>'),
+    ('<a href="/blog/post/1" title="A &quot;b&quot;">x</a>', '<a href="/blog/post/1" title="A &#34;b&#34;" rel="nofollow noopener">x</a>'),
+    ('<img src="data:image/png;base64,AAA" alt="a">', '<img alt="a">'),
+    ('<ul><li>one<li>two</ul>', '<ul><li>one</li><li>two</li></ul>'),
+    ('<blink>x</blink> &lt;y&gt;', 'x &lt;y&gt;'),
+    ('<div><p>open', '<div><p>open</p></div>'),
+    ('<p>a<svg/>b</p><p>after</p>', '<p>ab</p><p>after</p>'),
+    ('<math/><script/>x<b>y</b>', 'x<b>y</b>'),
+])
+def test_sanitize_html(dirty, clean):
+    assert sanitize_html(dirty) == clean
+
+
+def test_content_html_is_rendered_at_write_time(app):
+    thread, reply, post = Thread.query.first(), Reply.query.first(), BlogPost.query.first()
+    assert thread.content_html_version == RENDERER_VERSION
+    assert '<a href="https://example.org/rust"' in thread.content_html
+    assert reply.content_html == '<p>Use &lt;b&gt;fungicide&lt;/b&gt;</p>'
+    assert post.content_html == '<p>Sow <em>early</em></p>'
+
+    reply.content = 'Edited'
+    db.session.commit()
+    assert reply.content_html == '<p>Edited</p>'
+
+
+def test_pages_print_stored_html(app):
+    client = app.test_client()
+    thread, post = Thread.query.first(), BlogPost.query.first()
+    page = client.get(f'/forum/thread/{thread.id}/{thread.slug}').data
+    assert b'Use &lt;b&gt;fungicide&lt;/b&gt;' in page
+    assert b'rel="nofollow noopener">https://example.org/rust</a>' in page
+    page = client.get(f'/blog/post/{post.id}/{post.slug}').data
+    assert b'<p>Sow <em>early</em></p>' in page
+    assert b'alert(1)' not in page
+
+
+def test_rerender_migrates_old_versions(app, monkeypatch):
+    Reply.query.update({'content_html': None, 'content_html_version': None})
+    db.session.commit()
+    assert rerender_all(Reply) == 1
+    assert rerender_all(Reply) == 0
+
+    monkeypatch.setattr(content, 'RENDERER_VERSION', RENDERER_VERSION + 1)
+    assert rerender_all(Thread, batch_size=1) == 1
+    db.session.expire_all()
+    assert Thread.query.first().content_html_version == RENDERER_VERSION + 1
+    assert rerender_all(Thread, force=True) == 1
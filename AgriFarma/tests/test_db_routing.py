@@ -0,0 +1,94 @@
+"""
+Pytest tests for read/write splitting with a SQLite replica kept in sync by the backup API.
+"""
+import pytest
+from flask import g
+from sqlalchemy import func, select
+from config import config, TestingConfig
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.services.db_routing import replica_engine, sync_sqlite
+from agrifarma.services.grid import _count_cache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {'replica': f"sqlite:///{tmp_path / 'replica.db'}"}
+
+    monkeypatch.setitem(config, 'replica-testing', ReplicaConfig)
+    app = create_app('replica-testing')
+    with app.app_context():
+        db.create_all()
+        admin_role, farmer_role = Role(name='admin'), Role(name='farmer')
+        db.session.add_all([admin_role, farmer_role])
+        db.session.flush()
+        admin = User(username='replicaadmin', name='Replica Admin', email='ra@test.com', role_id=admin_role.id, is_active=True)
+        admin.set_password('admin12345')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add(Product(name='Synced Seeds', slug='synced-seeds', category='Seeds', price=10, vendor_id=admin.id))
+        db.session.commit()
+        sync_sqlite(db.engine, replica_engine())
+        # Only on the primary until the next sync
+        db.session.add(Product(name='Fresh Urea', slug='fresh-urea', category='Fertilizer', price=20, vendor_id=admin.id))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # The shared db object remembers every bind key it has seen; later apps have no replica
+    db.metadatas.pop('replica', None)
+
+
+def _product_count():
+    return db.session.execute(select(func.count(Product.id))).scalar()
+
+
+def test_reads_route_to_replica_only_when_flagged(app):
+    with app.test_request_context():
+        assert _product_count() == 2
+        db.session.remove()
+        g.use_replica = True
+        assert _product_count() == 1
+        # Writes still go to the primary, even from a replica-routed view
+        db.session.add(Product(name='Tool', slug='tool', category='Tools', price=5, vendor_id=1))
+        db.session.commit()
+        g.use_replica = False
+        db.session.remove()
+        assert _product_count() == 3
+
+
+def test_admin_listing_reads_replica_until_own_write(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'replicaadmin', 'password': 'admin12345'})
+    with client.session_transaction() as sess:
+        assert sess['db_write_at']  # logging in records last_login
+        sess['db_write_at'] = 0  # ... long enough ago
+    _count_cache.clear()
+    assert client.get('/admin/grid/products').get_json()['total'] == 1  # replica, one sync behind
+    assert client.get('/admin/reports').status_code == 200
+
+    with app.app_context():
+        farmer = User(username='replicafarmer', name='Replica Farmer', email='rf@test.com', role_id=2, is_active=True)
+        farmer.set_password('farmer12345')
+        db.session.add(farmer)
+        db.session.commit()
+        sync_sqlite(db.engine, replica_engine())
+        db.session.add(Product(name='Newer Seeds', slug='newer-seeds', category='Seeds', price=30, vendor_id=1))
+        db.session.commit()
+        farmer_id = farmer.id
+    _count_cache.clear()
+    assert client.get('/admin/grid/products').get_json()['total'] == 2
+
+    # The admin's own committed write pins their reads to the primary for a while
+    client.post(f'/admin/users/{farmer_id}/toggle-active')
+    with client.session_transaction() as sess:
+        assert sess['db_write_at'] > 0
+    _count_cache.clear()
+    assert client.get('/admin/grid/products').get_json()['total'] == 3
@@ -0,0 +1,66 @@
+"""
+Pytest tests for liveness/readiness probes and the cached deep checks.
+"""
+import time
+import pytest
+from agrifarma import create_app, db
+from agrifarma.services.health import get_monitor
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), HEALTH_MIN_FREE_MB=1)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def test_livez_does_no_io(app):
+    with app.app_context():
+        db.drop_all()
+    resp = app.test_client().get('/livez')
+    assert resp.status_code == 200 and resp.get_json() == {'status': 'alive'}
+
+
+def test_readyz_reports_each_check(app):
+    resp = app.test_client().get('/readyz')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['status'] == 'ready' and body['stale'] is False
+    assert set(body['checks']) == {'database', 'uploads', 'schema'}
+    for check in body['checks'].values():
+        assert check['ok'] and check['checked_at'].endswith('Z') and check['duration_ms'] >= 0
+    assert app.test_client().get('/health').get_json()['status'] == 'ok'
+
+
+def test_readyz_fails_on_missing_tables_and_full_disk(app):
+    app.config['HEALTH_MIN_FREE_MB'] = 10 ** 12
+    with app.app_context():
+        db.drop_all()
+    resp = app.test_client().get('/readyz')
+    assert resp.status_code == 503
+    checks = resp.get_json()['checks']
+    assert not checks['uploads']['ok'] and 'MB free' in checks['uploads']['detail']
+    assert not checks['schema']['ok'] and 'missing tables' in checks['schema']['detail']
+    assert not checks['database']['ok']
+    health = app.test_client().get('/health')
+    assert health.status_code == 500 and health.get_json()['database'] == 'error'
+    with app.app_context():
+        db.create_all()
+
+
+def test_background_results_are_cached_and_expire(app):
+    app.config.update(HEALTH_CHECK_INTERVAL=3600)
+    from agrifarma.services.health import HealthMonitor
+    monitor = app.extensions['health'] = HealthMonitor(app)
+    client = app.test_client()
+    first = client.get('/readyz').get_json()
+    assert client.get('/readyz').get_json()['checks'] == first['checks']  # served from cache
+    assert monitor._thread is not None and monitor._thread.daemon
+    monitor.updated = time.monotonic() - 3 * 3600 - 1  # thread stopped refreshing
+    resp = client.get('/readyz')
+    assert resp.status_code == 503 and resp.get_json()['stale'] is True
+    assert get_monitor(app) is monitor
@@ -0,0 +1,117 @@
+"""
+Pytest tests for time-decayed hot-thread ranking.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.services.hot import hot_score, hot_threads, recompute_all, refresh
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        for username in ('alice', 'bilal', 'chand'):
+            user = User(username=username, name=username.title(), email=f'{username}@test.com', role_id=role.id,
+                        is_active=True)
+            user.set_password('hot12345')
+            db.session.add(user)
+        db.session.flush()
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        alice = User.query.filter_by(username='alice').first()
+        now = datetime.utcnow()
+        for slug, hours in (('fresh', 1), ('yesterday', 24), ('last-month', 24 * 30)):
+            db.session.add(Thread(title=slug, slug=slug, content='c', author_id=alice.id, category_id=category.id,
+                                  created_at=now - timedelta(hours=hours)))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _reply(thread, username):
+    user = User.query.filter_by(username=username).first()
+    db.session.add(Reply(content='r', author_id=user.id, thread_id=thread.id))
+    db.session.flush()
+
+
+def test_score_decays_and_prefers_participants():
+    now = datetime.utcnow()
+    assert hot_score(0, 0, 0, False, now, now) > hot_score(0, 0, 0, False, now - timedelta(hours=10), now)
+    # Ten replies from one user count for less than four people talking
+    assert hot_score(4, 4, 0, False, now, now) > hot_score(10, 1, 0, False, now, now)
+    assert hot_score(1, 1, 0, True, now, now) > hot_score(1, 1, 0, False, now, now)
+
+
+def test_bumping_an_old_thread_does_not_beat_a_discussion(app):
+    yesterday, old = Thread.query.filter_by(slug='yesterday').one(), Thread.query.filter_by(slug='last-month').one()
+    for username in ('alice', 'bilal', 'chand'):
+        _reply(yesterday, username)
+    for _ in range(10):
+        _reply(old, 'bilal')
+    for thread in Thread.query.all():
+        refresh(thread.id)
+    db.session.commit()
+    db.session.expire_all()
+    assert yesterday.hot_score > old.hot_score
+    assert [t.slug for t in hot_threads(3)] == ['fresh', 'yesterday', 'last-month']
+
+
+def test_reply_refreshes_score(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'bilal', 'password': 'hot12345'})
+    thread = Thread.query.filter_by(slug='last-month').one()
+    client.post(f'/forum/thread/{thread.id}/last-month/reply', data={'content': 'Still relevant?'})
+    db.session.expire_all()
+    assert thread.hot_score > 0
+
+
+def test_refresh_leaves_updated_at_alone(app):
+    thread = Thread.query.filter_by(slug='fresh').one()
+    stamp = thread.updated_at
+    refresh(thread.id)
+    db.session.commit()
+    db.session.expire_all()
+    assert thread.hot_score > 0 and thread.updated_at == stamp
+
+
+def test_batch_recompute_refreshes_window_and_zeroes_older(app):
+    Thread.query.update({'hot_score': 99.0})
+    db.session.commit()
+    refreshed, zeroed = recompute_all(window_days=14)
+    db.session.commit()
+    assert (refreshed, zeroed) == (2, 1)
+    db.session.expire_all()
+    scores = {t.slug: t.hot_score for t in Thread.query.all()}
+    assert scores['last-month'] == 0 and 0 < scores['yesterday'] < scores['fresh'] < 99
+
+
+def test_hot_tab_is_one_indexed_query(app):
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        hot_threads(5)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert len(statements) == 1
+    plan = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + statements[0].replace('?', '0').replace('0,', '5,', 1)))
+    assert 'ix_forum_threads_hot' in ' '.join(str(row) for row in plan)
+
+
+def test_forum_hot_tab(app):
+    client = app.test_client()
+    recompute_all()
+    db.session.commit()
+    page = client.get('/forum/?tab=hot').data.decode()
+    assert page.index('>fresh<') < page.index('>yesterday<')
@@ -0,0 +1,116 @@
+"""
+Pytest tests for live thread updates over Server-Sent Events.
+"""
+import json
+import threading
+import time
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread
+from agrifarma.services.live import MemoryBroker, SQLiteBroker, StreamSlots, stream
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config.update(LIVE_ENABLED=True, LIVE_HEARTBEAT_SECONDS=0.05, LIVE_STREAM_MAX_SECONDS=0.2)
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='farmer', name='Farmer', email='farmer@test.com', role_id=role.id, is_active=True)
+        user.set_password('farm12345')
+        db.session.add(user)
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        db.session.add(Thread(title='Wheat', slug='wheat', content='c', author_id=user.id, category_id=category.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.parametrize('make_broker', [
+    lambda tmp_path: MemoryBroker(backlog=2),
+    lambda tmp_path: SQLiteBroker(str(tmp_path / 'live.sqlite3'), backlog=2, poll_seconds=0.01),
+])
+def test_broker_replays_and_waits(tmp_path, make_broker):
+    broker = make_broker(tmp_path)
+    first = broker.publish('thread:1', 'reply', {'id': 1})
+    broker.publish('thread:2', 'reply', {'id': 2})
+    assert broker.latest_id('thread:1') == first
+    assert [json.loads(e.data) for e in broker.wait('thread:1', 0, 0)] == [{'id': 1}]
+    assert broker.wait('thread:1', first, 0.01) == []
+
+    timer = threading.Timer(0.05, broker.publish, ('thread:1', 'reply', {'id': 3}))
+    timer.start()
+    events = broker.wait('thread:1', first, 2)
+    timer.join()
+    assert [json.loads(e.data)['id'] for e in events] == [3]
+
+
+def test_stream_frames_heartbeats_and_ends():
+    broker = MemoryBroker()
+    old = broker.publish('thread:1', 'reply', {'id': 1})
+    frames = list(stream(broker, 'thread:1', last_id=None, heartbeat=0.02, max_seconds=0.05))
+    assert frames[0].startswith('retry: ')
+    assert all(frame == ': heartbeat\n\n' for frame in frames[1:]) and len(frames) > 1
+    frames = list(stream(broker, 'thread:1', last_id=old - 1, heartbeat=0.02, max_seconds=0.03))
+    assert frames[1] == f'id: {old}\nevent: reply\ndata: {{"id": 1}}\n\n'
+
+
+def test_memory_broker_drops_quiet_channels():
+    broker = MemoryBroker(retention=0.01)
+    broker.publish('thread:1', 'reply', {'id': 1})
+    time.sleep(0.02)
+    latest = broker.publish('thread:2', 'reply', {'id': 2})
+    assert list(broker._channels) == ['thread:2']
+    assert broker.latest_id('thread:1') == 0 and broker.publish('thread:1', 'reply', {'id': 3}) > latest
+
+
+def test_stream_slots_cap():
+    slots = StreamSlots(limit=1)
+    assert slots.acquire() and not slots.acquire()
+    slots.release()
+    assert slots.acquire()
+
+
+def test_posted_reply_reaches_the_stream(app):
+    client = app.test_client()
+    thread = Thread.query.first()
+    client.post('/auth/login', data={'username': 'farmer', 'password': 'farm12345'})
+    client.post(f'/forum/thread/{thread.id}/wheat/reply', data={'content': 'Sow in **November**'})
+
+    response = client.get(f'/forum/thread/{thread.id}/events', headers={'Last-Event-ID': '0'})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    body = response.get_data(as_text=True)
+    frame = next(line for line in body.split('\n') if line.startswith('data: '))
+    payload = json.loads(frame[len('data: '):])
+    assert payload['author'] == 'Farmer' and 'November' in payload['html']
+    assert payload['url'].endswith(f"#reply-{payload['id']}")
+    response.close()  # the WSGI server does this when the client goes away
+    assert app.extensions['live']['slots'].active == 0
+
+
+def test_stream_cap_and_missing_thread(app):
+    client = app.test_client()
+    assert client.get('/forum/thread/999/events').status_code == 404
+    app.extensions['live']['slots'].limit = 0
+    response = client.get(f'/forum/thread/{Thread.query.first().id}/events')
+    assert response.status_code == 503 and response.headers['Retry-After']
+
+
+def test_disabled_by_default(app):
+    app.config['LIVE_ENABLED'] = False
+    client = app.test_client()
+    thread = Thread.query.first()
+    page = client.get(f'/forum/thread/{thread.id}/wheat').get_data(as_text=True)
+    assert 'data-live-url' not in page and 'thread-live.js' not in page
+    assert client.get(f'/forum/thread/{thread.id}/events').status_code == 404
+    app.config['LIVE_ENABLED'] = True
+    assert 'data-live-url' in client.get(f'/forum/thread/{thread.id}/wheat').get_data(as_text=True)
@@ -0,0 +1,91 @@
+"""
+Pytest tests for the /metrics endpoint and multiprocess aggregation.
+"""
+import json
+import re
+import time
+import pytest
+from agrifarma import create_app, db
+from agrifarma.services import metrics
+from agrifarma.services.metrics import Histogram, REGISTRY, observe_iter
+
+
+def _value(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def test_histogram_buckets_are_cumulative_in_exposition():
+    hist = Histogram('test_seconds', 'Test.', ('kind',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3):
+        hist.observe(value, kind='a"b')
+    REGISTRY.register(hist)
+    try:
+        text = metrics.render({'test_seconds': hist.snapshot()})
+    finally:
+        del REGISTRY.metrics['test_seconds']
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{kind="a\\"b",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{kind="a\\"b",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{kind="a\\"b",le="+Inf"} 4' in text
+    assert 'test_seconds_count{kind="a\\"b"} 4' in text
+    with pytest.raises(ValueError):
+        hist.observe(1)
+
+
+def test_requests_statements_and_pool_are_counted(app):
+    client = app.test_client()
+    before = client.get('/metrics').data.decode()
+    client.get('/health')
+    after = client.get('/metrics').data.decode()
+    health = 'agrifarma_http_request_duration_seconds_count{endpoint="main.health",method="GET",status="200"}'
+    assert _value(after, health) == _value(before, health) + 1
+    select = 'agrifarma_db_statements_total{operation="select"}'
+    assert _value(after, select) > _value(before, select)
+    assert _value(after, 'agrifarma_db_pool_checkouts_total') > _value(before, 'agrifarma_db_pool_checkouts_total')
+    assert re.search(r'^agrifarma_db_statement_duration_seconds_sum\{operation="select"\} ', after, re.M)
+
+
+def test_observe_iter_times_streamed_exports():
+    before = metrics.EXPORT_SECONDS.snapshot().get(json.dumps(['unit']), [0] * 14)[-1]
+    assert list(observe_iter(iter('abc'), metrics.EXPORT_SECONDS, kind='unit')) == ['a', 'b', 'c']
+    assert metrics.EXPORT_SECONDS.snapshot()[json.dumps(['unit'])][-1] == before + 1
+
+
+def test_multiprocess_files_are_merged(app, tmp_path):
+    app.config.update(METRICS_MULTIPROC_DIR=str(tmp_path), METRICS_GAUGE_MAX_AGE=60)
+    key = json.dumps(['catalog_csv'])
+    buckets = len(metrics.EXPORT_SECONDS.buckets) + 1
+    other = {
+        'agrifarma_export_duration_seconds': {key: [1] + [0] * (buckets - 1) + [0.02, 1]},
+        'agrifarma_db_pool_checked_out': {'[]': 3},
+    }
+    (tmp_path / '99990.json').write_text(json.dumps({'written_at': time.time(), 'metrics': other}))
+    (tmp_path / '99991.json').write_text(json.dumps({'written_at': time.time() - 3600, 'metrics': other}))
+    local = metrics.EXPORT_SECONDS.snapshot().get(key, [0] * (buckets + 2))[-1]
+    text = app.test_client().get('/metrics').data.decode()
+    assert _value(text, 'agrifarma_export_duration_seconds_count{kind="catalog_csv"}') == local + 2
+    # The stale file's gauge is ignored; the fresh one adds to this process's value
+    local_gauge = metrics.POOL_CHECKED_OUT.snapshot().get('[]', 0)
+    assert 3 + local_gauge - 1 <= _value(text, 'agrifarma_db_pool_checked_out') <= 3 + local_gauge + 1
+    assert any(p.name.endswith('.json') and p.stem not in ('99990', '99991') for p in tmp_path.iterdir())
+
+
+def test_token_protects_endpoint(app):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    resp = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert resp.status_code == 200 and resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
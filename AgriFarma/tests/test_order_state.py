@@ -0,0 +1,116 @@
+"""
+Pytest tests for the order state machine and bulk transitions.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Order, OrderEvent
+from agrifarma.services.orders import (transition_orders, apply_transitions, InvalidTransition,
+                                       can_transition)
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        admin_role, farmer_role = Role(name='admin'), Role(name='farmer')
+        db.session.add_all([admin_role, farmer_role])
+        db.session.flush()
+        admin = User(username='stateadmin', name='State Admin', email='sa@test.com', role_id=admin_role.id, is_active=True)
+        admin.set_password('admin12345')
+        farmer = User(username='statefarmer', name='State Farmer', email='sf@test.com', role_id=farmer_role.id, is_active=True)
+        farmer.set_password('farmer12345')
+        db.session.add_all([admin, farmer])
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def orders(app):
+    with app.app_context():
+        farmer = User.query.filter_by(username='statefarmer').first()
+        created = []
+        for i, status in enumerate(['pending', 'pending', 'processing', 'delivered']):
+            order = Order(order_number=f'SM-{i}', customer_id=farmer.id, subtotal=10, total_amount=10, status=status)
+            db.session.add(order)
+            created.append(order)
+        db.session.commit()
+        yield [o.id for o in created]
+        OrderEvent.query.delete()
+        Order.query.delete()
+        db.session.commit()
+
+
+def test_machine_rules():
+    assert can_transition('pending', 'processing')
+    assert not can_transition('delivered', 'pending')
+    assert can_transition('unpaid', 'paid', field='payment_status')
+    with pytest.raises(InvalidTransition):
+        transition_orders([1], 'teleported')
+
+
+def test_bulk_transition_moves_valid_orders_and_logs_events(app, orders):
+    with app.app_context():
+        result = transition_orders(orders, 'cancelled', note='harvest backlog')
+        db.session.commit()
+        assert sorted(result.moved) == sorted(orders[:3])
+        assert 'delivered' in result.rejected[orders[3]]
+        cancelled = Order.query.filter(Order.id.in_(orders[:3])).all()
+        assert all(o.status == 'cancelled' and o.cancelled_at for o in cancelled)
+        events = OrderEvent.query.order_by(OrderEvent.order_id).all()
+        assert [(e.from_value, e.to_value) for e in events] == [('pending', 'cancelled')] * 2 + [('processing', 'cancelled')]
+        assert events[0].note == 'harvest backlog'
+
+
+def test_stamp_is_kept_and_plan_runs_per_target(app, orders):
+    with app.app_context():
+        result = apply_transitions({'processing': orders[:2], 'shipped': [orders[2]]})
+        db.session.commit()
+        assert len(result.moved) == 3
+        shipped = db.session.get(Order, orders[2])
+        first_stamp = shipped.shipped_at
+        assert shipped.status == 'shipped' and first_stamp
+
+        paid = transition_orders(orders, 'paid', field='payment_status')
+        db.session.commit()
+        assert len(paid.moved) == 4
+        assert all(db.session.get(Order, i).paid_at for i in orders)
+        assert transition_orders(orders, 'paid', field='payment_status').moved == []
+
+
+def test_update_status_validates(app, orders):
+    with app.app_context():
+        order = db.session.get(Order, orders[3])
+        with pytest.raises(InvalidTransition):
+            order.update_status('pending')
+        order = db.session.get(Order, orders[0])
+        order.update_status('processing')
+        assert db.session.get(Order, orders[0]).status == 'processing'
+        assert order.events.count() == 1
+
+
+def test_admin_bulk_action(app, orders):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'stateadmin', 'password': 'admin12345'})
+    resp = client.post('/admin/orders/bulk-status', data={'target': 'processing', 'order_ids': [str(i) for i in orders]})
+    assert resp.status_code == 302
+    with app.app_context():
+        statuses = sorted(o.status for o in Order.query.filter(Order.id.in_(orders)))
+        assert statuses == ['delivered', 'processing', 'processing', 'processing']
+        admin = User.query.filter_by(username='stateadmin').first()
+        assert OrderEvent.query.filter_by(actor_id=admin.id).count() == 2
+
+
+def test_admin_order_update_reports_unknown_status(app, orders):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'stateadmin', 'password': 'admin12345'})
+    resp = client.post(f'/admin/orders/{orders[0]}/update', data={'status': 'teleported', 'tracking_number': 'TRK-1'})
+    assert resp.status_code == 302
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][0] == 'warning'
+    with app.app_context():
+        order = db.session.get(Order, orders[0])
+        assert order.status != 'teleported' and order.tracking_number == 'TRK-1'
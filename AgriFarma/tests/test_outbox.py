@@ -0,0 +1,154 @@
+"""
+Pytest tests for the transactional outbox, the worker loop and email delivery.
+"""
+import socketserver
+import threading
+from datetime import datetime, timedelta
+from email import message_from_bytes
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Order
+from agrifarma.models.outbox import OutboxEvent
+from agrifarma.services.outbox import enqueue, handler, run_once, claim_batch, requeue_dead
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages from smtplib."""
+
+    def handle(self):
+        self.wfile.write(b'220 stand-in ready\r\n')
+        lines, in_data = [], False
+        for line in self.rfile:
+            if in_data:
+                if line.rstrip(b'\r\n') == b'.':
+                    self.server.messages.append(message_from_bytes(b''.join(lines)))
+                    lines, in_data = [], False
+                    self.wfile.write(b'250 queued\r\n')
+                else:
+                    lines.append(line[1:] if line.startswith(b'..') else line)
+                continue
+            command = line[:4].upper()
+            if command == b'DATA':
+                in_data = True
+                self.wfile.write(b'354 go ahead\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 ok\r\n')
+
+
+@pytest.fixture(scope='module')
+def smtp():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='module')
+def app(smtp):
+    app = create_app('testing')
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp.server_address[1], MAIL_USE_TLS=False,
+                      OUTBOX_MAX_ATTEMPTS=3, OUTBOX_BACKOFF_SECONDS=10)
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='outboxuser', name='Outbox User', email='buyer@test.com', role_id=role.id, is_active=True)
+        user.set_password('outbox12345')
+        db.session.add(user)
+        db.session.commit()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def ctx(app, smtp):
+    with app.app_context():
+        yield
+        OutboxEvent.query.delete()
+        Order.query.delete()
+        db.session.commit()
+        smtp.messages.clear()
+
+
+_flaky_calls = []
+
+
+@handler('test.flaky')
+def _flaky(payload):
+    _flaky_calls.append(payload)
+    raise RuntimeError('smtp down')
+
+
+def test_event_commits_only_with_the_domain_change(ctx, smtp):
+    user = User.query.filter_by(username='outboxuser').first()
+    order = Order(order_number='OB-1', customer_id=user.id, subtotal=50, total_amount=50)
+    db.session.add(order)
+    db.session.flush()
+    enqueue('order.placed', {'order_id': order.id})
+    db.session.rollback()
+    assert OutboxEvent.query.count() == 0
+
+    order = Order(order_number='OB-2', customer_id=user.id, subtotal=50, total_amount=50)
+    db.session.add(order)
+    db.session.flush()
+    enqueue('order.placed', {'order_id': order.id})
+    db.session.commit()
+
+    assert run_once('test-worker') == (1, 0)
+    event = OutboxEvent.query.one()
+    assert event.status == 'done' and event.processed_at and event.locked_by is None
+    assert len(smtp.messages) == 1
+    assert smtp.messages[0]['To'] == 'buyer@test.com'
+    assert 'OB-2' in smtp.messages[0]['Subject']
+    assert run_once('test-worker') == (0, 0)
+
+
+def test_failures_back_off_then_dead_letter(ctx):
+    _flaky_calls.clear()
+    event = enqueue('test.flaky', {'n': 1})
+    db.session.commit()
+    for attempt in range(1, 4):
+        assert run_once('test-worker') == (0, 1)
+        event = db.session.get(OutboxEvent, event.id)
+        assert event.attempts == attempt and 'smtp down' in event.last_error
+        if attempt < 3:
+            assert event.status == 'pending' and event.available_at > datetime.utcnow()
+            assert run_once('test-worker') == (0, 0)  # not due yet
+            event.available_at = datetime.utcnow()
+            db.session.commit()
+    assert event.status == 'dead' and len(_flaky_calls) == 3
+
+    assert requeue_dead('test.flaky') == 1
+    event = db.session.get(OutboxEvent, event.id)
+    assert (event.status, event.attempts) == ('pending', 0)
+
+
+def test_leases_exclude_other_workers_until_expired(ctx):
+    enqueue('contact.message', {'name': 'A', 'email': 'a@test.com', 'message': 'hi'})
+    db.session.commit()
+    assert len(claim_batch('worker-a')) == 1
+    assert claim_batch('worker-b') == []
+    later = datetime.utcnow() + timedelta(minutes=5)
+    reclaimed = claim_batch('worker-b', now=later)
+    assert len(reclaimed) == 1 and reclaimed[0].locked_by.startswith('worker-b:')
+
+
+def test_contact_form_is_delivered_by_worker(app, ctx, smtp):
+    client = app.test_client()
+    resp = client.post('/contact', data={'name': 'Farmer', 'email': 'f@test.com', 'subject': 'Seeds',
+                                         'message': 'Do you deliver to Hyderabad?'})
+    assert resp.status_code == 200
+    assert OutboxEvent.query.filter_by(topic='contact.message', status='pending').count() == 1
+    run_once('test-worker')
+    assert smtp.messages[0]['To'] == app.config['ADMIN_EMAIL']
+    assert 'Hyderabad' in smtp.messages[0].get_payload()
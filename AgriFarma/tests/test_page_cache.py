@@ -0,0 +1,80 @@
+"""
+Pytest tests for the anonymous full-page cache.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.product import Product
+from agrifarma.services.page_cache import get_page_cache
+
+
+def _make_app(**overrides):
+    app = create_app('testing')
+    app.config.update(PAGE_CACHE_ENABLED=True, **overrides)
+    from agrifarma.services.page_cache import init_page_cache
+    init_page_cache(app)
+    return app
+
+
+@pytest.fixture(params=['memory', 'filesystem'])
+def app(request, tmp_path):
+    app = _make_app(PAGE_CACHE_BACKEND=request.param, PAGE_CACHE_DIR=str(tmp_path / 'pages'))
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='cacheuser', name='Cache User', email='cache@test.com', role_id=role.id, is_active=True)
+        user.set_password('cache12345')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Product(name='Wheat Seeds', slug='wheat-seeds', category='Seeds', price=100, vendor_id=user.id))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def test_anonymous_hits_and_normalised_keys(app):
+    client = app.test_client()
+    assert client.get('/marketplace/?category=Seeds&sort=').headers['X-Cache'] == 'MISS'
+    hit = client.get('/marketplace/?utm_source=sms&category=Seeds')
+    assert hit.headers['X-Cache'] == 'HIT' and b'Wheat Seeds' in hit.data
+    assert 'Set-Cookie' not in hit.headers
+    assert client.get('/marketplace/?category=Tools').headers['X-Cache'] == 'MISS'
+    with app.app_context():
+        stats = get_page_cache().stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 2, 2)
+
+
+def test_model_change_invalidates_tag(app):
+    client = app.test_client()
+    client.get('/marketplace/')
+    assert client.get('/marketplace/').headers['X-Cache'] == 'HIT'
+    with app.app_context():
+        product = Product.query.first()
+        product.increment_views()  # counter-only updates keep the cache
+    assert client.get('/marketplace/').headers['X-Cache'] == 'HIT'
+    with app.app_context():
+        product = Product.query.first()
+        product.name = 'Golden Wheat Seeds'
+        db.session.commit()
+    fresh = client.get('/marketplace/')
+    assert fresh.headers['X-Cache'] == 'MISS' and b'Golden Wheat Seeds' in fresh.data
+
+
+def test_logged_in_users_bypass(app):
+    client = app.test_client()
+    client.get('/marketplace/')
+    client.post('/auth/login', data={'username': 'cacheuser', 'password': 'cache12345'})
+    resp = client.get('/marketplace/')
+    assert 'X-Cache' not in resp.headers
+    with app.app_context():
+        assert get_page_cache().stats()['bypasses'] >= 1
+
+
+def test_disabled_in_testing_config():
+    app = create_app('testing')
+    with app.app_context():
+        assert get_page_cache() is None
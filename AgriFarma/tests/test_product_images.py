@@ -0,0 +1,48 @@
+"""
+Pytest tests for the shared keyword -> product image matcher.
+"""
+import json
+from agrifarma.services.product_images import ImageMatcher, get_matcher, DEFAULT_MAP_FILE
+
+
+def _legacy_lookup(keywords, name):
+    """The original per-call sorted substring scan, used as the reference."""
+    key = (name or '').lower()
+    for kw in sorted(keywords, key=lambda k: -len(k)):
+        if kw in key:
+            return keywords[kw]
+    return None
+
+
+def test_matches_legacy_scan_for_default_map():
+    matcher = get_matcher(DEFAULT_MAP_FILE)
+    with open(DEFAULT_MAP_FILE, encoding='utf-8') as fh:
+        keywords = json.load(fh)['keywords']
+    names = [
+        'Wheat Seeds Premium', 'Organic Compost', 'Water Pump Small', 'Tractor Tire',
+        'Garden Hoe', 'Rice and Wheat Combo', 'Sugarcane Cutter', 'Plain Bag', '', None,
+    ]
+    for name in names:
+        assert matcher.match_keyword(name) == _legacy_lookup(keywords, name)
+
+
+def test_longest_keyword_wins_over_earlier_shorter_match():
+    matcher = ImageMatcher({'pump': '/pump.jpg', 'water pump': '/water-pump.jpg'})
+    assert matcher.match_keyword('Big Water Pump') == '/water-pump.jpg'
+
+
+def test_resolve_priority_and_category_default():
+    matcher = ImageMatcher({'npk': '/npk.jpg'}, {'fertilizers': 'npk'}, '/fallback.jpg')
+    assert matcher.resolve('Anything', 'Fertilizers', provided='/mine.jpg') == '/mine.jpg'
+    assert matcher.resolve('NPK 20-20', 'Tools') == '/npk.jpg'
+    assert matcher.resolve('Generic', 'fertilizers') == '/npk.jpg'
+    assert matcher.resolve('Generic', 'Other') == '/fallback.jpg'
+    assert matcher.resolve('Generic', 'Other', default=False) is None
+
+
+def test_resolve_many_accepts_tuples_and_dicts(tmp_path):
+    path = tmp_path / 'map.json'
+    path.write_text(json.dumps({'keywords': {'urea': '/urea.jpg'}, 'fallback': '/fb.jpg'}))
+    matcher = get_matcher(str(path))
+    rows = [('Urea Khad', 'Fertilizers', None), {'name': 'Hoe', 'category': 'Tools'}, ('X', None, '/x.jpg')]
+    assert matcher.resolve_many(rows) == ['/urea.jpg', '/fb.jpg', '/x.jpg']
@@ -0,0 +1,119 @@
+"""
+Pytest tests for the token-bucket rate limiter.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread
+from agrifarma.services.rate_limit import MemoryStorage, SQLiteStorage, init_rate_limit
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['RATE_LIMIT_ENABLED'] = True
+    init_rate_limit(app)
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='poster', name='Poster', email='poster@test.com', role_id=role.id, is_active=True)
+        user.set_password('post12345')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        db.session.add(Thread(title='Wheat', slug='wheat', content='c', author_id=user.id, category_id=category.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.parametrize('make_storage', [
+    lambda tmp_path: MemoryStorage(),
+    lambda tmp_path: SQLiteStorage(str(tmp_path / 'buckets.sqlite3')),
+])
+def test_bucket_refills_at_the_configured_rate(tmp_path, make_storage):
+    storage = make_storage(tmp_path)
+    # 2-token burst, one token every 5 seconds
+    assert storage.take('k', 2, 0.2, now=100.0) == (True, 0.0)
+    assert storage.take('k', 2, 0.2, now=100.0) == (True, 0.0)
+    allowed, retry_after = storage.take('k', 2, 0.2, now=101.0)
+    assert not allowed and retry_after == pytest.approx(4.0)
+    assert storage.take('k', 2, 0.2, now=105.0)[0]
+    assert storage.take('other', 2, 0.2, now=105.0)[0]
+
+
+def test_memory_buckets_expire_once_full_and_respect_the_cap():
+    storage = MemoryStorage(max_keys=3)
+    storage.take('a', 1, 1.0, now=0.0)
+    storage.take('b', 1, 1.0, now=5.0)  # 'a' refilled at t=1, so it is dropped
+    assert list(storage.buckets) == ['b']
+    for key in 'cdef':
+        storage.take(key, 10, 0.001, now=5.0)
+    assert len(storage) == 3 and 'b' not in storage.buckets
+
+
+def test_login_is_limited_per_ip(app):
+    client = app.test_client()
+    for _ in range(10):
+        assert client.post('/auth/login', data={'username': 'poster', 'password': 'wrong'}).status_code != 429
+    response = client.post('/auth/login', data={'username': 'poster', 'password': 'wrong'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert client.get('/auth/login').status_code == 200  # only POSTs spend tokens
+    other = app.test_client()
+    response = other.post('/auth/login', data={'username': 'poster', 'password': 'wrong'},
+                          environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.status_code != 429
+
+
+def test_replies_are_limited_per_user(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'poster', 'password': 'post12345'})
+    thread = Thread.query.first()
+    statuses = [client.post(f'/forum/thread/{thread.id}/wheat/reply', data={'content': f'Reply {i}'}).status_code
+                for i in range(11)]
+    assert statuses[:10] == [302] * 10 and statuses[10] == 429
+
+
+def test_disabled_in_testing_config():
+    app = create_app('testing')
+    assert app.extensions['rate_limit'] is None
+
+
+def test_ip_bucket_is_checked_before_the_user_bucket(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'poster', 'password': 'post12345'})
+    thread = Thread.query.first()
+    storage = app.extensions['rate_limit']
+    # Another user on the same address has drained the per-IP bucket
+    for _ in range(30):
+        storage.take('forum.post_reply|ip:127.0.0.1', 30, 0.5)
+    assert client.post(f'/forum/thread/{thread.id}/wheat/reply', data={'content': 'Hi'}).status_code == 429
+    user_keys = [key for key in storage.buckets if '|user:' in key and key.startswith('forum.post_reply')]
+    assert user_keys == []
+
+
+def test_trusted_proxy_hop_gives_the_client_address(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'TRUSTED_PROXIES', 1)
+    monkeypatch.setattr(TestingConfig, 'RATE_LIMIT_ENABLED', True)
+    app = create_app('testing')
+    router = {'REMOTE_ADDR': '10.1.1.1'}
+
+    def login(client_ip):
+        return app.test_client().post('/auth/login', data={'username': 'x', 'password': 'y'},
+                                      headers={'X-Forwarded-For': client_ip}, environ_base=router).status_code
+
+    with app.app_context():
+        db.create_all()
+        statuses = [login('203.0.113.7') for _ in range(11)]
+        other = login('203.0.113.8')
+        db.session.remove()
+        db.drop_all()
+    assert statuses[-1] == 429 and other != 429
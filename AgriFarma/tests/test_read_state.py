@@ -0,0 +1,142 @@
+"""
+Pytest tests for per-user forum unread tracking.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread, Reply, ThreadReadMark, CategoryReadMark
+from agrifarma.services import read_state
+from agrifarma.services.read_state import compact, get_buffer, unread_thread_ids
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        for username in ('reader', 'poster'):
+            user = User(username=username, name=username.title(), email=f'{username}@test.com', role_id=role.id,
+                        is_active=True, created_at=datetime.utcnow() - timedelta(days=1))
+            user.set_password('read12345')
+            db.session.add(user)
+        db.session.flush()
+        poster = User.query.filter_by(username='poster').first()
+        crops = Category(name='Crops', slug='crops')
+        livestock = Category(name='Livestock', slug='livestock')
+        db.session.add_all([crops, livestock])
+        db.session.flush()
+        for title, category in (('Wheat rust', crops), ('Maize yield', crops), ('Goat feed', livestock)):
+            thread = Thread(title=title, slug=title.lower().replace(' ', '-'), content='Help', author_id=poster.id,
+                            category_id=category.id)
+            db.session.add(thread)
+            db.session.flush()
+            db.session.add(Reply(content='First answer', author_id=poster.id, thread_id=thread.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _login(client):
+    client.post('/auth/login', data={'username': 'reader', 'password': 'read12345'})
+
+
+def _unread():
+    reader = User.query.filter_by(username='reader').first()
+    return {thread.title for thread in Thread.query.all() if thread.id in unread_thread_ids(reader, Thread.query.all())}
+
+
+def test_reading_a_thread_clears_it_until_a_new_reply(app):
+    client = app.test_client()
+    _login(client)
+    assert client.get('/forum/category/crops').data.count(b'> New') == 2
+    assert _unread() == {'Wheat rust', 'Maize yield', 'Goat feed'}
+
+    wheat = Thread.query.filter_by(slug='wheat-rust').first()
+    client.get(f'/forum/thread/{wheat.id}/wheat-rust')
+    assert _unread() == {'Maize yield', 'Goat feed'}  # pending in the buffer, not written yet
+    assert ThreadReadMark.query.count() == 0
+
+    assert get_buffer().flush() == 1
+    assert ThreadReadMark.query.one().last_reply_id == wheat.replies.first().id
+
+    poster = User.query.filter_by(username='poster').first()
+    db.session.add(Reply(content='Update', author_id=poster.id, thread_id=wheat.id))
+    db.session.commit()
+    assert 'Wheat rust' in _unread()
+
+
+def test_marks_only_move_forward(app):
+    wheat = Thread.query.filter_by(slug='wheat-rust').first()
+    reader = User.query.filter_by(username='reader').first()
+    buffer = get_buffer()
+    buffer.record(reader.id, wheat.id, 50)
+    buffer.flush()
+    buffer.record(reader.id, wheat.id, 10)
+    buffer.flush()
+    db.session.expire_all()
+    assert ThreadReadMark.query.one().last_reply_id == 50
+
+
+def test_unread_annotation_is_one_query(app):
+    reader = User.query.filter_by(username='reader').first()
+    threads = Thread.query.all()
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert len(unread_thread_ids(reader, threads)) == 3
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert len(statements) == 1
+
+
+def test_mark_category_read_uses_a_watermark(app):
+    client = app.test_client()
+    _login(client)
+    wheat = Thread.query.filter_by(slug='wheat-rust').first()
+    client.get(f'/forum/thread/{wheat.id}/wheat-rust')
+    get_buffer().flush()
+
+    client.post('/forum/category/crops/mark-read')
+    assert _unread() == {'Goat feed'}
+    assert ThreadReadMark.query.count() == 0
+    assert CategoryReadMark.query.one().category_id == wheat.category_id
+
+
+def test_compact_collapses_old_marks(app):
+    reader = User.query.filter_by(username='reader').first()
+    for thread in Thread.query.all():
+        get_buffer().record(reader.id, thread.id, thread.replies.first().id)
+    get_buffer().flush()
+    ThreadReadMark.query.update({'updated_at': datetime.utcnow() - timedelta(days=45)})
+    db.session.commit()
+
+    assert compact(30) == 3
+    db.session.commit()
+    assert ThreadReadMark.query.count() == 0
+    assert CategoryReadMark.query.count() == 2
+    # Threads untouched since the cutoff stay read through the watermark
+    Thread.query.update({'last_activity': datetime.utcnow() - timedelta(days=40)})
+    db.session.commit()
+    assert _unread() == set()
+
+
+def test_exit_flush_registers_once_and_skips_a_dropped_database(app, caplog):
+    reader = User.query.filter_by(username='reader').first()
+    other = create_app('testing')
+    get_buffer().record(reader.id, 1, 5)
+    other.extensions['read_state'].record(reader.id, 2, 5)
+    assert len(read_state._exit_hook) == 1
+    assert {get_buffer(), other.extensions['read_state']} <= set(read_state._live_buffers)
+
+    db.drop_all()
+    get_buffer().flush_at_exit()
+    assert 'Dropped' not in caplog.text
+    db.create_all()
@@ -0,0 +1,122 @@
+"""
+Pytest tests for forum reputation awards, the batch rebuild and the leaderboard.
+"""
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread, Reply
+from agrifarma.models.blog import BlogCategory, BlogPost
+from agrifarma.services.reputation import POINTS, recompute_all
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        for username in ('asker', 'helper', 'reader'):
+            user = User(username=username, name=username.title(), email=f'{username}@test.com',
+                        role_id=role.id, is_active=True)
+            user.set_password('rep12345')
+            db.session.add(user)
+        db.session.flush()
+        category = Category(name='Crops', slug='crops')
+        blog_category = BlogCategory(name='Tips', slug='tips')
+        db.session.add_all([category, blog_category])
+        db.session.flush()
+        asker = User.query.filter_by(username='asker').first()
+        db.session.add(Thread(title='Wheat rust', slug='wheat-rust', content='Help', author_id=asker.id,
+                              category_id=category.id))
+        db.session.add(BlogPost(title='Sowing', slug='sowing', content='Sow early', author_id=asker.id,
+                                category_id=blog_category.id, is_published=True))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _login(client, username):
+    client.get('/auth/logout')
+    client.post('/auth/login', data={'username': username, 'password': 'rep12345'})
+
+
+def _scores():
+    db.session.expire_all()
+    return {user.username: user.reputation_score or 0 for user in User.query.all()}
+
+
+def test_events_award_points_in_the_same_commit(app):
+    client = app.test_client()
+    thread = Thread.query.first()
+    _login(client, 'helper')
+    client.post(f'/forum/thread/{thread.id}/wheat-rust/reply', data={'content': 'Spray a fungicide early.'})
+    assert _scores()['helper'] == POINTS['reply_posted']
+
+    reply = Reply.query.first()
+    _login(client, 'asker')
+    client.post(f'/forum/reply/{reply.id}/mark-solution')
+    client.post(f'/forum/reply/{reply.id}/mark-solution')  # marking again earns nothing more
+    scores = _scores()
+    assert scores['helper'] == POINTS['reply_posted'] + POINTS['reply_accepted']
+    assert scores['asker'] == POINTS['thread_solved']
+
+    post = BlogPost.query.first()
+    _login(client, 'reader')
+    client.post(f'/blog/post/{post.id}/like')
+    assert _scores()['asker'] == POINTS['thread_solved'] + POINTS['blog_like_received']
+    client.post(f'/blog/post/{post.id}/like')  # unlike takes the points back
+    assert _scores()['asker'] == POINTS['thread_solved']
+
+
+def test_self_like_and_deleted_reply(app):
+    client = app.test_client()
+    thread = Thread.query.first()
+    _login(client, 'asker')
+    client.post(f'/blog/post/{BlogPost.query.first().id}/like')
+    client.post(f'/forum/thread/{thread.id}/wheat-rust/reply', data={'content': 'Bumping my own thread.'})
+    assert _scores()['asker'] == POINTS['reply_posted']
+    client.post(f'/forum/admin/reply/{Reply.query.first().id}/delete')
+    assert _scores()['asker'] == 0
+
+
+def test_recompute_matches_incremental_awards(app):
+    client = app.test_client()
+    thread = Thread.query.first()
+    _login(client, 'helper')
+    client.post(f'/forum/thread/{thread.id}/wheat-rust/reply', data={'content': 'Check the leaves.'})
+    client.post(f'/forum/thread/{thread.id}/wheat-rust/reply', data={'content': 'And the soil.'})
+    _login(client, 'asker')
+    client.post(f'/forum/reply/{Reply.query.first().id}/mark-solution')
+    client.post(f'/forum/reply/{Reply.query.all()[1].id}/mark-solution')  # solution moves to the other reply
+    _login(client, 'reader')
+    client.post(f'/blog/post/{BlogPost.query.first().id}/like')
+    incremental = _scores()
+
+    User.query.update({'reputation_score': 999})
+    db.session.commit()
+    assert recompute_all() == 3
+    db.session.commit()
+    assert _scores() == incremental
+    assert recompute_all() == 0
+
+
+def test_leaderboard_is_cached_until_an_award_commits(app):
+    client = app.test_client()
+    helper = User.query.filter_by(username='helper').first()
+    helper.reputation_score = 40
+    db.session.commit()
+    assert [row['username'] for row in client.get('/forum/leaderboard').get_json()['leaders']] == ['helper']
+
+    User.query.filter_by(username='reader').update({'reputation_score': 90})
+    db.session.commit()
+    assert [row['username'] for row in client.get('/forum/leaderboard').get_json()['leaders']] == ['helper']
+
+    thread = Thread.query.first()
+    _login(client, 'asker')
+    client.post(f'/forum/thread/{thread.id}/wheat-rust/reply', data={'content': 'Any other ideas?'})
+    leaders = client.get('/forum/leaderboard?limit=2').get_json()['leaders']
+    assert [(row['rank'], row['username']) for row in leaders] == [(1, 'reader'), (2, 'helper')]
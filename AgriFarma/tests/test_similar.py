@@ -0,0 +1,131 @@
+"""
+Pytest tests for MinHash/LSH similar-thread lookups.
+"""
+import threading
+import time
+import pytest
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread
+from agrifarma.services.similar import (IndexHolder, SimilarityIndex, estimate, get_index, shingles, signature,
+                                        similar_threads)
+
+THREADS = [
+    ('When to sow wheat in Punjab', 'Best sowing dates for wheat in central Punjab?', True),
+    ('Wheat sowing time in Punjab', 'What is the right time to sow wheat this season?', False),
+    ('Aphids on mustard crop', 'Small green insects on my mustard leaves.', False),
+    ('Buffalo milk yield dropping', 'My buffalo gives less milk every week.', False),
+]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='farmer', name='Farmer', email='farmer@test.com', role_id=role.id, is_active=True)
+        user.set_password('farm12345')
+        db.session.add(user)
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        for i, (title, content, solved) in enumerate(THREADS):
+            db.session.add(Thread(title=title, slug=f'thread-{i}', content=content, is_solved=solved,
+                                  author_id=user.id, category_id=category.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_signature_estimates_jaccard():
+    a = shingles('wheat sowing time punjab')
+    b = shingles('wheat sowing time sindh')
+    exact = len(a & b) / len(a | b)
+    assert estimate(signature(a), signature(b)) == pytest.approx(exact, abs=0.2)
+    assert estimate(signature(a), signature(a)) == 1.0
+    assert signature(shingles('the of and')) is None
+
+
+def test_index_prefers_solved_and_skips_unrelated():
+    index = SimilarityIndex()
+    for i, (title, content, solved) in enumerate(THREADS):
+        index.add(i, title, content, solved)
+    ids = [thread_id for thread_id, _ in index.query('wheat sowing in Punjab')]
+    assert set(ids[:2]) == {0, 1}
+    assert 3 not in ids
+    index.add(10, 'Wheat sowing time in Punjab', 'duplicate', is_solved=True)
+    assert index.query('Wheat sowing time in Punjab')[0][0] == 10
+    index.remove(0)
+    assert 0 not in [thread_id for thread_id, _ in index.query('wheat sowing in Punjab')]
+
+
+def test_similar_endpoint(app):
+    client = app.test_client()
+    data = client.get('/forum/similar', query_string={'title': 'Sowing wheat in Punjab'}).get_json()
+    titles = [thread['title'] for thread in data['threads']]
+    assert titles[0] == 'When to sow wheat in Punjab' and data['threads'][0]['is_solved']
+    assert 'Buffalo milk yield dropping' not in titles
+    assert client.get('/forum/similar?title=ab').get_json()['threads'] == []
+
+
+def test_new_threads_are_indexed_and_deleted_ones_hidden(app):
+    client = app.test_client()
+    assert client.get('/forum/similar', query_string={'title': 'Mustard aphids'}).get_json()['threads']
+    Thread.query.filter_by(slug='thread-2').update({'is_deleted': True})
+    db.session.commit()
+    assert client.get('/forum/similar', query_string={'title': 'Mustard aphids'}).get_json()['threads'] == []
+
+    client.post('/auth/login', data={'username': 'farmer', 'password': 'farm12345'})
+    client.post('/forum/new-thread', data={'title': 'Tomato leaf curl virus', 'content': 'Leaves curling upward.',
+                                           'category_id': Category.query.first().id})
+    titles = [t['title'] for t in client.get('/forum/similar', query_string={'title': 'tomato leaf curl'}).get_json()['threads']]
+    assert titles == ['Tomato leaf curl virus']
+
+
+def test_deleted_threads_dont_shorten_results(app):
+    index = get_index()
+    Thread.query.filter_by(slug='thread-0').update({'is_deleted': True})
+    db.session.commit()
+    found = similar_threads('Wheat sowing in Punjab', limit=1)
+    assert [match.title for match in found] == ['Wheat sowing time in Punjab']
+    assert Thread.query.filter_by(slug='thread-0').one().id not in index.signatures
+
+
+def test_background_build_never_blocks_a_lookup(app):
+    holder = IndexHolder(background=True)
+    app.extensions['similar_threads'] = holder
+    assert similar_threads('Wheat sowing in Punjab') == []  # first build still running
+    deadline = time.monotonic() + 10
+    while holder.index is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 'When to sow wheat in Punjab' in [match.title for match in similar_threads('Wheat sowing in Punjab')]
+
+
+def test_concurrent_adds_and_lookups():
+    index = SimilarityIndex()
+    errors = []
+
+    def writer():
+        for i in range(300):
+            index.add(i, f'Wheat sowing question {i}', 'sowing wheat punjab')
+            if i % 3 == 0:
+                index.remove(i - 1)
+
+    def reader():
+        try:
+            for _ in range(300):
+                index.query('wheat sowing punjab')
+        except Exception as exc:  # pragma: no cover - the failure being tested for
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
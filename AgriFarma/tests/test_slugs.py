@@ -0,0 +1,103 @@
+"""
+Pytest tests for the shared slug allocator.
+"""
+import pytest
+from sqlalchemy import event
+from agrifarma import create_app, db
+from agrifarma.models.user import User
+from agrifarma.models.role import Role
+from agrifarma.models.forum import Category, Thread
+from agrifarma.models.blog import BlogPost
+from agrifarma.services.slugs import allocate_slugs, assign_unique_slug, next_free_slug, slugify
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        role = Role(name='farmer')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='sluguser', name='Slug User', email='slug@test.com', role_id=role.id, is_active=True)
+        user.set_password('slug12345')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='Crops', slug='crops')
+        db.session.add(category)
+        db.session.flush()
+        for slug in ('wheat-rust', 'wheat-rust-1', 'wheat-rust-7', 'wheat-rust-control', 'wheat_rust'):
+            db.session.add(Thread(title='t', slug=slug, content='c', author_id=user.id, category_id=category.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _count_selects(fn):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        return fn(), len(statements)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_slugify_matches_previous_helpers():
+    assert slugify('  Wheat Rust: what now?! ') == 'wheat-rust-what-now'
+
+
+def test_next_free_slug_uses_one_query(app):
+    slug, selects = _count_selects(lambda: next_free_slug(Thread.slug, 'Wheat Rust'))
+    assert slug == 'wheat-rust-8' and selects == 1
+    # "_" is a LIKE wildcard; it must not make wheat_rust look like a wheat-rust variant
+    assert next_free_slug(Thread.slug, 'Barley') == 'barley'
+
+
+def test_assign_unique_slug_flushes_and_keeps_matching_slug(app):
+    user, category = User.query.first(), Category.query.first()
+    thread = Thread(title='Wheat rust', content='Help', author_id=user.id, category_id=category.id)
+    assert assign_unique_slug(thread, thread.title) == 'wheat-rust-8'
+    assert thread.id is not None
+    db.session.commit()
+    assert assign_unique_slug(thread, 'Wheat Rust') == 'wheat-rust-8'  # unchanged title keeps its slug
+    assert assign_unique_slug(thread, 'Leaf blight') == 'leaf-blight'
+
+
+def test_assign_unique_slug_retries_after_concurrent_insert(app, monkeypatch):
+    from agrifarma.services import slugs
+    user, category = User.query.first(), Category.query.first()
+    real = slugs.next_free_slug
+    calls = []
+
+    def stale_lookup(column, text, exclude_id=None):
+        calls.append(text)
+        # First answer is stale: another request already took "wheat-rust-1"
+        return 'wheat-rust-1' if len(calls) == 1 else real(column, text, exclude_id)
+
+    monkeypatch.setattr(slugs, 'next_free_slug', stale_lookup)
+    thread = Thread(title='Wheat rust', content='Help', author_id=user.id, category_id=category.id)
+    assert assign_unique_slug(thread, thread.title) == 'wheat-rust-8'
+    db.session.commit()
+    assert len(calls) == 2 and Thread.query.filter_by(slug='wheat-rust-8').count() == 1
+
+
+def test_bulk_allocation(app):
+    slugs_, selects = _count_selects(lambda: allocate_slugs(Thread.slug, ['Wheat rust', 'Cotton', 'Cotton', 'Wheat rust']))
+    assert slugs_ == ['wheat-rust-8', 'cotton', 'cotton-1', 'wheat-rust-9'] and selects == 1
+    long_title = 'x' * 300
+    assert len(allocate_slugs(BlogPost.slug, [long_title])[0]) <= 200
+
+
+def test_new_thread_route_uses_allocator(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'sluguser', 'password': 'slug12345'})
+    resp = client.post('/forum/new-thread', data={'title': 'Wheat rust again', 'content': 'Seeing rust on leaves again this year.',
+                                           'category_id': Category.query.first().id})
+    assert resp.status_code == 302
+    assert Thread.query.filter_by(slug='wheat-rust-again').count() == 1
@@ -0,0 +1,34 @@
+"""
+Pytest tests for the startup-time budget.
+"""
+from agrifarma import create_app
+from agrifarma.utils.startup import DEFAULT_BUDGET_MS, best_of, parse_importtime, top_imports
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _abc
+import time:       300 |        420 | abc
+import time:      2000 |       2000 |     numpy.core
+import time:       500 |       2500 |   numpy
+import time:      1000 |       3500 | pandas
+"""
+
+
+def test_parse_importtime():
+    records = parse_importtime(SAMPLE)
+    assert [(r.module, r.depth) for r in records] == [('_abc', 1), ('abc', 0), ('numpy.core', 2), ('numpy', 1), ('pandas', 0)]
+    assert [r.module for r in top_imports(records, 1)] == ['pandas']
+    assert records[-1].self_us == 1000 and records[-1].cumulative_us == 3500
+
+
+def test_create_app_stays_within_budget_and_lazy():
+    report = best_of(2)
+    assert report.lazy_loaded == []
+    assert report.total_ms < DEFAULT_BUDGET_MS, f'startup took {report.total_ms:.0f}ms'
+    assert any(r.module == 'agrifarma' for r in report.imports)
+
+
+def test_migration_commands_load_on_demand():
+    app = create_app('testing')
+    result = app.test_cli_runner().invoke(args=['db', '--help'])
+    assert result.exit_code == 0 and 'upgrade' in result.output
+    assert 'migrate' in app.extensions
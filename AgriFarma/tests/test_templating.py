@@ -0,0 +1,61 @@
+"""
+Pytest tests for the Jinja bytecode cache and template render timing.
+"""
+import logging
+import os
+import pytest
+from agrifarma import create_app, db
+from agrifarma.services.templating import load_stats, merge_stats, report_rows, warm_templates
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config.update(TEMPLATE_STATS_DIR=str(tmp_path / 'stats'), TEMPLATE_STATS_FLUSH_SECONDS=0)
+    yield app
+
+
+def test_bytecode_cache_and_warm_up(tmp_path):
+    app = create_app('testing')
+    app.config.update(TEMPLATE_BYTECODE_CACHE=True, TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'))
+    from agrifarma.services.templating import init_templating
+    init_templating(app)
+    count, errors = warm_templates(app)
+    assert count > 20
+    cached = os.listdir(tmp_path / 'jinja')
+    assert len(cached) == count
+    # A second app (another worker) loads the compiled code instead of recompiling
+    other = create_app('testing')
+    other.config.update(TEMPLATE_BYTECODE_CACHE=True, TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'))
+    init_templating(other)
+    assert warm_templates(other) == (count, errors)
+    assert sorted(os.listdir(tmp_path / 'jinja')) == sorted(cached)
+
+
+def test_render_timing_logged_and_flushed(app, caplog):
+    app.config['TEMPLATE_PROFILING'] = True
+    from agrifarma.services.templating import init_templating
+    init_templating(app)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    with caplog.at_level(logging.INFO, logger='agrifarma.services.templating'):
+        assert client.get('/about').status_code == 200
+        client.get('/about')
+    lines = [r.getMessage() for r in caplog.records if 'templates' in r.getMessage()]
+    assert lines and lines[0].startswith('GET /about 200 templates') and 'home/about.html' in lines[0]
+    stats = load_stats(app)
+    assert stats['home/about.html']['count'] == 2
+    with app.app_context():
+        db.drop_all()
+
+
+def test_report_merges_processes():
+    merged = merge_stats([
+        {'a.html': {'count': 2, 'total': 0.010, 'max': 0.006}},
+        {'a.html': {'count': 1, 'total': 0.020, 'max': 0.020}, 'b.html': {'count': 4, 'total': 0.004, 'max': 0.001}},
+    ])
+    rows = report_rows(merged, sort='total')
+    assert [r[0] for r in rows] == ['a.html', 'b.html']
+    assert rows[0][1] == 3 and round(rows[0][2]) == 30 and round(rows[0][4]) == 20
+    assert report_rows(merged, sort='count', limit=1)[0][0] == 'b.html'